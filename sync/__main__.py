@@ -1,7 +1,7 @@
-"""模块入口：直接 `python -m sync` 启动守护 + Web。"""
+"""模块入口：直接 `python -m sync` 启动守护 + Web；`python -m sync wait ...` 等子命令见 `sync.cli`。"""
 
-from .main import run_all
+from .cli import main
 
 
 if __name__ == "__main__":
-    raise SystemExit(run_all())
+    raise SystemExit(main())
@@ -0,0 +1,138 @@
+"""命令行入口：`python -m sync [子命令]`。
+
+子命令：
+- （无）：启动守护进程 + Web 管理页面（等同于 `sync.main.run_all`）；
+- `wait --target <目标> [...]`：阻塞直到守护进程报告这些目标就绪，供 supervisord 在启动服务前调用。
+  通过 `/sync/api/ready` 长轮询，由阶段完成事件直接唤醒；Web 不可达时回退检查 `.sync-ready/` 标记文件；
+- `profile [--startup] [--tracemalloc]`：在 cProfile 下单独执行一次同步周期（或启动阶段），
+  打印热点函数、内存分配与子进程/Python 的耗时拆分（见 `sync.profiling`）。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from typing import List, Optional
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from sync.utils.logging import err, log
+
+
+def _ready_url() -> str:
+    port = os.environ.get("SYNC_PORT", "5321")
+    return os.environ.get("SYNC_READY_URL", f"http://127.0.0.1:{port}/sync/api/ready")
+
+
+def _boot_time() -> float:
+    """容器（PID 1）启动时间，用于过滤上一次运行遗留的标记。"""
+    try:
+        return os.stat("/proc/1").st_mtime
+    except OSError:
+        return 0.0
+
+
+def markers_ready(targets: List[str]) -> bool:
+    """回退检查：标记文件均存在且晚于容器启动。"""
+    from sync.core.config import load_settings
+    from sync.core.stages import marker_name, target_key
+
+    st = load_settings()
+    boot = _boot_time()
+    if targets:
+        paths = [os.path.join(st.sync_ready_dir, marker_name(f"ready:{target_key(t)}")) for t in targets]
+    else:
+        paths = [st.sync_complete_file]
+    try:
+        return all(os.stat(p).st_mtime >= boot for p in paths)
+    except OSError:
+        return False
+
+
+def wait_ready(targets: List[str], timeout: float, poll: float = 60.0) -> bool:
+    """等待目标就绪；超时返回 False。"""
+    url = _ready_url()
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        wait_s = min(poll, remaining)
+        query = urlencode([("target", t) for t in targets] + [("timeout", f"{wait_s:.1f}")])
+        try:
+            with urlopen(f"{url}?{query}", timeout=wait_s + 10) as resp:
+                data = json.load(resp)
+            if data.get("ready"):
+                return True
+            continue
+        except (HTTPError, URLError, OSError, ValueError):
+            # 守护进程/Web 尚未启动：检查标记文件后短暂重试
+            pass
+        if markers_ready(targets):
+            return True
+        time.sleep(0.2)
+
+
+def cmd_wait(args: argparse.Namespace) -> int:
+    targets = args.target or []
+    label = ", ".join(targets) if targets else "full sync"
+    log(f"Waiting for {label} (timeout {args.timeout}s)...")
+    started = time.monotonic()
+    if wait_ready(targets, args.timeout):
+        log(f"✓ Ready after {time.monotonic() - started:.2f}s: {label}")
+    else:
+        # 与旧脚本一致：超时也放行，避免服务永久阻塞
+        err(f"Timeout after {args.timeout}s waiting for {label}, starting anyway")
+    return 0
+
+
+def cmd_profile(args: argparse.Namespace) -> int:
+    from sync.profiling import run_profile
+
+    return run_profile(
+        what="startup" if args.startup else "cycle",
+        top=args.top,
+        sort=args.sort,
+        trace_malloc=args.tracemalloc,
+        frames=args.frames,
+        output=args.output,
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m sync", description="AstrBot 数据同步守护与工具")
+    sub = parser.add_subparsers(dest="command")
+
+    p_wait = sub.add_parser("wait", help="等待目标就绪后退出")
+    p_wait.add_argument("--target", action="append", help="同步目标（可重复），如 home/user/AstrBot/data/")
+    p_wait.add_argument(
+        "--timeout",
+        type=float,
+        default=float(os.environ.get("SYNC_WAIT_TIMEOUT", "1800")),
+        help="最长等待秒数（默认 1800，超时仍返回 0）",
+    )
+    p_wait.set_defaults(func=cmd_wait)
+
+    p_prof = sub.add_parser("profile", help="在 cProfile 下执行一次同步周期或启动阶段并打印报告")
+    p_prof.add_argument("--startup", action="store_true", help="剖析启动阶段（fetch/link/restore/commit）而非同步周期")
+    p_prof.add_argument("--top", type=int, default=30, help="输出的函数/分配位置条数（默认 30）")
+    p_prof.add_argument(
+        "--sort", default="cumulative", choices=["cumulative", "tottime", "ncalls"], help="热点排序方式"
+    )
+    p_prof.add_argument("--tracemalloc", action="store_true", help="同时跟踪内存分配（有额外开销）")
+    p_prof.add_argument("--frames", type=int, default=1, help="tracemalloc 保留的栈帧数（>1 时按调用栈归并）")
+    p_prof.add_argument("--output", help="将合并后的 pstats 写入文件")
+    p_prof.set_defaults(func=cmd_profile)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if getattr(args, "func", None) is None:
+        from sync.main import run_all
+
+        return run_all()
+    return args.func(args)
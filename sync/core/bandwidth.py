@@ -0,0 +1,242 @@
+"""传输带宽整形
+
+职责：
+- 上传、下载各一个令牌桶（字节/秒），由 `GitHubReleaseAPI.upload_asset/download_asset` 在每个数据块前调用
+  `throttle()`，避免大文件传输占满容器上行/下行带宽导致 NapCat/QQ 消息延迟；
+- 限速可在运行时修改（`/sync/api/bandwidth`），修改对正在进行的传输立即生效；
+- 可选的闲时窗口：窗口内（本地时间，如 `01:00-07:00`，可跨午夜）使用闲时限速（默认不限速）；
+- 统计最近 10 秒的吞吐、累计字节与因限速等待的时间，便于调参。
+
+环境变量（速率支持 `512K`、`2M`、`1.5MB` 等写法，0 表示不限速）：
+- SYNC_BW_UPLOAD / SYNC_BW_DOWNLOAD：默认限速（默认 0）；
+- SYNC_BW_OFFPEAK：闲时窗口（默认空，表示不启用）；
+- SYNC_BW_OFFPEAK_UPLOAD / SYNC_BW_OFFPEAK_DOWNLOAD：闲时限速（默认 0）。
+
+git push/pull 的打包传输由 git 子进程完成，不经过这里。
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from sync.core import metrics
+
+UPLOAD = "upload"
+DOWNLOAD = "download"
+DIRECTIONS = (UPLOAD, DOWNLOAD)
+RATE_WINDOW = 10.0  # 吞吐统计窗口（秒）
+
+_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2, "G": 1024 ** 3, "GB": 1024 ** 3}
+
+
+def parse_rate(value: Any) -> int:
+    """解析速率（字节/秒）：数字或带 K/M/G 后缀的字符串；空值与 0 表示不限速。"""
+    if value is None or value == "":
+        return 0
+    if isinstance(value, (int, float)):
+        if value < 0:
+            raise ValueError(f"Invalid rate: {value}")
+        return int(value)
+    m = re.fullmatch(r"\s*([0-9]*\.?[0-9]+)\s*([KMG]?B?)\s*(/s)?\s*", str(value), re.IGNORECASE)
+    if not m:
+        raise ValueError(f"Invalid rate: {value}")
+    return int(float(m.group(1)) * _UNITS[m.group(2).upper()])
+
+
+def parse_window(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """解析 `HH:MM-HH:MM` 为一天中的起止分钟数；空值返回 None（结束时间允许 `24:00`）。"""
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid window (expected HH:MM-HH:MM): {value!r}")
+    m = re.fullmatch(r"\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*", value)
+    if not m:
+        raise ValueError(f"Invalid window (expected HH:MM-HH:MM): {value}")
+    h1, m1, h2, m2 = (int(x) for x in m.groups())
+    if h1 > 23 or m1 > 59 or m2 > 59 or h2 > 24 or (h2 == 24 and m2 != 0):
+        raise ValueError(f"Invalid window: {value}")
+    return h1 * 60 + m1, h2 * 60 + m2
+
+
+def _fmt_window(window: Optional[Tuple[int, int]]) -> Optional[str]:
+    if window is None:
+        return None
+    return f"{window[0] // 60:02d}:{window[0] % 60:02d}-{window[1] // 60:02d}:{window[1] % 60:02d}"
+
+
+class TokenBucket:
+    """令牌桶：rate 为 0 时不限速；允许令牌为负（预约），调用方在锁外睡眠对应时间。"""
+
+    def __init__(self, rate: int = 0) -> None:
+        self._lock = threading.Lock()
+        self.rate = rate
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+
+    @property
+    def burst(self) -> int:
+        # 允许约 0.25 秒的突发，至少一个 64KB 数据块
+        return max(64 * 1024, self.rate // 4)
+
+    def set_rate(self, rate: int) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self._tokens = min(self._tokens, float(self.burst))
+
+    def _refill(self, now: float) -> None:
+        if self.rate > 0:
+            self._tokens = min(float(self.burst), self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def reserve(self, n: int) -> float:
+        """取出 n 个令牌，返回需要等待的秒数。"""
+        with self._lock:
+            if self.rate <= 0:
+                return 0.0
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= n
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class _Direction:
+    def __init__(self, rate: int, offpeak_rate: int) -> None:
+        self.rate = rate
+        self.offpeak_rate = offpeak_rate
+        self.bucket = TokenBucket(rate)
+        self.bytes_total = 0
+        self.throttled_seconds = 0.0
+        self.recent: Deque[Tuple[float, int]] = deque()  # (时间, 字节)，仅保留 RATE_WINDOW 内
+
+
+class BandwidthGovernor:
+    """共享的上传/下载限速器（线程安全，LFS 线程池中的多个传输共用同一个桶）。"""
+
+    def __init__(
+        self,
+        upload: int = 0,
+        download: int = 0,
+        offpeak_window: Optional[Tuple[int, int]] = None,
+        offpeak_upload: int = 0,
+        offpeak_download: int = 0,
+    ) -> None:
+        self._lock = threading.Lock()
+        self._dirs: Dict[str, _Direction] = {
+            UPLOAD: _Direction(upload, offpeak_upload),
+            DOWNLOAD: _Direction(download, offpeak_download),
+        }
+        self.offpeak_window = offpeak_window
+
+    def in_offpeak(self, now: Optional[datetime] = None) -> bool:
+        window = self.offpeak_window
+        if window is None:
+            return False
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        start, end = window
+        if start <= end:
+            return start <= minute < end
+        return minute >= start or minute < end  # 跨午夜
+
+    def effective_rate(self, direction: str) -> int:
+        d = self._dirs[direction]
+        return d.offpeak_rate if self.in_offpeak() else d.rate
+
+    def chunk_size(self, direction: str, default: int = 1024 * 1024) -> int:
+        """限速时使用较小的数据块（约 1/8 秒的流量），使发送更平滑。"""
+        rate = self.effective_rate(direction)
+        if rate <= 0:
+            return default
+        return max(16 * 1024, min(default, rate // 8))
+
+    def throttle(self, direction: str, n: int) -> float:
+        """登记 n 字节的传输，必要时睡眠以满足限速；返回等待的秒数。"""
+        d = self._dirs[direction]
+        rate = self.effective_rate(direction)
+        if d.bucket.rate != rate:
+            d.bucket.set_rate(rate)  # 闲时窗口切换
+        wait = d.bucket.reserve(n)
+        if wait > 0:
+            time.sleep(wait)
+            metrics.BANDWIDTH_THROTTLE_SECONDS.inc(wait, direction=direction)
+        now = time.monotonic()
+        with self._lock:
+            d.bytes_total += n
+            d.throttled_seconds += wait
+            d.recent.append((now, n))
+            while d.recent and d.recent[0][0] < now - RATE_WINDOW:
+                d.recent.popleft()
+        return wait
+
+    def set_limits(
+        self,
+        upload: Any = None,
+        download: Any = None,
+        offpeak_window: Any = ...,
+        offpeak_upload: Any = None,
+        offpeak_download: Any = None,
+    ) -> None:
+        """修改限速（None 表示不修改；offpeak_window 传 None/空串表示关闭闲时窗口）。非法值抛出 ValueError。"""
+        window = self.offpeak_window if offpeak_window is ... else parse_window(offpeak_window)
+        changes = {
+            UPLOAD: (None if upload is None else parse_rate(upload),
+                     None if offpeak_upload is None else parse_rate(offpeak_upload)),
+            DOWNLOAD: (None if download is None else parse_rate(download),
+                       None if offpeak_download is None else parse_rate(offpeak_download)),
+        }
+        with self._lock:
+            self.offpeak_window = window
+            for direction, (rate, offpeak_rate) in changes.items():
+                d = self._dirs[direction]
+                if rate is not None:
+                    d.rate = rate
+                if offpeak_rate is not None:
+                    d.offpeak_rate = offpeak_rate
+        for direction in DIRECTIONS:
+            self._dirs[direction].bucket.set_rate(self.effective_rate(direction))
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        out: Dict[str, Any] = {
+            "offpeak": {"window": _fmt_window(self.offpeak_window), "active": self.in_offpeak()},
+        }
+        with self._lock:
+            for direction, d in self._dirs.items():
+                while d.recent and d.recent[0][0] < now - RATE_WINDOW:
+                    d.recent.popleft()
+                recent = sum(n for _, n in d.recent)
+                out[direction] = {
+                    "limit": d.rate,
+                    "offpeak_limit": d.offpeak_rate,
+                    "effective_limit": d.offpeak_rate if out["offpeak"]["active"] else d.rate,
+                    "bytes_per_second": round(recent / RATE_WINDOW),
+                    "bytes_total": d.bytes_total,
+                    "throttled_seconds": round(d.throttled_seconds, 3),
+                }
+        return out
+
+
+_governor: Optional[BandwidthGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> BandwidthGovernor:
+    """进程内共享的限速器（首次调用时按环境变量初始化）。"""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = BandwidthGovernor(
+                upload=parse_rate(os.environ.get("SYNC_BW_UPLOAD", "0")),
+                download=parse_rate(os.environ.get("SYNC_BW_DOWNLOAD", "0")),
+                offpeak_window=parse_window(os.environ.get("SYNC_BW_OFFPEAK", "")),
+                offpeak_upload=parse_rate(os.environ.get("SYNC_BW_OFFPEAK_UPLOAD", "0")),
+                offpeak_download=parse_rate(os.environ.get("SYNC_BW_OFFPEAK_DOWNLOAD", "0")),
+            )
+        return _governor
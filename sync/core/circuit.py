@@ -0,0 +1,165 @@
+"""GitHub API 熔断器
+
+GitHub 变慢或不可达时，每个请求都要经历多次重试与长超时；同步周期持有 Git 锁，
+小文件的提交也随之被阻塞。熔断器在连续失败后快速失败，给远端留出恢复时间。
+
+职责：
+- closed：正常放行；连续失败（网络错误、超时、5xx）达到 SYNC_API_BREAKER_FAILURES 次（默认 3）后转为 open；
+- open：调用直接抛出 `CircuitOpenError`，不发起网络请求；冷却 SYNC_API_BREAKER_COOLDOWN 秒（默认 60）后转为 half_open；
+- half_open：只放行一个探测请求，成功则 closed，失败则重新 open，且冷却时间加倍（上限 SYNC_API_BREAKER_MAX_COOLDOWN，默认 900）；
+- 4xx（含 404）说明远端可达，不计为失败；
+- 状态变化记录日志与指标，`stats()` 供 `/sync/api/lfs/status` 展示。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sync.core import metrics
+from sync.utils.logging import log, warn
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器打开，调用未发起。"""
+
+    def __init__(self, name: str, retry_in: float) -> None:
+        super().__init__(f"{name} circuit open, retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """线程安全的三态熔断器。"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: Optional[int] = None,
+        cooldown: Optional[float] = None,
+        max_cooldown: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold if failure_threshold is not None
+                                     else int(os.environ.get("SYNC_API_BREAKER_FAILURES", "3")))
+        self.base_cooldown = cooldown if cooldown is not None else float(os.environ.get("SYNC_API_BREAKER_COOLDOWN", "60"))
+        self.max_cooldown = max_cooldown if max_cooldown is not None else float(
+            os.environ.get("SYNC_API_BREAKER_MAX_COOLDOWN", "900"))
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = self.base_cooldown
+        self.opened_at = 0.0
+        self.last_error = ""
+        self._probing = False
+        self._listeners: List[Callable[[str], None]] = []
+        metrics.API_CIRCUIT_STATE.set(0, name=name)
+
+    def subscribe(self, cb: Callable[[str], None]) -> None:
+        """状态变化回调（参数为新状态），在调用线程中执行。"""
+        self._listeners.append(cb)
+
+    def _set_state(self, state: str) -> None:
+        # 调用方持有 self._lock
+        if state == self.state:
+            return
+        self.state = state
+        metrics.API_CIRCUIT_STATE.set(_STATE_VALUES[state], name=self.name)
+        metrics.API_CIRCUIT_TRANSITIONS.inc(name=self.name, state=state)
+
+    def _notify(self, state: str) -> None:
+        for cb in list(self._listeners):
+            try:
+                cb(state)
+            except Exception:
+                pass
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def allow(self) -> bool:
+        """是否可以发起请求（open 冷却结束后转为 half_open 并放行一个探测）。"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self._set_state(HALF_OPEN)
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def ready(self) -> bool:
+        """是否值得尝试请求（不占用 half_open 的探测名额）；用于决定直接入队还是立即上传。"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at >= self.cooldown
+            return not (self.state == HALF_OPEN and self._probing)
+
+    def before(self) -> None:
+        """请求前调用；不允许时抛出 CircuitOpenError。"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+
+    def record_success(self) -> None:
+        with self._lock:
+            recovered = self.state != CLOSED
+            self.failures = 0
+            self._probing = False
+            self.cooldown = self.base_cooldown
+            self._set_state(CLOSED)
+        if recovered:
+            log(f"{self.name} circuit closed, remote reachable again")
+            self._notify(CLOSED)
+
+    def record_failure(self, error: Any = "") -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)[:200]
+            if self.state == HALF_OPEN:
+                # 探测失败：重新打开并加倍冷却
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            elif self.state == OPEN or self.failures < self.failure_threshold:
+                return
+            self._probing = False
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+            cooldown = self.cooldown
+        warn(f"{self.name} circuit open after {self.failures} failures, cooling down {cooldown:.0f}s: {self.last_error}")
+        self._notify(OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        retry_in = self.retry_in()
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "cooldown": self.cooldown,
+                "retry_in": round(retry_in, 1),
+                "last_error": self.last_error,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """按名称共享的熔断器（同一仓库的所有 API 客户端共用）。"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
@@ -0,0 +1,241 @@
+"""历史压缩（可选）
+
+备份分支每隔几分钟就新增一个提交且永不清理：虽然启动时以 `--depth=1` 拉取，pull --rebase 仍要与
+不断增长的远端历史协商，GitHub 仓库与新实例的克隆也随之变大。开启压缩后，定期把保留窗口之前的历史
+合并为一个根提交，窗口内的提交逐个保留。
+
+职责：
+- 只拉取保留窗口内的提交（`fetch --shallow-since`，再加深一层得到窗口之前最新的提交作为边界）；
+  边界提交已是压缩产生的根提交，或全部历史都在窗口内时跳过；
+- 在 Git 锁之外重建历史：以边界提交的树创建根提交（标记为 MARKER），窗口内与本地尚未推送的提交按原作者、
+  时间与说明依次 `commit-tree` 到其上（树完全相同，工作区与索引无需变动）；
+- 持有 Git 锁发布：本地 HEAD 在重建期间发生变化则放弃；以 `--force-with-lease=<分支>:<拉取时的远端提交>`
+  强制推送，远端已被其他实例推进（或同时压缩）时推送被拒绝，本次放弃、下个周期重试，不会覆盖他人的提交；
+- 推送成功后移动本地分支与 origin 跟踪分支，并使旧提交的 reflog 失效，旧对象由仓库维护的 gc 清理；
+- 其他实例下一轮 `pull --rebase` 时，git 依据 origin 跟踪分支的 reflog（fork-point）只变基各自未推送的提交。
+
+可调环境变量：
+- SYNC_COMPACTION：是否自动压缩（默认 false；`POST /sync/api/compaction` 可手动触发）；
+- SYNC_COMPACT_RETENTION：保留完整粒度的时间窗口（秒，默认 7 天）；
+- SYNC_COMPACT_INTERVAL：自动压缩的间隔（秒，默认 1 天），从上次压缩（或确认无需压缩）算起；
+- SYNC_COMPACT_RETRY：本次放弃或失败后到下次尝试的间隔（秒，默认 600）。
+状态（上次完成时间、下次重试时间与结果）保存在 `.git/sync-compaction.json`，不提交到仓库。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sync.core import git_ops, metrics
+from sync.utils.logging import err, log, warn
+
+ENABLED = os.environ.get("SYNC_COMPACTION", "false").lower() == "true"
+RETENTION = float(os.environ.get("SYNC_COMPACT_RETENTION", str(7 * 86400)))
+INTERVAL = float(os.environ.get("SYNC_COMPACT_INTERVAL", "86400"))
+RETRY = float(os.environ.get("SYNC_COMPACT_RETRY", "600"))
+MARKER = "chore(sync): compacted history"
+STATE_FILE = os.path.join(".git", "sync-compaction.json")
+
+_FIELDS = ("sha", "tree", "an", "ae", "ad", "cn", "ce", "cd", "body")
+
+
+class Compactor:
+    """单个仓库的历史压缩状态。"""
+
+    def __init__(self, hist_dir: str) -> None:
+        self.hist_dir = hist_dir
+        self.path = os.path.join(hist_dir, STATE_FILE)
+        self._run_lock = threading.Lock()
+        self.last_run = 0.0  # 上次压缩完成或确认无需压缩的时间
+        self.retry_at = 0.0  # 上次放弃/失败后的下次尝试时间
+        self.last_result: Optional[Dict] = None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.last_run = float(data.get("last_run", 0.0))
+            self.retry_at = float(data.get("retry_at", 0.0))
+            self.last_result = data.get("last_result")
+        except (OSError, ValueError):
+            pass
+
+    def _next_run(self) -> float:
+        return max(self.last_run + INTERVAL, self.retry_at)
+
+    def due(self, now: float) -> bool:
+        return ENABLED and now >= self._next_run()
+
+    def _git(self, *args: str, check: bool = True, env: Optional[Dict[str, str]] = None) -> str:
+        return git_ops.run(["git"] + list(args), cwd=self.hist_dir, check=check, env=env).stdout.strip()
+
+    # ---- 窗口与边界 ----
+    def _shallow(self) -> set:
+        try:
+            with open(os.path.join(self.hist_dir, ".git", "shallow"), "r", encoding="utf-8") as f:
+                return {line.strip() for line in f if line.strip()}
+        except OSError:
+            return set()
+
+    def _window(self, branch: str, cutoff: float) -> Tuple[str, Optional[str]]:
+        """拉取保留窗口内的提交，返回 (远端分支提交, 边界提交)；没有需要压缩的历史时边界为 None。"""
+        since = datetime.fromtimestamp(cutoff, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        proc = git_ops.run(
+            ["git", "fetch", "--quiet", f"--shallow-since={since}", "origin", branch], cwd=self.hist_dir, check=False
+        )
+        if proc.returncode != 0:
+            # 窗口内没有提交（git 拒绝空的 shallow 请求）：远端最新提交即为边界
+            git_ops.run(["git", "fetch", "--quiet", "--depth=1", "origin", branch], cwd=self.hist_dir)
+            tip = self._git("rev-parse", f"origin/{branch}")
+            return tip, tip
+        tip = self._git("rev-parse", f"origin/{branch}")
+        oldest = self._git("rev-list", "--first-parent", tip).splitlines()[-1]
+        if oldest not in self._shallow():
+            return tip, None  # 真正的根提交：全部历史都在窗口内（或上次压缩后还没有提交移出窗口）
+        git_ops.run(["git", "fetch", "--quiet", "--deepen=1", "origin", branch], cwd=self.hist_dir)
+        return tip, self._git("rev-parse", f"{oldest}^")
+
+    def _commits(self, boundary: str, head: str) -> List[Dict[str, str]]:
+        """边界之后到 head 的提交（沿第一父提交，旧 → 新）及其作者/时间/说明。"""
+        fmt = "%x1f".join(["%H", "%T", "%an", "%ae", "%ad", "%cn", "%ce", "%cd", "%B"]) + "%x1e"
+        out = git_ops.run(
+            ["git", "log", "--first-parent", "--reverse", "--date=raw", f"--format={fmt}", f"{boundary}..{head}"],
+            cwd=self.hist_dir,
+        ).stdout
+        commits = []
+        for record in out.split("\x1e"):
+            parts = record.strip("\n").split("\x1f")
+            if len(parts) == len(_FIELDS):
+                commits.append(dict(zip(_FIELDS, parts)))
+        return commits
+
+    def _commit_tree(self, tree: str, parent: Optional[str], message: str, meta: Dict[str, str]) -> str:
+        args = ["commit-tree", tree] + (["-p", parent] if parent else []) + ["-m", message]
+        # 保留原提交的作者/提交者与时间
+        env = {
+            "GIT_AUTHOR_NAME": meta["an"], "GIT_AUTHOR_EMAIL": meta["ae"], "GIT_AUTHOR_DATE": meta["ad"],
+            "GIT_COMMITTER_NAME": meta["cn"], "GIT_COMMITTER_EMAIL": meta["ce"], "GIT_COMMITTER_DATE": meta["cd"],
+        }
+        return self._git(*args, env=env)
+
+    # ---- 执行 ----
+    def run(self, branch: str, git_lock: threading.Lock) -> Dict:
+        """压缩一次并返回结果（status 为 compacted / skipped / aborted / failed，附 reason 与耗时）。
+
+        调用方应保证没有同步周期并发执行（守护进程经串行任务队列调用）；只有发布阶段持有 git_lock。
+        """
+        if not self._run_lock.acquire(blocking=False):
+            return {"status": "skipped", "reason": "compaction already running"}
+        started = time.time()
+        try:
+            result = self._run(branch, git_lock, started)
+        except Exception as e:
+            result = {"status": "failed", "reason": str(e)[:500]}
+            err(f"History compaction failed: {e}")
+        finally:
+            self._run_lock.release()
+        result.update(started_at=started, duration=round(time.time() - started, 3))
+        metrics.HISTORY_COMPACTIONS.inc(result=result["status"])
+        if result["status"] in ("compacted", "skipped"):
+            self.last_run = started
+            self.retry_at = 0.0
+        else:
+            # 放弃或失败：不推迟整个间隔，稍后重试
+            self.retry_at = time.time() + RETRY
+        self.last_result = result
+        self._save()
+        return result
+
+    def _run(self, branch: str, git_lock: threading.Lock, started: float) -> Dict:
+        cutoff = started - RETENTION
+        head = self._git("rev-parse", "HEAD")
+        tip, boundary = self._window(branch, cutoff)
+        if boundary is None:
+            return {"status": "skipped", "reason": "all commits are within the retention window"}
+        subject, boundary_date = self._git("log", "-1", "--format=%s%x1f%cI", boundary).split("\x1f")
+        if subject.startswith(MARKER):
+            return {"status": "skipped", "reason": "nothing older than the retention window since the last compaction"}
+        if git_ops.run(["git", "merge-base", "--is-ancestor", tip, head], cwd=self.hist_dir, check=False).returncode:
+            return {"status": "aborted", "reason": "local branch has diverged from origin; retrying after the next sync"}
+        commits = self._commits(boundary, head)
+        meta = dict(zip(_FIELDS, self._git(
+            "log", "-1", "--date=raw", "--format=%H%x1f%T%x1f%an%x1f%ae%x1f%ad%x1f%cn%x1f%ce%x1f%cd%x1f", boundary,
+        ).split("\x1f")))
+        base = self._commit_tree(
+            meta["tree"], None,
+            f"{MARKER} before {boundary_date}\n\nSquashed all history up to {boundary[:12]}; "
+            f"commits after it are kept individually.",
+            meta,
+        )
+        new = base
+        for c in commits:
+            new = self._commit_tree(c["tree"], new, c["body"].rstrip("\n") or "chore(sync): periodic commit", c)
+        if self._git("rev-parse", f"{new}^{{tree}}") != self._git("rev-parse", f"{head}^{{tree}}"):
+            raise git_ops.GitError("rewritten history does not match HEAD tree")
+
+        with git_lock:
+            if self._git("rev-parse", "HEAD") != head:
+                return {"status": "aborted", "reason": "new commits during compaction; retrying later"}
+            push = git_ops.run(
+                ["git", "push", "--quiet", f"--force-with-lease=refs/heads/{branch}:{tip}", "origin",
+                 f"{new}:refs/heads/{branch}"],
+                cwd=self.hist_dir,
+                check=False,
+            )
+            if push.returncode != 0:
+                warn(f"History compaction not published, remote moved: {push.stderr.strip()[-200:]}")
+                return {"status": "aborted", "reason": "remote branch changed (another instance pushed); retrying later"}
+            self._git("update-ref", f"refs/heads/{branch}", new, head)
+            self._git("update-ref", f"refs/remotes/origin/{branch}", new)
+        # 旧提交不再可达：让 reflog 立即失效，由仓库维护的 gc 回收对象
+        self._git("reflog", "expire", "--expire-unreachable=now", "--all", check=False)
+        log(f"Compacted history before {boundary_date}: kept {len(commits)} commits, new head {new[:12]}")
+        return {
+            "status": "compacted",
+            "squashed_before": boundary_date,
+            "kept_commits": len(commits),
+            "base": base,
+            "old_head": head,
+            "new_head": new,
+        }
+
+    def _save(self) -> None:
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"last_run": self.last_run, "retry_at": self.retry_at, "last_result": self.last_result}, f, indent=2
+                )
+            os.replace(tmp, self.path)
+        except OSError as e:
+            err(f"Failed to save compaction state: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": ENABLED,
+            "retention": RETENTION,
+            "interval": INTERVAL,
+            "retry": RETRY,
+            "running": self._run_lock.locked(),
+            "last_run": self.last_run or None,
+            "retry_at": self.retry_at or None,
+            "next_run_in": round(max(0.0, self._next_run() - time.time()), 1) if ENABLED else None,
+            "last_result": self.last_result,
+        }
+
+
+_compactors: Dict[str, Compactor] = {}
+_compactors_lock = threading.Lock()
+
+
+def get_compactor(hist_dir: str) -> Compactor:
+    """每个 hist_dir 共享一个压缩器。"""
+    key = os.path.abspath(hist_dir)
+    with _compactors_lock:
+        c = _compactors.get(key)
+        if c is None:
+            c = _compactors[key] = Compactor(key)
+        return c
@@ -2,15 +2,21 @@
 
 职责：
 - 读取环境变量（GITHUB_PAT/GITHUB_REPO/HIST_DIR/GIT_BRANCH/SYNC_TARGETS/EXCLUDE_PATHS）。
-- 从 `HIST_DIR/sync-config.json` 读取目标与黑名单覆盖项（若存在）。
+- 从 `HIST_DIR/sync-config.json` 读取目标与黑名单覆盖项（若存在），以及分目标调度策略 `policies`
+  （同步间隔、优先级、最大陈旧时间、LFS 阈值，见 `TargetPolicy`）。
+- `SettingsProvider`：缓存不可变、带版本号的 `Settings` 快照，仅在配置文件 mtime 变化时重新加载，
+  并向订阅者（守护进程）推送变更；API 处理函数通过 `get_provider().get()` 读取，无文件 I/O。
 - 提供路径映射工具：
   - `to_abs_under_base(base, rel)`: BASE 相对路径 → 绝对路径；
   - `to_under_hist(hist, rel)`: BASE 相对路径 → 历史仓库下的镜像路径。
 """
 
 import os
-from dataclasses import dataclass
-from typing import List, Dict, Any
+import threading
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sync.utils.logging import err, log
 
 
 DEFAULT_BASE = os.environ.get("BASE", "/")
@@ -53,7 +59,10 @@ DEFAULT_EXCLUDES = (
 SYSTEM_EXCLUDES = [
     ".sync-complete",
     ".sync-progress.json",
+    ".sync-progress.json.*",
     ".sync.ready",
+    ".sync-ready",
+    "*.pointer.tmp",  # LFS 恢复中的临时下载文件（后台恢复可能与周期提交并发）
 ]
 
 # LFS 配置
@@ -63,16 +72,42 @@ DEFAULT_LFS_RELEASE_TAG = os.environ.get("LFS_RELEASE_TAG", "large-files-v1")
 DEFAULT_LFS_MAX_VERSIONS = int(os.environ.get("LFS_MAX_VERSIONS", "3"))  # 每个文件最多保留 3 个版本
 DEFAULT_LFS_MAX_WORKERS = int(os.environ.get("LFS_MAX_WORKERS", "3"))  # 并发下载/上传数
 
+# 同步文件的目标权限（八进制），拉取/恢复后仅对变更路径应用
+DEFAULT_FILE_MODE = int(os.environ.get("SYNC_FILE_MODE", "777"), 8)
+
+
+@dataclass(frozen=True)
+class TargetPolicy:
+    """单个同步目标的调度策略（`sync-config.json` 中 `policies` 的一项，未设置的字段使用全局默认值）。
+
+    - interval：同步间隔（秒），默认 ENV SYNC_INTERVAL；
+    - priority：优先级，越大越先执行；周期超出时间预算时低优先级目标顺延到下一轮；
+    - max_staleness：最大陈旧时间（秒），超过后即使超出预算也必须在本轮同步；
+    - lfs_threshold：该目标内转换为 LFS 的大小阈值（字节），默认 ENV LFS_THRESHOLD；
+    - lazy_restore：启动时该目标的 LFS 文件全部在后台恢复，不阻塞就绪（适合体积大、启动时不需要的缓存）；
+    - min_interval / max_interval：自适应调度的间隔下限与上限（RPO，秒），默认 ENV SYNC_MIN_INTERVAL / SYNC_MAX_INTERVAL
+      （未设置上限时为 interval 本身），见 `sync.core.scheduler`。
+    """
+    target: str
+    interval: Optional[float] = None
+    priority: int = 0
+    max_staleness: Optional[float] = None
+    lfs_threshold: Optional[int] = None
+    lazy_restore: bool = False
+    min_interval: Optional[float] = None
+    max_interval: Optional[float] = None
+
 
-@dataclass
+@dataclass(frozen=True)
 class Settings:
+    """运行时配置快照（不可变）；配置变更时整体替换为新版本。"""
     base: str
     hist_dir: str
     branch: str
     github_pat: str
     github_repo: str
-    targets: List[str]
-    excludes: List[str]
+    targets: Tuple[str, ...]
+    excludes: Tuple[str, ...]
     ready_file: str  # 为兼容保留（守护进程不依赖此项）
     # LFS 配置
     lfs_enabled: bool
@@ -82,6 +117,15 @@ class Settings:
     lfs_max_workers: int
     sync_complete_file: str  # 同步完成标记文件
     sync_progress_file: str  # 同步进度文件
+    sync_ready_dir: str  # 分阶段/分目标就绪标记目录
+    file_mode: int  # 同步文件权限
+    version: int = 0  # 快照版本号，配置文件每次变更后递增
+    policies: Tuple[TargetPolicy, ...] = ()  # 分目标调度策略（仅包含配置文件中声明的目标）
+
+
+def config_path(hist_dir: str) -> str:
+    """覆盖项配置文件路径：`HIST_DIR/sync-config.json`。"""
+    return os.path.join(hist_dir, "sync-config.json")
 
 
 def _load_file_overrides(hist_dir: str) -> Dict[str, Any]:
@@ -90,11 +134,12 @@ def _load_file_overrides(hist_dir: str) -> Dict[str, Any]:
     返回一个 dict，可包含：
     - targets: List[str]
     - excludes: List[str]
+    - policies: Dict[str, Dict]（目标 → {interval, priority, max_staleness, lfs_threshold, lazy_restore}）
     任何异常或不存在时返回空对象。
     """
     import json
 
-    cfg_path = os.path.join(hist_dir, "sync-config.json")
+    cfg_path = config_path(hist_dir)
     try:
         with open(cfg_path, "r", encoding="utf-8") as f:
             obj = json.load(f)
@@ -110,20 +155,23 @@ def _load_file_overrides(hist_dir: str) -> Dict[str, Any]:
 def save_file_overrides(hist_dir: str, data: Dict[str, Any]) -> None:
     """写入覆盖项到 `HIST_DIR/sync-config.json`。
 
-    参数 data 应包含 `targets` 与/或 `excludes`。
+    参数 data 应包含 `targets` 与/或 `excludes`（及可选的 `policies`）。
     """
     import json
 
     os.makedirs(hist_dir, exist_ok=True)
-    cfg_path = os.path.join(hist_dir, "sync-config.json")
-    with open(cfg_path, "w", encoding="utf-8") as f:
+    cfg_path = config_path(hist_dir)
+    # 先写临时文件再改名，避免监视线程读到半截 JSON
+    tmp = f"{cfg_path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, cfg_path)
 
 
-def load_settings() -> Settings:
-    """加载运行时配置。
+def load_settings(version: int = 0) -> Settings:
+    """加载运行时配置（每次调用都会读取配置文件；常驻进程请使用 `get_provider().get()`）。
 
-    优先级：环境变量默认值 → 文件覆盖（仅 targets/excludes）。
+    优先级：环境变量默认值 → 文件覆盖（targets/excludes/policies）。
     返回 Settings 数据类实例。
     """
     base = DEFAULT_BASE.rstrip("/") or "/"
@@ -150,6 +198,8 @@ def load_settings() -> Settings:
         if sys_ex not in excludes:
             excludes.append(sys_ex)
 
+    policies = _parse_policies(overrides.get("policies"), targets)
+
     ready_file = os.environ.get("SYNC_READY_FILE", os.path.join(hist_dir, ".sync.ready"))
     
     # LFS 配置
@@ -161,6 +211,7 @@ def load_settings() -> Settings:
     
     sync_complete_file = os.path.join(hist_dir, ".sync-complete")
     sync_progress_file = os.path.join(hist_dir, ".sync-progress.json")
+    sync_ready_dir = os.path.join(hist_dir, ".sync-ready")
 
     return Settings(
         base=base,
@@ -168,8 +219,8 @@ def load_settings() -> Settings:
         branch=branch,
         github_pat=github_pat,
         github_repo=github_repo,
-        targets=targets,
-        excludes=excludes,
+        targets=tuple(targets),
+        excludes=tuple(excludes),
         ready_file=ready_file,
         lfs_enabled=lfs_enabled,
         lfs_threshold=lfs_threshold,
@@ -178,9 +229,175 @@ def load_settings() -> Settings:
         lfs_max_workers=lfs_max_workers,
         sync_complete_file=sync_complete_file,
         sync_progress_file=sync_progress_file,
+        sync_ready_dir=sync_ready_dir,
+        file_mode=DEFAULT_FILE_MODE,
+        version=version,
+        policies=policies,
     )
 
 
+def _parse_policies(raw: Any, targets: List[str]) -> Tuple[TargetPolicy, ...]:
+    """解析 `policies`：键为目标（与 targets 中的写法一致，前导 / 可省略），非法字段忽略。"""
+    if not isinstance(raw, dict):
+        return ()
+
+    def num(v: Any, cast: Callable[[Any], Any]) -> Any:
+        """非负数值；缺失或非法时返回 None。"""
+        try:
+            value = cast(v)
+        except (TypeError, ValueError):
+            return None
+        return value if value >= 0 else None
+
+    out: List[TargetPolicy] = []
+    for key, spec in raw.items():
+        rel = str(key).lstrip("/")
+        if not isinstance(spec, dict):
+            continue
+        if rel not in targets:
+            # 允许省略目录目标结尾的 /
+            rel = next((t for t in targets if t.rstrip("/") == rel.rstrip("/")), rel)
+        if rel not in targets:
+            err(f"Ignoring policy for unknown target: {key}")
+            continue
+        out.append(TargetPolicy(
+            target=rel,
+            interval=num(spec.get("interval"), float),
+            priority=int(spec["priority"]) if isinstance(spec.get("priority"), (int, float)) else 0,
+            max_staleness=num(spec.get("max_staleness"), float),
+            lfs_threshold=num(spec.get("lfs_threshold"), int),
+            lazy_restore=bool(spec.get("lazy_restore", False)),
+            min_interval=num(spec.get("min_interval"), float),
+            max_interval=num(spec.get("max_interval"), float),
+        ))
+    return tuple(out)
+
+
+def target_policy(st: Settings, rel: str, default_interval: float) -> TargetPolicy:
+    """目标的生效策略：配置文件中的字段优先，其余取全局默认值。"""
+    found = next((p for p in st.policies if p.target == rel), None)
+    return TargetPolicy(
+        target=rel,
+        interval=found.interval if found and found.interval is not None else float(default_interval),
+        priority=found.priority if found else 0,
+        max_staleness=found.max_staleness if found else None,
+        lfs_threshold=found.lfs_threshold if found and found.lfs_threshold is not None else st.lfs_threshold,
+        lazy_restore=found.lazy_restore if found else False,
+        min_interval=found.min_interval if found else None,
+        max_interval=found.max_interval if found else None,
+    )
+
+
+SettingsListener = Callable[[Settings, Settings], None]
+
+
+class SettingsProvider:
+    """缓存的配置提供者。
+
+    - `get()`：返回当前快照，不做任何文件 I/O；
+    - 后台线程每 interval 秒 `stat` 一次配置文件，mtime/大小变化时重新加载并递增版本号；
+    - `update(**overrides)`：写入配置文件并立即重新加载（调用方随后读取即为新版本）；
+    - `subscribe(cb)`：变更时以 `cb(old, new)` 通知（在触发重新加载的线程中调用）。
+    """
+
+    def __init__(self, loader: Callable[[int], Settings] = load_settings, interval: float = 2.0) -> None:
+        self._loader = loader
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()  # 串行化“读-改-写”配置文件
+        self._listeners: List[SettingsListener] = []
+        self._current = loader(1)
+        self._stamp = self._file_stamp(self._current.hist_dir)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _file_stamp(hist_dir: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(config_path(hist_dir))
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def get(self) -> Settings:
+        return self._current
+
+    def subscribe(self, listener: SettingsListener) -> None:
+        with self._lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: SettingsListener) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def check(self) -> bool:
+        """配置文件有变化则重新加载；返回是否产生了新版本。"""
+        if self._file_stamp(self._current.hist_dir) == self._stamp:
+            return False
+        return self.reload()
+
+    def reload(self) -> bool:
+        """重新加载配置；内容未变时只更新文件戳，不递增版本。返回是否产生了新版本。"""
+        with self._lock:
+            old = self._current
+            self._stamp = self._file_stamp(old.hist_dir)
+            new = self._loader(old.version + 1)
+            if replace(new, version=old.version) == old:
+                return False
+            self._current = new
+            listeners = list(self._listeners)
+        log(f"Settings reloaded (v{new.version}): {len(new.targets)} targets, {len(new.excludes)} excludes")
+        for listener in listeners:
+            try:
+                listener(old, new)
+            except Exception as e:
+                err(f"Settings listener failed: {e}")
+        return True
+
+    def update(self, **overrides: Any) -> Settings:
+        """保存 targets/excludes 覆盖项并立即生效，返回新快照（文件中的其他键如 policies 原样保留）。"""
+        with self._update_lock:
+            cur = self._current
+            data = _load_file_overrides(cur.hist_dir)
+            data.update({"targets": list(cur.targets), "excludes": list(cur.excludes)})
+            data.update({k: list(v) for k, v in overrides.items()})
+            save_file_overrides(cur.hist_dir, data)
+            self.reload()
+            return self._current
+
+    def start(self) -> None:
+        """启动后台监视线程（幂等）。"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name="sync-settings", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                err(f"Settings reload failed: {e}")
+
+
+_provider: Optional[SettingsProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> SettingsProvider:
+    """进程内共享的配置提供者（首次调用时加载并启动监视线程，间隔 ENV SYNC_CONFIG_POLL，默认 2 秒）。"""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = SettingsProvider(interval=float(os.environ.get("SYNC_CONFIG_POLL", "2")))
+            _provider.start()
+        return _provider
+
+
 def to_abs_under_base(base: str, rel: str) -> str:
     """将 BASE 相对路径转换为绝对路径。
     例如 base='/'，rel='home/user/AstrBot/data' → '/home/user/AstrBot/data'
@@ -0,0 +1,209 @@
+"""增量空目录跟踪
+
+职责：
+- 维护持久化的目录索引（`.git/sync-empty-dirs.json`）：每个目录的 mtime、子目录列表与是否已放置 `.gitkeep`；
+- 每轮只对 mtime 变化（或被显式标记为脏）的目录执行 `scandir`，其余目录仅 `stat` 并沿索引中的子目录下行；
+- 空目录写入 `.gitkeep`，目录有了其他内容后移除过期的 `.gitkeep`，两者在扫描结束后一次性批量执行；
+  命中黑名单的条目不算内容（只含被排除条目的目录在 Git 中仍是空的，需要保留 `.gitkeep`）；
+  黑名单变化时整棵树重新检查；
+- 同步周期把 pull 变更文件所在的目录（及其父目录）标记为脏（`mark_dirty`），即使 mtime 未变也会重新检查；
+- 返回扫描统计，便于与全量扫描（每个目录一次 listdir）对比。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+from sync.core.blacklist import is_excluded
+from sync.core.config import to_under_hist
+from sync.utils.logging import err, log
+
+KEEP = ".gitkeep"
+INDEX_VERSION = 1
+
+
+@dataclass
+class EmptyDirStats:
+    """一轮跟踪的统计。`dirs_total` 即全量扫描所需的 listdir 次数。"""
+    dirs_total: int = 0
+    dirs_scanned: int = 0
+    written: int = 0
+    removed: int = 0
+    elapsed_ms: float = 0.0
+
+
+class EmptyDirTracker:
+    """基于目录 mtime 的增量空目录跟踪器（线程安全）。"""
+
+    def __init__(self, hist_dir: str, index_path: Optional[str] = None) -> None:
+        self.hist_dir = os.path.abspath(hist_dir)
+        self.index_path = index_path or os.path.join(self.hist_dir, ".git", "sync-empty-dirs.json")
+        self._lock = threading.Lock()
+        self._dirty: Set[str] = set()
+        # rel -> {"m": mtime_ns, "d": [子目录名], "k": 是否有 .gitkeep, "e": 是否有其他条目}
+        self._dirs: Dict[str, Dict] = {}
+        self._excludes: List[str] = []  # 索引对应的黑名单；变化时需全部重新扫描
+        self._changed = False
+        self._load()
+
+    # -------- 索引持久化 --------
+    def _load(self) -> None:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get("version") == INDEX_VERSION:
+                self._dirs = data.get("dirs", {})
+                self._excludes = list(data.get("excludes", []))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            err(f"Failed to load empty-dir index, rebuilding: {e}")
+            self._dirs = {}
+
+    def _save(self) -> None:
+        if not self._changed:
+            return
+        tmp = self.index_path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": INDEX_VERSION, "excludes": self._excludes, "dirs": self._dirs}, f, ensure_ascii=False)
+            os.replace(tmp, self.index_path)
+            self._changed = False
+        except OSError as e:
+            err(f"Failed to save empty-dir index: {e}")
+
+    # -------- 外部通知 --------
+    def mark_dirty(self, paths: Iterable[str]) -> None:
+        """标记目录需要重新检查（绝对路径或相对 hist_dir），例如 pull 变更文件所在的目录。"""
+        with self._lock:
+            for p in paths:
+                if not p:
+                    continue
+                ap = p if os.path.isabs(p) else os.path.join(self.hist_dir, p)
+                self._dirty.add(os.path.relpath(os.path.normpath(ap), self.hist_dir))
+
+    # -------- 扫描 --------
+    def _scan(self, rel: str, abs_path: str, st_mtime: int, excludes: List[str]) -> Dict:
+        subdirs: List[str] = []
+        has_keep = False
+        has_other = False
+        with os.scandir(abs_path) as it:
+            for entry in it:
+                if entry.name == KEEP:
+                    has_keep = True
+                    continue
+                if is_excluded(f"{rel}/{entry.name}", excludes):
+                    continue  # 不会进入 Git，不算内容
+                if entry.is_dir(follow_symlinks=False) and entry.name != ".git":
+                    subdirs.append(entry.name)
+                has_other = True
+        return {"m": st_mtime, "d": subdirs, "k": has_keep, "e": has_other}
+
+    def track(self, rel_targets: Iterable[str], excludes: Iterable[str]) -> EmptyDirStats:
+        """跟踪给定目标下的空目录（跳过黑名单子树），返回统计。"""
+        started = time.perf_counter()
+        stats = EmptyDirStats()
+        rel_targets = list(rel_targets)
+        excludes = list(excludes)
+        with self._lock:
+            rescan = sorted(excludes) != sorted(self._excludes)
+            if rescan:
+                self._excludes = sorted(excludes)
+                self._changed = True
+            to_write: List[str] = []
+            to_remove: List[str] = []
+            seen: Set[str] = set()
+            stack = []
+            for rel in rel_targets:
+                root = to_under_hist(self.hist_dir, rel.rstrip("/"))
+                if os.path.isdir(root) and not os.path.islink(root):
+                    stack.append(os.path.relpath(root, self.hist_dir))
+            while stack:
+                rel = stack.pop()
+                if rel in seen or is_excluded(rel, excludes):
+                    continue
+                seen.add(rel)
+                abs_path = os.path.join(self.hist_dir, rel)
+                try:
+                    st = os.lstat(abs_path)
+                except OSError:
+                    continue
+                stats.dirs_total += 1
+                rec = self._dirs.get(rel)
+                if rescan or rec is None or rec["m"] != st.st_mtime_ns or rel in self._dirty:
+                    try:
+                        rec = self._scan(rel, abs_path, st.st_mtime_ns, excludes)
+                    except OSError:
+                        continue
+                    self._dirs[rel] = rec
+                    self._changed = True
+                    stats.dirs_scanned += 1
+                    if not rec["e"] and not rec["k"]:
+                        to_write.append(rel)
+                    elif rec["e"] and rec["k"]:
+                        to_remove.append(rel)
+                for name in rec["d"]:
+                    stack.append(f"{rel}/{name}")
+            self._dirty.difference_update(seen)
+
+            # 批量写入/移除 .gitkeep，并刷新受影响目录的 mtime
+            for rel in to_write:
+                try:
+                    open(os.path.join(self.hist_dir, rel, KEEP), "a").close()
+                    stats.written += 1
+                    self._refresh(rel, keep=True)
+                except OSError as e:
+                    err(f"Failed to write {KEEP} in {rel}: {e}")
+            for rel in to_remove:
+                try:
+                    os.remove(os.path.join(self.hist_dir, rel, KEEP))
+                    stats.removed += 1
+                    self._refresh(rel, keep=False)
+                except OSError as e:
+                    err(f"Failed to remove {KEEP} in {rel}: {e}")
+
+            # 清理已不存在目录的索引项（仅限本次扫描的目标子树）
+            roots = [os.path.relpath(to_under_hist(self.hist_dir, t.rstrip("/")), self.hist_dir) for t in rel_targets]
+            for rel in list(self._dirs):
+                if rel not in seen and any(rel == r or rel.startswith(r + "/") for r in roots):
+                    del self._dirs[rel]
+                    self._changed = True
+            self._save()
+        stats.elapsed_ms = (time.perf_counter() - started) * 1000
+        if stats.written or stats.removed or stats.dirs_scanned:
+            log(
+                f"空目录跟踪：检查 {stats.dirs_scanned}/{stats.dirs_total} 个目录"
+                f"（全量扫描需 {stats.dirs_total} 次），写入 {stats.written}、移除 {stats.removed} 个 {KEEP}，"
+                f"耗时 {stats.elapsed_ms:.1f}ms"
+            )
+        return stats
+
+    def _refresh(self, rel: str, keep: bool) -> None:
+        rec = self._dirs.get(rel)
+        if rec is None:
+            return
+        try:
+            rec["m"] = os.lstat(os.path.join(self.hist_dir, rel)).st_mtime_ns
+        except OSError:
+            pass
+        rec["k"] = keep
+
+
+_trackers: Dict[str, EmptyDirTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(hist_dir: str) -> EmptyDirTracker:
+    """每个 hist_dir 共享一个跟踪器实例。"""
+    key = os.path.abspath(hist_dir)
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = _trackers[key] = EmptyDirTracker(key)
+        return tracker
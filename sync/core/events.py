@@ -0,0 +1,146 @@
+"""进程内事件总线
+
+职责：
+- 发布/订阅同步进度事件（阶段变化、单文件字节进度与吞吐），供 `/sync/api/events`（SSE）推送；
+- 带 key 的事件可合并：订阅者尚未取走时，同 key 的新事件覆盖旧事件（高频的文件进度只保留最新值）；
+- `ThrottledFileSink`：将进度以节流 + 原子改名的方式写入文件，供 shell 脚本与 Nginx 状态页读取。
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from sync.utils.logging import err
+
+
+class Subscriber:
+    """单个订阅者：按 key 合并的待取事件 + 唤醒回调。"""
+
+    def __init__(self, waker: Optional[Callable[[], None]] = None) -> None:
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._pending: "OrderedDict[Any, Dict]" = OrderedDict()
+        self._waker = waker
+        self.dropped = 0  # 被合并掉的事件数
+
+    def _push(self, key: Any, event: Dict) -> None:
+        with self._lock:
+            if key in self._pending:
+                self.dropped += 1
+                # 合并：保留最新值，但移到队尾以保持时间顺序
+                del self._pending[key]
+            self._pending[key] = event
+            self._cond.notify()
+        if self._waker:
+            try:
+                self._waker()
+            except Exception:
+                pass
+
+    def drain(self) -> List[Dict]:
+        """取走全部待发事件（非阻塞）。"""
+        with self._lock:
+            events = list(self._pending.values())
+            self._pending.clear()
+            return events
+
+    def get(self, timeout: Optional[float] = None) -> List[Dict]:
+        """阻塞直到有事件或超时，返回全部待发事件。"""
+        with self._lock:
+            if not self._pending:
+                self._cond.wait(timeout)
+            events = list(self._pending.values())
+            self._pending.clear()
+            return events
+
+
+class EventBus:
+    """线程安全的发布/订阅总线。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subs: List[Subscriber] = []
+        self._seq = itertools.count(1)
+        self._last: Dict[str, Dict] = {}  # 每类事件的最新一条，供新订阅者初始化
+
+    def subscribe(self, waker: Optional[Callable[[], None]] = None) -> Subscriber:
+        sub = Subscriber(waker)
+        with self._lock:
+            self._subs.append(sub)
+            last = list(self._last.values())
+        for event in last:
+            sub._push(("init", event["type"]), event)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+
+    def publish(self, event_type: str, data: Dict, key: Optional[str] = None) -> None:
+        """发布事件；给定 key 时允许与同 key 的未取事件合并。"""
+        event = {"id": next(self._seq), "type": event_type, "ts": time.time(), "data": data}
+        with self._lock:
+            self._last[event_type] = event
+            subs = list(self._subs)
+        merge_key = key if key is not None else ("seq", event["id"])
+        for sub in subs:
+            sub._push(merge_key, event)
+
+
+class ThrottledFileSink:
+    """节流写文件：两次写入至少间隔 interval 秒，窗口内只保留最新值并在窗口结束时补写。
+
+    写入采用临时文件 + `os.replace`，读者不会读到半截 JSON。
+    """
+
+    def __init__(self, path: str, interval: float = 1.0) -> None:
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+        self._pending: Optional[Dict] = None
+        self._timer: Optional[threading.Timer] = None
+        self.writes = 0
+
+    def write(self, data: Dict, force: bool = False) -> None:
+        with self._lock:
+            now = time.monotonic()
+            wait = self._last_write + self.interval - now
+            if force or wait <= 0:
+                self._pending = None
+                self._write_locked(data)
+                return
+            self._pending = data
+            if self._timer is None:
+                self._timer = threading.Timer(wait, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush(self) -> None:
+        with self._lock:
+            self._timer = None
+            if self._pending is not None:
+                data, self._pending = self._pending, None
+                self._write_locked(data)
+
+    def _write_locked(self, data: Dict) -> None:
+        try:
+            parent = os.path.dirname(self.path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                # 紧凑格式，便于 shell 脚本用 grep 提取 "stage":"..." 等字段
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+            self._last_write = time.monotonic()
+            self.writes += 1
+        except Exception as e:
+            err(f"Failed to write progress: {e}")
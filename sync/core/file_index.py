@@ -0,0 +1,236 @@
+"""仓库文件索引（分页浏览）
+
+职责：
+- 以 `git ls-files -z --stage` 构建已跟踪文件的有序索引（路径、模式、blob 哈希）；
+- 按 (HEAD 提交, `.git/index` mtime) 缓存：两者都通过读文件/stat 得到，翻页请求不会启动 git 子进程；
+  Web 路由使用 `page_async`，重建时经 `git_async` 流式读取，不阻塞事件循环；
+- 游标分页（游标为上一页最后一个路径，索引重建后仍然有效）、前缀过滤（二分定位）与 glob 过滤；
+- 仅对当前页的条目补充注解：工作区大小、是否为 LFS 指针及其记录的大小、本地实际文件是否存在
+  （异步路由中在线程里执行，不占用事件循环）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import binascii
+import bisect
+import fnmatch
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sync.core import git_async, git_ops
+from sync.core.pointer import read_pointer
+from sync.utils.logging import log, warn
+
+MAX_PAGE = 1000
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """某一 HEAD/索引状态下的文件列表（按路径排序，与 git 的字节序一致）。"""
+    key: Tuple[str, int]
+    paths: List[str]
+    modes: List[str]
+    blobs: List[str]
+    built_at: float
+    build_ms: float
+
+
+def encode_cursor(path: str) -> str:
+    return base64.urlsafe_b64encode(path.encode("utf-8", "surrogateescape")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    """解码 next_cursor；格式不合法时抛出 ValueError。"""
+    pad = "=" * (-len(cursor) % 4)
+    try:
+        raw = base64.b64decode((cursor + pad).encode("ascii"), altchars=b"-_", validate=True)
+        return raw.decode("utf-8", "surrogateescape")
+    except (binascii.Error, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+class FileIndex:
+    """单个仓库的文件索引缓存（线程安全）。"""
+
+    def __init__(self, hist_dir: str) -> None:
+        self.hist_dir = os.path.abspath(hist_dir)
+        self._lock = threading.Lock()
+        self._snap: Optional[IndexSnapshot] = None
+        self.builds = 0
+
+    def _key(self) -> Tuple[str, int]:
+        try:
+            mtime = os.stat(os.path.join(self.hist_dir, ".git", "index")).st_mtime_ns
+        except OSError:
+            mtime = 0
+        return git_ops.read_head(self.hist_dir), mtime
+
+    def snapshot(self) -> IndexSnapshot:
+        """返回当前索引；HEAD 或 `.git/index` 变化时重建（一次 git 调用）。"""
+        key = self._key()
+        snap = self._snap
+        if snap is not None and snap.key == key:
+            return snap
+        with self._lock:
+            snap = self._snap
+            if snap is not None and snap.key == key:
+                return snap
+            snap = self._build(key)
+            self._snap = snap
+            return snap
+
+    def _build(self, key: Tuple[str, int]) -> IndexSnapshot:
+        started = time.perf_counter()
+        proc = git_ops.run(["git", "ls-files", "-z", "--stage"], cwd=self.hist_dir, check=False)
+        records = proc.stdout.split("\0") if proc.returncode == 0 else []
+        return self._parse(key, records, started)
+
+    async def snapshot_async(self) -> IndexSnapshot:
+        """`snapshot` 的异步版本：重建时通过 git_async 流式读取 ls-files，不阻塞事件循环。"""
+        key = self._key()
+        snap = self._snap
+        if snap is not None and snap.key == key:
+            return snap
+        async with git_async.limit(git_async.HEAVY):
+            snap = self._snap
+            if snap is not None and snap.key == key:
+                return snap  # 排队期间已被其他请求重建
+            started = time.perf_counter()
+            try:
+                records = [
+                    rec async for rec in git_async.stream(
+                        ["git", "ls-files", "-z", "--stage"], cwd=self.hist_dir, sep=b"\0",
+                        timeout=120.0, klass=None,
+                    )
+                ]
+            except git_ops.GitError as e:
+                # 与 `snapshot` 一致返回空索引；不缓存，下次请求重试
+                warn(f"File index rebuild failed: {str(e)[:200]}")
+                return self._parse(key, [], started)
+            snap = self._parse(key, records, started)
+            self._snap = snap
+            return snap
+
+    def _parse(self, key: Tuple[str, int], records: Iterable[str], started: float) -> IndexSnapshot:
+        paths: List[str] = []
+        modes: List[str] = []
+        blobs: List[str] = []
+        last = None
+        for rec in records:
+            if not rec:
+                continue
+            # 格式：<mode> SP <object> SP <stage> TAB <path>
+            meta, _, path = rec.partition("\t")
+            if path == last:
+                continue  # 合并冲突时同一路径有多个 stage，只保留第一个
+            parts = meta.split()
+            if len(parts) < 2:
+                continue
+            paths.append(path)
+            modes.append(parts[0])
+            blobs.append(parts[1])
+            last = path
+        elapsed = (time.perf_counter() - started) * 1000
+        self.builds += 1
+        if len(paths) > 10000:
+            log(f"File index rebuilt: {len(paths)} files in {elapsed:.0f}ms")
+        return IndexSnapshot(key, paths, modes, blobs, time.time(), round(elapsed, 1))
+
+    def _annotate(self, snap: IndexSnapshot, i: int) -> Dict:
+        path = snap.paths[i]
+        entry: Dict = {"path": path, "mode": snap.modes[i], "blob": snap.blobs[i]}
+        abs_path = os.path.join(self.hist_dir, path)
+        try:
+            entry["size"] = os.lstat(abs_path).st_size
+        except OSError:
+            entry["size"] = None  # 已跟踪但工作区缺失
+        if path.endswith(".pointer"):
+            pointer = read_pointer(abs_path)
+            if pointer is not None:
+                entry["lfs"] = {
+                    "size": pointer.size,
+                    "hash": pointer.hash,
+                    "local": os.path.exists(abs_path[:-8]),
+                }
+        return entry
+
+    def page(
+        self,
+        cursor: str = "",
+        limit: int = 100,
+        prefix: str = "",
+        glob: str = "",
+        annotate: bool = True,
+    ) -> Dict:
+        """返回一页文件。
+
+        - cursor：上一页返回的 next_cursor（空表示从头开始）；
+        - prefix：路径前缀（如 `home/user/AstrBot/data/`），二分定位，不扫描其他路径；
+        - glob：fnmatch 模式（`*` 可跨目录），在前缀范围内逐条匹配；
+        返回 {files, next_cursor, total, head}，total 为仓库文件总数；没有下一页时 next_cursor 为 None。
+        """
+        return self._page(self.snapshot(), cursor, limit, prefix, glob, annotate)
+
+    async def page_async(
+        self,
+        cursor: str = "",
+        limit: int = 100,
+        prefix: str = "",
+        glob: str = "",
+        annotate: bool = True,
+    ) -> Dict:
+        """`page` 的异步版本；注解需要逐条 lstat/读取指针，放到线程中执行。"""
+        snap = await self.snapshot_async()
+        if annotate:
+            return await asyncio.to_thread(self._page, snap, cursor, limit, prefix, glob, annotate)
+        return self._page(snap, cursor, limit, prefix, glob, annotate)
+
+    def _page(self, snap: IndexSnapshot, cursor: str, limit: int, prefix: str, glob: str, annotate: bool) -> Dict:
+        limit = max(1, min(limit, MAX_PAGE))
+        paths = snap.paths
+        prefix = prefix.lstrip("/")
+        lo = bisect.bisect_left(paths, prefix) if prefix else 0
+        if cursor:
+            lo = max(lo, bisect.bisect_right(paths, decode_cursor(cursor)))
+        matcher = re.compile(fnmatch.translate(glob)) if glob else None
+
+        picked: List[int] = []
+        i = lo
+        n = len(paths)
+        while i < n and len(picked) <= limit:
+            p = paths[i]
+            if prefix and not p.startswith(prefix):
+                break
+            if matcher is None or matcher.match(p):
+                picked.append(i)
+            i += 1
+        has_more = len(picked) > limit
+        picked = picked[:limit]
+        files = [self._annotate(snap, j) if annotate else {"path": paths[j]} for j in picked]
+        return {
+            "files": files,
+            "next_cursor": encode_cursor(paths[picked[-1]]) if has_more and picked else None,
+            "total": n,
+            "head": snap.key[0],
+            "index_built_at": snap.built_at,
+        }
+
+
+_indexes: Dict[str, FileIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_file_index(hist_dir: str) -> FileIndex:
+    """每个 hist_dir 共享一个索引实例。"""
+    key = os.path.abspath(hist_dir)
+    with _indexes_lock:
+        idx = _indexes.get(key)
+        if idx is None:
+            idx = _indexes[key] = FileIndex(key)
+        return idx
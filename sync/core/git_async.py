@@ -0,0 +1,162 @@
+"""异步只读 git 辅助函数（供 Web 路由使用）
+
+职责：
+- 基于 `asyncio.create_subprocess_exec` 执行 git，不占用 Starlette 线程池，慢命令不会饿死状态轮询；
+- 超时后终止子进程并抛出 `GitTimeout`；
+- `stream()` 按分隔符（如 `-z` 的 NUL）逐条产出输出，无需等待命令结束；
+- 按命令类别限制并发：`light`（status/rev-parse/短 log）与 `heavy`（ls-files/长 log 等），
+  重请求最多占用 heavy 名额，仪表盘的轻量请求始终有空位。
+  并发数由 ENV SYNC_GIT_LIGHT_CONCURRENCY（默认 4）与 SYNC_GIT_HEAVY_CONCURRENCY（默认 1）配置。
+
+写操作（pull/commit/push 等）仍通过同步的 `git_ops` 在任务队列中串行执行。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import subprocess
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+from sync.core import metrics
+from sync.core.git_ops import GitError
+
+LIGHT = "light"
+HEAVY = "heavy"
+DEFAULT_TIMEOUT = 30.0
+
+_LIMITS = {
+    LIGHT: int(os.environ.get("SYNC_GIT_LIGHT_CONCURRENCY", "4")),
+    HEAVY: int(os.environ.get("SYNC_GIT_HEAVY_CONCURRENCY", "1")),
+}
+# 信号量按事件循环区分（测试客户端等可能在不同循环中调用）
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class GitTimeout(GitError):
+    pass
+
+
+def _semaphore(klass: str) -> asyncio.Semaphore:
+    per_loop = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    sem = per_loop.get(klass)
+    if sem is None:
+        sem = per_loop[klass] = asyncio.Semaphore(max(1, _LIMITS.get(klass, 1)))
+    return sem
+
+
+@asynccontextmanager
+async def limit(klass: Optional[str]):
+    """占用一个 klass 类别的并发名额；klass 为 None 时不限制（调用方已持有名额）。"""
+    if klass is None:
+        yield
+        return
+    async with _semaphore(klass):
+        yield
+
+
+async def _kill(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+
+
+async def run(
+    cmd: List[str],
+    cwd: Optional[str] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    check: bool = False,
+    klass: Optional[str] = LIGHT,
+) -> subprocess.CompletedProcess:
+    """异步执行命令并收集输出（文本），语义与 `git_ops.run` 一致；超时抛出 `GitTimeout`。"""
+    sub = metrics.git_subcommand(cmd)
+    async with limit(klass):
+        started = time.perf_counter()
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            out, errb = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            await _kill(proc)
+            metrics.GIT_COMMAND_FAILURES.inc(subcommand=sub)
+            raise GitTimeout(f"Command timed out after {timeout}s: {' '.join(cmd)}")
+        except asyncio.CancelledError:
+            # 客户端断开等原因取消请求时不遗留子进程
+            await _kill(proc)
+            raise
+        metrics.GIT_COMMAND_SECONDS.observe(time.perf_counter() - started, subcommand=sub)
+    stdout = out.decode("utf-8", "replace")
+    stderr = errb.decode("utf-8", "replace")
+    if proc.returncode != 0:
+        metrics.GIT_COMMAND_FAILURES.inc(subcommand=sub)
+        if check:
+            raise GitError(f"Command failed: {' '.join(cmd)}\nstdout: {stdout}\nstderr: {stderr}")
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+async def stream(
+    cmd: List[str],
+    cwd: Optional[str] = None,
+    sep: bytes = b"\n",
+    timeout: float = DEFAULT_TIMEOUT,
+    klass: Optional[str] = HEAVY,
+    chunk_size: int = 64 * 1024,
+) -> AsyncIterator[str]:
+    """逐条产出命令输出（按 sep 切分，UTF-8 解码）；总耗时超过 timeout 时终止并抛出 `GitTimeout`。
+
+    非零退出码在输出结束后抛出 `GitError`。
+    """
+    sub = metrics.git_subcommand(cmd)
+    async with limit(klass):
+        started = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            buf = b""
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                chunk = await asyncio.wait_for(proc.stdout.read(chunk_size), remaining)
+                if not chunk:
+                    break
+                buf += chunk
+                *records, buf = buf.split(sep)
+                for rec in records:
+                    yield rec.decode("utf-8", "surrogateescape")
+            if buf:
+                yield buf.decode("utf-8", "surrogateescape")
+            errb = await asyncio.wait_for(proc.stderr.read(), max(0.1, deadline - time.monotonic()))
+            await asyncio.wait_for(proc.wait(), max(0.1, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            await _kill(proc)
+            metrics.GIT_COMMAND_FAILURES.inc(subcommand=sub)
+            raise GitTimeout(f"Command timed out after {timeout}s: {' '.join(cmd)}")
+        except BaseException:
+            # 消费方提前退出（GeneratorExit）或请求被取消
+            await _kill(proc)
+            raise
+        metrics.GIT_COMMAND_SECONDS.observe(time.perf_counter() - started, subcommand=sub)
+    if proc.returncode != 0:
+        metrics.GIT_COMMAND_FAILURES.inc(subcommand=sub)
+        raise GitError(f"Command failed: {' '.join(cmd)}\nstderr: {errb.decode('utf-8', 'replace')}")
+
+
+async def rev_parse(hist_dir: str, ref: str = "HEAD", timeout: float = 10.0) -> str:
+    """解析引用为提交哈希；失败或超时返回空串。"""
+    try:
+        proc = await run(["git", "rev-parse", "--verify", "--quiet", ref], cwd=hist_dir, timeout=timeout)
+    except GitError:
+        return ""
+    return proc.stdout.strip() if proc.returncode == 0 else ""
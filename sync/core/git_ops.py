@@ -13,24 +13,39 @@ from __future__ import annotations
 
 import os
 import subprocess
-from typing import List, Optional
+import time
+from typing import Dict, List, Optional
 
-from sync.utils.logging import log, err, mask_token
+from sync.core import metrics, tracing
+from sync.utils.logging import log, err, mask_token, warn
 
 
 class GitError(RuntimeError):
     pass
 
 
-def run(cmd: List[str], cwd: Optional[str] = None, check: bool = True) -> subprocess.CompletedProcess:
+def run(
+    cmd: List[str], cwd: Optional[str] = None, check: bool = True, env: Optional[Dict[str, str]] = None
+) -> subprocess.CompletedProcess:
     """运行子进程命令。
 
     - cmd: 命令及参数列表；
     - cwd: 工作目录；
-    - check: True 时非零退出码将抛出 `GitError`。
-    返回 CompletedProcess。
+    - check: True 时非零退出码将抛出 `GitError`；
+    - env: 追加到当前进程环境的变量（如 commit-tree 的作者信息）。
+    返回 CompletedProcess。耗时按子命令记录到 `sync_git_command_duration_seconds` 与追踪 span。
     """
-    proc = subprocess.run(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    sub = metrics.git_subcommand(cmd)
+    started = time.perf_counter()
+    with tracing.span(f"git {sub}", cat="git", argv=mask_token(" ".join(cmd[:8]))) as sp:
+        proc = subprocess.run(
+            cmd, cwd=cwd, env={**os.environ, **env} if env else None,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        sp["returncode"] = proc.returncode
+    metrics.GIT_COMMAND_SECONDS.observe(time.perf_counter() - started, subcommand=sub)
+    if proc.returncode != 0:
+        metrics.GIT_COMMAND_FAILURES.inc(subcommand=sub)
     if check and proc.returncode != 0:
         raise GitError(f"Command failed: {' '.join(cmd)}\nstdout: {proc.stdout}\nstderr: {proc.stderr}")
     return proc
@@ -124,16 +139,58 @@ def push(hist_dir: str, branch: str) -> None:
     run(["git", "push", "-u", "origin", branch], cwd=hist_dir)
 
 
-def add_all_and_commit_if_needed(hist_dir: str, message: str) -> bool:
+def pull_rebase(hist_dir: str, branch: str, keep: Optional[List[str]] = None) -> subprocess.CompletedProcess:
+    """执行 `git pull --rebase --autostash origin <branch>`（失败只记录警告）。
+
+    keep 为工作区内容有意与索引不同的已跟踪文件（正在写入的 SQLite 数据库，索引中是其快照）：
+    拉取期间标记为 skip-worktree，autostash 不会暂存并重写它们（重写会替换文件，应用仍写入旧的 inode）；
+    远端修改了这些文件时 git 拒绝本次拉取，下一轮重试。
+    """
+    kept: List[str] = []
+    if keep:
+        proc = run(["git", "ls-files", "-z", "--"] + list(keep), cwd=hist_dir, check=False)
+        kept = [f for f in proc.stdout.split("\0") if f] if proc.returncode == 0 else []
+    if kept:
+        run(["git", "update-index", "--skip-worktree", "--"] + kept, cwd=hist_dir, check=False)
+    try:
+        proc = run(["git", "pull", "--rebase", "--autostash", "origin", branch], cwd=hist_dir, check=False)
+    finally:
+        if kept:
+            run(["git", "update-index", "--no-skip-worktree", "--"] + kept, cwd=hist_dir, check=False)
+    if proc.returncode != 0:
+        warn(f"git pull failed: {proc.stderr.strip()[-300:]}", key="git.pull")
+    return proc
+
+
+def add_all_and_commit_if_needed(
+    hist_dir: str,
+    message: str,
+    paths: Optional[List[str]] = None,
+    overrides: Optional[Dict[str, Optional[str]]] = None,
+) -> bool:
     """`git add -A` 后，仅当“索引中存在变更”才提交。
 
     说明：有些情况下 `git status --porcelain` 可能显示“工作区未暂存变更”，
     这会导致直接 `git commit` 报错。为避免守护进程崩溃，改为检测索引差异：
     使用 `git diff --cached --quiet` 的退出码判断是否有暂存变更（1 表示有差异）。
 
+    paths 非空时只暂存这些路径（相对仓库根，分目标同步使用）；既不存在也未被跟踪的路径会被跳过，
+    以免 git 因 pathspec 不匹配而放弃整条命令。
+
+    overrides 为 {相对路径: 内容来源文件}：暂存后用来源文件的内容替换该路径的索引条目
+    （SQLite 一致性快照，见 `sync.core.sqlite_snap`）；来源为 None 时该路径保持 HEAD 中的版本。
+
     返回：是否进行了提交。
     """
-    run(["git", "add", "-A"], cwd=hist_dir, check=False)
+    if paths is None:
+        run(["git", "add", "-A"], cwd=hist_dir, check=False)
+    else:
+        specs = _existing_pathspecs(hist_dir, paths)
+        if not specs:
+            return False
+        run(["git", "add", "-A", "--"] + specs, cwd=hist_dir, check=False)
+    if overrides:
+        _stage_overrides(hist_dir, overrides)
     # 0 表示没有差异；1 表示存在差异；其他码为错误
     proc = run(["git", "diff", "--cached", "--quiet"], cwd=hist_dir, check=False)
     if proc.returncode == 1:
@@ -144,3 +201,77 @@ def add_all_and_commit_if_needed(hist_dir: str, message: str) -> bool:
     else:
         # diff 命令异常，保守起见不提交
         return False
+
+
+def _stage_overrides(hist_dir: str, overrides: Dict[str, Optional[str]]) -> None:
+    """用指定文件的内容替换索引条目（一次 hash-object + 一次 update-index）。"""
+    keep_head = [rel for rel, src in overrides.items() if src is None]
+    items = [(rel, src) for rel, src in overrides.items() if src is not None]
+    if keep_head:
+        run(["git", "reset", "-q", "HEAD", "--"] + keep_head, cwd=hist_dir, check=False)
+    if not items:
+        return
+    proc = run(["git", "hash-object", "-w", "--"] + [src for _, src in items], cwd=hist_dir, check=False)
+    shas = proc.stdout.split()
+    if proc.returncode != 0 or len(shas) != len(items):
+        err(f"Failed to stage {len(items)} snapshot(s): {proc.stderr.strip()}")
+        return
+    cmd = ["git", "update-index", "--add"]
+    for (rel, _), sha in zip(items, shas):
+        cmd += ["--cacheinfo", f"100644,{sha},{rel}"]
+    run(cmd, cwd=hist_dir, check=False)
+
+
+def _existing_pathspecs(hist_dir: str, paths: List[str]) -> List[str]:
+    """过滤出工作区存在或已被跟踪的路径（仅对工作区缺失的路径调用一次 ls-files）。"""
+    specs, missing = [], []
+    for p in dict.fromkeys(x.strip("/") for x in paths if x.strip("/")):
+        (specs if os.path.lexists(os.path.join(hist_dir, p)) else missing).append(p)
+    if missing:
+        proc = run(["git", "ls-files", "-z", "--"] + missing, cwd=hist_dir, check=False)
+        tracked = [f for f in proc.stdout.split("\0") if f] if proc.returncode == 0 else []
+        specs.extend(p for p in missing if any(f == p or f.startswith(p + "/") for f in tracked))
+    return specs
+
+
+def rev_parse(hist_dir: str, ref: str = "HEAD") -> str:
+    """解析引用为提交哈希；失败返回空串。"""
+    proc = run(["git", "rev-parse", "--verify", "--quiet", ref], cwd=hist_dir, check=False)
+    return proc.stdout.strip() if proc.returncode == 0 else ""
+
+
+def changed_files(hist_dir: str, old: str, new: str = "HEAD") -> List[str]:
+    """返回两个提交之间变更的文件（相对仓库根）；old 为空或相同则返回空列表。"""
+    if not old:
+        return []
+    proc = run(["git", "diff", "--name-only", "-z", old, new], cwd=hist_dir, check=False)
+    if proc.returncode != 0:
+        return []
+    return [p for p in proc.stdout.split("\0") if p]
+
+
+def read_head(hist_dir: str) -> str:
+    """直接读取 `.git/HEAD`（及 loose ref / packed-refs）得到当前提交哈希，不启动子进程；失败返回空串。"""
+    git_dir = os.path.join(hist_dir, ".git")
+    try:
+        with open(os.path.join(git_dir, "HEAD"), "r", encoding="utf-8") as f:
+            head = f.read().strip()
+    except OSError:
+        return ""
+    if not head.startswith("ref:"):
+        return head
+    ref = head[4:].strip()
+    try:
+        with open(os.path.join(git_dir, ref), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        pass
+    try:
+        with open(os.path.join(git_dir, "packed-refs"), "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    except OSError:
+        pass
+    return ""
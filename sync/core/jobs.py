@@ -0,0 +1,153 @@
+"""后台任务队列
+
+职责：
+- 将耗时的管理操作（立即同步、LFS 上传/恢复、重新链接、初始化）放到后台执行，HTTP 请求立即返回任务 ID；
+- 单线程串行执行，守护进程的周期同步也经由同一队列，避免与手动操作并发修改仓库；
+- 合并重复任务：同类且同范围（key，如同步的目标集合）的任务已在排队时直接返回已有任务
+  （连点三次“立即同步”只执行一次；只同步到期目标的周期任务不会吞掉一次整体同步）；
+- 记录任务状态、耗时与传输字节数，供 `/sync/api/jobs/{id}` 查询。
+"""
+
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from sync.utils.logging import err, log
+
+
+@dataclass
+class Job:
+    """单个后台任务。"""
+    id: str
+    kind: str
+    func: Callable[[], Any] = field(repr=False)
+    key: Optional[str] = None  # 合并范围：kind 与 key 都相同的排队任务才合并
+    status: str = "pending"  # pending / running / done / failed
+    created_at: float = field(default_factory=time.time)
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    bytes_moved: int = 0
+    merged: int = 0  # 被合并进来的重复提交次数
+    result: Any = None
+    error: str = ""
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def to_dict(self) -> dict:
+        now = time.time()
+        started = self.started_at or 0.0
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "key": self.key,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at or None,
+            "finished_at": self.finished_at or None,
+            "queue_wait": round((started or now) - self.created_at, 3),
+            "duration": round((self.finished_at or now) - started, 3) if started else None,
+            "bytes_moved": self.bytes_moved,
+            "merged": self.merged,
+            "result": self.result,
+            "error": self.error,
+        }
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done.wait(timeout)
+
+
+class JobQueue:
+    """串行任务队列（单工作线程）。"""
+
+    def __init__(self, keep: int = 100) -> None:
+        self._cond = threading.Condition()
+        self._pending: Deque[Job] = deque()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._keep = keep
+        self._ids = itertools.count(1)
+        self._running: Optional[Job] = None
+        self._local = threading.local()  # 工作线程中当前执行的任务
+        self._thread = threading.Thread(target=self._worker, name="sync-jobs", daemon=True)
+        self._thread.start()
+
+    def submit(self, kind: str, func: Callable[[], Any], key: Optional[str] = None) -> Job:
+        """提交任务；若同类、同 key 的任务仍在排队则合并，返回已有任务。"""
+        with self._cond:
+            for job in self._pending:
+                if job.kind == kind and job.key == key:
+                    job.merged += 1
+                    return job
+            job = Job(id=f"{int(time.time())}-{next(self._ids)}", kind=kind, func=func, key=key)
+            self._pending.append(job)
+            self._jobs[job.id] = job
+            self._trim()
+            self._cond.notify()
+            return job
+
+    def run(self, kind: str, func: Callable[[], Any], timeout: Optional[float] = None, key: Optional[str] = None) -> Job:
+        """提交并等待完成（供守护循环等同步调用方使用）。"""
+        job = self.submit(kind, func, key)
+        job.wait(timeout)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def list(self, limit: int = 20) -> List[Job]:
+        with self._cond:
+            return list(self._jobs.values())[-limit:][::-1]
+
+    def current(self) -> Optional[Job]:
+        """调用线程正在执行的任务（只在任务函数内部有值；后台线程与启动阶段为 None）。"""
+        return getattr(self._local, "job", None)
+
+    def add_bytes(self, job_id: Optional[str], n: int) -> None:
+        """为指定任务累计传输字节数（可在任意线程调用；job_id 为 None 时忽略）。"""
+        if job_id is None or n <= 0:
+            return
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.bytes_moved += n
+
+    @property
+    def running(self) -> Optional[Job]:
+        return self._running
+
+    def _trim(self) -> None:
+        while len(self._jobs) > self._keep:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest.status in ("pending", "running"):
+                break
+            del self._jobs[oldest_id]
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job = self._pending.popleft()
+                job.status = "running"
+                job.started_at = time.time()
+                self._running = job
+            self._local.job = job
+            try:
+                job.result = job.func()
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+                err(f"Job {job.kind} ({job.id}) failed: {e}")
+            finally:
+                job.finished_at = time.time()
+                self._local.job = None
+                with self._cond:
+                    self._running = None
+                job.done.set()
+            if job.kind != "sync" or job.status != "done":
+                log(f"Job {job.kind} ({job.id}) {job.status} in {job.finished_at - job.started_at:.1f}s")
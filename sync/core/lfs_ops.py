@@ -3,7 +3,7 @@
 职责：
 - 计算文件哈希值
 - 判断文件是否需要使用 LFS
-- 将大文件转换为指针文件并上传
+- 将大文件转换为指针文件并上传（上传 `upload_to_lfs` 与落地 `finalize_lfs` 可分开执行）
 - 从指针文件恢复实际文件
 - 扫描和处理所有 LFS 文件
 """
@@ -13,13 +13,16 @@ from __future__ import annotations
 import hashlib
 import os
 import shutil
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional, List, Callable, Dict, Any
 
+from sync.core import metrics, tracing
+from sync.core.config import to_under_hist
 from sync.core.pointer import PointerFile, is_pointer_file, read_pointer, write_pointer, validate_pointer
 from sync.core.release_api import GitHubReleaseAPI
 from sync.core.manifest import Manifest
-from sync.utils.logging import log, err
+from sync.utils.logging import debug, err, log
 
 
 def sanitize_filename(filename: str) -> str:
@@ -55,11 +58,24 @@ def calculate_file_hash(file_path: str, algorithm: str = "sha256") -> str:
     Returns:
         哈希值字符串，格式：algorithm:hexdigest
     """
+    with tracing.span("hash", cat="lfs", path=file_path) as sp:
+        digest, hashed = _hash_file(file_path, algorithm)
+        sp["bytes"] = hashed
+    return f"{algorithm}:{digest}"
+
+
+def _hash_file(file_path: str, algorithm: str):
+    """分块计算哈希，返回 (hexdigest, 字节数)，并累计哈希吞吐指标。"""
     hasher = hashlib.new(algorithm)
+    started = time.perf_counter()
+    hashed = 0
     with open(file_path, 'rb') as f:
         while chunk := f.read(8192):
             hasher.update(chunk)
-    return f"{algorithm}:{hasher.hexdigest()}"
+            hashed += len(chunk)
+    metrics.HASH_BYTES.inc(hashed)
+    metrics.HASH_SECONDS.inc(time.perf_counter() - started)
+    return hasher.hexdigest(), hashed
 
 
 def should_use_lfs(file_path: str, threshold: int) -> bool:
@@ -87,16 +103,33 @@ def convert_to_lfs(
     api: GitHubReleaseAPI,
     manifest: Manifest,
     release_tag: str,
-    progress_callback: Optional[Callable[[str, int, int], None]] = None
+    progress_callback: Optional[Callable[[str, int, int], None]] = None,
+    source: Optional[str] = None,
+) -> bool:
+    """将大文件转换为 LFS 指针文件（见 `_convert_to_lfs`），并记录追踪 span。"""
+    try:
+        size = os.path.getsize(source or file_path)
+    except OSError:
+        size = 0
+    with tracing.span("convert_to_lfs", cat="lfs", path=file_path, bytes=size) as sp:
+        ok = _convert_to_lfs(file_path, api, manifest, release_tag, progress_callback, source)
+        sp["ok"] = ok
+    return ok
+
+
+def _convert_to_lfs(
+    file_path: str,
+    api: GitHubReleaseAPI,
+    manifest: Manifest,
+    release_tag: str,
+    progress_callback: Optional[Callable[[str, int, int], None]] = None,
+    source: Optional[str] = None,
 ) -> bool:
     """将大文件转换为 LFS 指针文件
     
     流程：
-    1. 计算文件哈希
-    2. 上传到 Release
-    3. 创建指针文件
-    4. 更新 manifest
-    5. 删除原文件
+    1. 计算文件哈希并上传到 Release（`upload_to_lfs`，不涉及 Git）
+    2. 创建指针文件、移出 Git 索引、更新 manifest（`finalize_lfs`）
     
     Args:
         file_path: 文件路径（绝对路径）
@@ -104,95 +137,112 @@ def convert_to_lfs(
         manifest: Manifest 管理器
         release_tag: Release 标签
         progress_callback: 进度回调 (file_path, uploaded, total)
+        source: 实际哈希与上传的内容文件（如 SQLite 一致性快照），默认即 file_path
     
     Returns:
         成功返回 True
     """
     try:
-        # 1. 计算哈希
-        log(f"Calculating hash for {file_path}...")
-        file_hash = calculate_file_hash(file_path)
-        file_size = os.path.getsize(file_path)
-        filename = os.path.basename(file_path)
-        
-        # 2. 生成 asset 名称（清理特殊字符）
-        hash_prefix = file_hash.split(':')[1][:12]  # 取前12位
-        clean_filename = sanitize_filename(filename)
-        asset_name = f"{hash_prefix}-{clean_filename}"
-        
-        # 3. 检查是否已上传
-        release = api.get_or_create_release(release_tag)
-        existing_asset = api.get_asset_by_name(release, asset_name)
-        
-        actual_asset_name = asset_name  # 默认使用清理后的名称
+        pointer = upload_to_lfs(file_path, api, release_tag, progress_callback, source)
+        finalize_lfs(file_path, pointer, manifest)
+        return True
+    except Exception as e:
+        err(f"Failed to convert {file_path} to LFS: {e}")
+        return False
+
+
+def upload_to_lfs(
+    file_path: str,
+    api: GitHubReleaseAPI,
+    release_tag: str,
+    progress_callback: Optional[Callable[[str, int, int], None]] = None,
+    source: Optional[str] = None,
+) -> PointerFile:
+    """计算哈希并上传到 Release（已存在同名 asset 时跳过），返回对应的指针；失败抛出异常。
+
+    只读取文件、访问网络，不修改仓库，可在 Git 锁之外执行。
+    """
+    content_path = source or file_path
+    # 1. 计算哈希
+    debug(f"Calculating hash for {content_path}...")
+    file_hash = calculate_file_hash(content_path)
+    file_size = os.path.getsize(content_path)
+    filename = os.path.basename(file_path)
+    
+    # 2. 生成 asset 名称（清理特殊字符）
+    hash_prefix = file_hash.split(':')[1][:12]  # 取前12位
+    clean_filename = sanitize_filename(filename)
+    asset_name = f"{hash_prefix}-{clean_filename}"
+    
+    # 3. 检查是否已上传
+    release = api.get_or_create_release(release_tag)
+    existing_asset = api.get_asset_by_name(release, asset_name)
+    
+    if not existing_asset:
+        # 4. 上传到 Release
+        debug(f"Uploading {filename} to Release...")
         
-        if not existing_asset:
-            # 4. 上传到 Release
-            log(f"Uploading {filename} to Release...")
-            
-            def upload_progress(uploaded: int, total: int):
-                if progress_callback:
-                    progress_callback(file_path, uploaded, total)
-            
-            uploaded_asset = api.upload_asset(release, file_path, asset_name, upload_progress)
-            # 使用 API 返回的实际名称（GitHub 可能进一步修改）
-            actual_asset_name = uploaded_asset.get("name", asset_name)
-            log(f"Uploaded as: {actual_asset_name}")
-        else:
-            actual_asset_name = existing_asset.get("name", asset_name)
-            log(f"Asset already exists: {actual_asset_name}")
+        def upload_progress(uploaded: int, total: int):
+            if progress_callback:
+                progress_callback(file_path, uploaded, total)
         
-        # 5. 创建指针文件（使用实际的 asset 名称）
-        pointer = PointerFile(
-            version=1,
-            hash=file_hash,
-            size=file_size,
-            filename=filename,
-            release_tag=release_tag,
-            asset_name=actual_asset_name  # 使用实际名称
+        uploaded_asset = api.upload_asset(release, content_path, asset_name, upload_progress)
+        # 使用 API 返回的实际名称（GitHub 可能进一步修改）
+        actual_asset_name = uploaded_asset.get("name", asset_name)
+        log(f"Uploaded as: {actual_asset_name}", key="lfs.upload")
+    else:
+        actual_asset_name = existing_asset.get("name", asset_name)
+        log(f"Asset already exists: {actual_asset_name}", key="lfs.upload")
+    
+    return PointerFile(
+        version=1,
+        hash=file_hash,
+        size=file_size,
+        filename=filename,
+        release_tag=release_tag,
+        asset_name=actual_asset_name  # 使用实际名称
+    )
+
+
+def finalize_lfs(file_path: str, pointer: PointerFile, manifest: Manifest) -> None:
+    """上传完成后落地到仓库：写指针文件、从索引移除原文件、更新 manifest 与 exclude。
+
+    只有本地文件与 Git 索引操作，耗时很短；与提交并发时应在 Git 锁内调用。
+    """
+    # 5. 创建指针文件（使用实际的 asset 名称）
+    pointer_path = file_path + ".pointer"
+    write_pointer(pointer_path, pointer)
+    
+    # 6. 从 Git 索引中移除大文件（如果已被追踪）
+    from sync.core import git_ops
+    rel_path = os.path.relpath(file_path, manifest.hist_dir)
+    try:
+        # 检查文件是否被 Git 追踪
+        result = git_ops.run(
+            ["git", "ls-files", rel_path],
+            cwd=manifest.hist_dir,
+            check=False
         )
-        
-        pointer_path = file_path + ".pointer"
-        write_pointer(pointer_path, pointer)
-        
-        # 6. 从 Git 索引中移除大文件（如果已被追踪）
-        from sync.core import git_ops
-        rel_path = os.path.relpath(file_path, manifest.hist_dir)
-        try:
-            # 检查文件是否被 Git 追踪
-            result = git_ops.run(
-                ["git", "ls-files", rel_path],
+        if result.stdout.strip():
+            # 文件已被追踪，从索引中移除（但保留工作区文件）
+            git_ops.run(
+                ["git", "rm", "--cached", rel_path],
                 cwd=manifest.hist_dir,
                 check=False
             )
-            if result.stdout.strip():
-                # 文件已被追踪，从索引中移除（但保留工作区文件）
-                git_ops.run(
-                    ["git", "rm", "--cached", rel_path],
-                    cwd=manifest.hist_dir,
-                    check=False
-                )
-                log(f"Removed {rel_path} from Git index (file kept locally)")
-        except Exception as e:
-            err(f"Failed to remove from Git index: {e}")
-        
-        # 7. 更新 manifest（使用实际名称）
-        # 文件路径相对于 hist_dir
-        rel_path = os.path.relpath(file_path, manifest.hist_dir)
-        manifest.add_version(rel_path, file_hash, actual_asset_name, file_size)
-        manifest.save()
-        
-        # 7. 将原文件添加到 Git exclude（不删除！保留供程序访问）
-        from sync.core.blacklist import ensure_git_info_exclude
-        exclude_path = os.path.relpath(file_path, manifest.hist_dir)
-        ensure_git_info_exclude(manifest.hist_dir, [exclude_path])
-        
-        log(f"✓ Converted to LFS: {filename} (file kept, pointer created)")
-        
-        return True
+            debug(f"Removed {rel_path} from Git index (file kept locally)")
     except Exception as e:
-        err(f"Failed to convert {file_path} to LFS: {e}")
-        return False
+        err(f"Failed to remove from Git index: {e}")
+    
+    # 7. 更新 manifest（使用实际名称，文件路径相对于 hist_dir）
+    manifest.add_version(rel_path, pointer.hash, pointer.asset_name, pointer.size)
+    manifest.save()
+    
+    # 8. 将原文件添加到 Git exclude（不删除！保留供程序访问）
+    from sync.core.blacklist import ensure_git_info_exclude
+    ensure_git_info_exclude(manifest.hist_dir, [rel_path])
+    
+    log(f"✓ Converted to LFS: {pointer.filename} (file kept, pointer created)", key="lfs.convert")
 
 
 def restore_from_lfs(
@@ -200,7 +250,28 @@ def restore_from_lfs(
     api: GitHubReleaseAPI,
     manifest: Manifest,
     verify_hash: bool = True,
-    progress_callback: Optional[Callable[[str, int, int], None]] = None
+    progress_callback: Optional[Callable[[str, int, int], None]] = None,
+    keep_existing: bool = False,
+) -> bool:
+    """从 LFS 指针文件恢复实际文件（见 `_restore_from_lfs`），并记录追踪 span。"""
+    with tracing.span("restore_from_lfs", cat="lfs", path=pointer_path) as sp:
+        ok = _restore_from_lfs(pointer_path, api, manifest, verify_hash, progress_callback, keep_existing)
+        sp["ok"] = ok
+        if ok and pointer_path.endswith(".pointer"):
+            try:
+                sp["bytes"] = os.path.getsize(pointer_path[:-8])
+            except OSError:
+                pass
+    return ok
+
+
+def _restore_from_lfs(
+    pointer_path: str,
+    api: GitHubReleaseAPI,
+    manifest: Manifest,
+    verify_hash: bool = True,
+    progress_callback: Optional[Callable[[str, int, int], None]] = None,
+    keep_existing: bool = False,
 ) -> bool:
     """从 LFS 指针文件恢复实际文件
     
@@ -216,6 +287,7 @@ def restore_from_lfs(
         manifest: Manifest 管理器
         verify_hash: 是否验证哈希
         progress_callback: 进度回调
+        keep_existing: 实际文件已存在但内容不同时不覆盖（后台恢复期间应用可能已重新创建该文件）
     
     Returns:
         成功返回 True
@@ -226,6 +298,16 @@ def restore_from_lfs(
         if not pointer or not validate_pointer(pointer):
             err(f"Invalid pointer file: {pointer_path}")
             return False
+
+        # 实际文件已存在时先本地校验，内容一致则无需下载
+        actual_path = pointer_path[:-8] if pointer_path.endswith('.pointer') else pointer_path
+        if os.path.exists(actual_path):
+            if os.path.getsize(actual_path) == pointer.size and calculate_file_hash(actual_path) == pointer.hash:
+                log(f"File already exists with correct hash, skipping: {pointer.filename}", key="lfs.restore.skip")
+                return True
+            if keep_existing:
+                log(f"Keeping locally recreated file, not restoring: {pointer.filename}", key="lfs.restore.kept")
+                return False
         
         # 2. 获取 Release
         release = api.get_release(pointer.release_tag)
@@ -244,7 +326,7 @@ def restore_from_lfs(
             for version in versions:
                 asset = api.get_asset_by_name(release, version.asset_name)
                 if asset:
-                    log(f"Using fallback version: {version.asset_name}")
+                    log(f"Using fallback version: {version.asset_name}", key="lfs.restore.fallback")
                     pointer.asset_name = version.asset_name
                     pointer.hash = version.hash
                     pointer.size = version.size
@@ -272,15 +354,17 @@ def restore_from_lfs(
                 return False
         
         # 6. 保存实际文件（不删除指针文件，两者共存）
-        actual_path = pointer_path[:-8] if pointer_path.endswith('.pointer') else pointer_path
-        
-        # 如果实际文件已存在，检查哈希是否匹配
+        # 如果实际文件在下载期间出现，检查哈希是否匹配
         if os.path.exists(actual_path):
             existing_hash = calculate_file_hash(actual_path)
             if existing_hash == pointer.hash:
-                log(f"File already exists with correct hash, skipping: {pointer.filename}")
+                log(f"File already exists with correct hash, skipping: {pointer.filename}", key="lfs.restore.skip")
                 os.remove(temp_path)
                 return True
+            if keep_existing:
+                log(f"Keeping locally recreated file, not restoring: {pointer.filename}", key="lfs.restore.kept")
+                os.remove(temp_path)
+                return False
         
         # 移动临时文件到实际位置
         shutil.move(temp_path, actual_path)
@@ -291,10 +375,10 @@ def restore_from_lfs(
         exclude_path = os.path.relpath(actual_path, manifest.hist_dir)
         ensure_git_info_exclude(manifest.hist_dir, [exclude_path])
         
-        log(f"✓ Restored from LFS: {pointer.filename} (pointer kept)")
+        log(f"✓ Restored from LFS: {pointer.filename} (pointer kept)", key="lfs.restore")
         return True
     except Exception as e:
-        err(f"Failed to restore {pointer_path} from LFS: {e}")
+        err(f"Failed to restore {pointer_path} from LFS: {e}", key="lfs.restore.error")
         # 清理临时文件
         temp_path = pointer_path + ".tmp"
         if os.path.exists(temp_path):
@@ -328,13 +412,33 @@ def scan_pointer_files(directory: str) -> List[str]:
     return pointers
 
 
-def scan_large_files(directory: str, threshold: int, excludes: List[str] = None) -> List[str]:
+def scan_target_pointers(hist_dir: str, rel: str) -> List[str]:
+    """扫描单个同步目标下的指针文件
+    
+    Args:
+        hist_dir: 历史仓库目录
+        rel: 同步目标（BASE 相对路径，目录以 / 结尾）
+    
+    Returns:
+        指针文件路径列表（目录目标递归扫描；文件目标检查同名 .pointer）
+    """
+    path = to_under_hist(hist_dir, rel.rstrip("/"))
+    if os.path.isdir(path):
+        return scan_pointer_files(path)
+    pointer_path = path + ".pointer"
+    if is_pointer_file(pointer_path):
+        return [pointer_path]
+    return []
+
+
+def scan_large_files(directory: str, threshold: int, excludes: List[str] = None, subdir: str = "") -> List[str]:
     """扫描目录中的大文件（未转换为 LFS 的）
     
     Args:
         directory: 要扫描的目录
         threshold: 大小阈值
-        excludes: 排除的路径前缀列表
+        excludes: 排除的路径前缀列表（相对 directory）
+        subdir: 只扫描 directory 下的该子目录（相对路径），默认扫描全部
     
     Returns:
         大文件路径列表
@@ -342,7 +446,7 @@ def scan_large_files(directory: str, threshold: int, excludes: List[str] = None)
     excludes = excludes or []
     large_files = []
     
-    for root, dirs, files in os.walk(directory):
+    for root, dirs, files in os.walk(os.path.join(directory, subdir) if subdir else directory):
         # 跳过 .git 和 .lfs 目录
         if '.git' in root or '.lfs' in root:
             continue
@@ -353,8 +457,8 @@ def scan_large_files(directory: str, threshold: int, excludes: List[str] = None)
             continue
         
         for file in files:
-            # 跳过指针文件
-            if file.endswith('.pointer'):
+            # 跳过指针文件与恢复中的临时下载文件
+            if file.endswith('.pointer') or file.endswith('.pointer.tmp'):
                 continue
             
             path = os.path.join(root, file)
@@ -364,12 +468,25 @@ def scan_large_files(directory: str, threshold: int, excludes: List[str] = None)
     return large_files
 
 
+def scan_target_large_files(hist_dir: str, rel: str, threshold: int, excludes: List[str] = None) -> List[str]:
+    """扫描单个同步目标下的大文件（目录目标递归扫描；文件目标只检查该文件）。"""
+    path = to_under_hist(hist_dir, rel.rstrip("/"))
+    if os.path.isdir(path):
+        return scan_large_files(hist_dir, threshold, excludes, subdir=os.path.relpath(path, hist_dir))
+    rel_path = os.path.relpath(path, hist_dir)
+    if any(rel_path.startswith(ex) for ex in (excludes or [])):
+        return []
+    return [path] if should_use_lfs(path, threshold) else []
+
+
 def restore_all_lfs_files(
     directory: str,
     api: GitHubReleaseAPI,
     manifest: Manifest,
     max_workers: int = 3,
-    progress_callback: Optional[Callable[[int, int], None]] = None
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    pointers: Optional[List[str]] = None,
+    file_progress_callback: Optional[Callable[[str, int, int], None]] = None
 ) -> Dict[str, bool]:
     """并发恢复所有 LFS 文件
     
@@ -379,23 +496,32 @@ def restore_all_lfs_files(
         manifest: Manifest 管理器
         max_workers: 最大并发数
         progress_callback: 进度回调 (completed, total)
+        pointers: 指定要恢复的指针文件列表（为 None 时扫描 directory）
+        file_progress_callback: 单文件字节进度回调 (pointer_path, downloaded, total)
     
     Returns:
         文件路径 -> 是否成功的字典
     """
-    pointers = scan_pointer_files(directory)
+    if pointers is None:
+        pointers = scan_pointer_files(directory)
     if not pointers:
         log("No LFS pointer files found")
         return {}
     
     log(f"Found {len(pointers)} LFS pointer files, restoring...")
+    # 小文件优先：先完成的文件越多，依赖它们的服务越早可用
+    sizes = {}
+    for p in pointers:
+        pointer = read_pointer(p)
+        sizes[p] = pointer.size if pointer is not None else 0
+    pointers = sorted(pointers, key=lambda p: sizes[p])
     
     results = {}
     completed = 0
     
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = {
-            executor.submit(restore_from_lfs, p, api, manifest): p 
+            executor.submit(restore_from_lfs, p, api, manifest, progress_callback=file_progress_callback): p 
             for p in pointers
         }
         
@@ -410,7 +536,7 @@ def restore_all_lfs_files(
                     progress_callback(completed, len(pointers))
                 
             except Exception as e:
-                err(f"Error restoring {pointer_path}: {e}")
+                err(f"Error restoring {pointer_path}: {e}", key="lfs.restore.error")
                 results[pointer_path] = False
                 completed += 1
                 
@@ -0,0 +1,205 @@
+"""后台 LFS 上传线程
+
+同步周期持有 Git 锁；若在锁内上传大文件（可能数 GB），立即同步等请求要等待整个上传完成。
+此线程把上传移出临界区，周期同步只负责把大文件记入上传队列（`sync.core.upload_queue`）。
+
+职责：
+- 队列中的条目到期且熔断器可用时，在 Git 锁之外计算哈希并上传（`upload_to_lfs`）；
+  SQLite 快照先硬链接固定一份，避免上传期间被下一轮快照替换；
+- 上传完成后短暂获取 Git 锁：写指针、更新 manifest（`finalize_lfs`）并暂存指针与 manifest，
+  由下一次周期同步一并提交推送；
+- 一批上传后清理超出保留数量的旧版本：manifest 的修改在锁内，Release 中 asset 的删除在锁外；
+- 上传失败按队列的退避规则重试；`wake()` 在入队、熔断恢复时唤醒线程，空闲时按最近的到期时间休眠。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from sync.core import git_ops, tracing
+from sync.core.config import Settings
+from sync.core.lfs_ops import finalize_lfs, upload_to_lfs
+from sync.core.manifest import Manifest
+from sync.core.release_api import GitHubReleaseAPI
+from sync.core.upload_queue import UploadQueue
+from sync.utils.logging import err, log
+
+IDLE_WAIT = 300.0  # 队列为空时的最长休眠（秒）；入队会立即唤醒
+
+
+class LfsWorker:
+    """单线程执行队列中的 LFS 上传（线程在首次 wake 时启动）。"""
+
+    def __init__(
+        self,
+        api: GitHubReleaseAPI,
+        manifest: Manifest,
+        uploads: UploadQueue,
+        git_lock: threading.Lock,
+        settings: Callable[[], Settings],
+        file_progress: Optional[Callable[[str, int, int], None]] = None,
+        on_staged: Optional[Callable[[List[str]], None]] = None,
+    ) -> None:
+        self.api = api
+        self.manifest = manifest
+        self.uploads = uploads
+        self.git_lock = git_lock
+        self.settings = settings
+        self.file_progress = file_progress
+        self.on_staged = on_staged
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.current: Optional[str] = None
+        self.uploaded = 0
+        self.failed = 0
+        self.bytes_uploaded = 0
+        self.lock_seconds = 0.0  # 累计持有 Git 锁的时间
+
+    def wake(self) -> None:
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="lfs-upload", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                self.drain()
+            except Exception as e:
+                err(f"LFS upload worker error: {e}")
+            wait = self.uploads.next_due()
+            if wait is None:
+                wait = IDLE_WAIT
+            elif not self.api.breaker.ready():
+                wait = max(wait, self.api.breaker.retry_in())
+            self._wake.wait(max(1.0, min(wait, IDLE_WAIT)))
+
+    @property
+    def hist_dir(self) -> str:
+        return self.uploads.hist_dir
+
+    def drain(self) -> List[str]:
+        """上传所有到期条目，返回本次暂存的指针文件（相对路径）。"""
+        staged: List[str] = []
+        for rel, entry in self.uploads.due():
+            if self._stop.is_set() or not self.api.breaker.ready():
+                break
+            pointer_rel = self._upload_one(rel, entry)
+            if pointer_rel:
+                staged.append(pointer_rel)
+        if staged:
+            self._cleanup_versions()
+            if self.on_staged is not None:
+                self.on_staged(staged)
+        return staged
+
+    @contextmanager
+    def _locked(self):
+        """持有 Git 锁并累计持有时间。"""
+        with self.git_lock:
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.lock_seconds += time.perf_counter() - started
+
+    def _pin(self, source: Optional[str]) -> Optional[str]:
+        """固定 SQLite 快照的当前版本（快照总以 rename 替换，硬链接指向的内容不再变化）。"""
+        if not source or not os.path.isfile(source):
+            return None
+        pinned = f"{source}.upload"
+        try:
+            if os.path.exists(pinned):
+                os.unlink(pinned)
+            os.link(source, pinned)
+            return pinned
+        except OSError:
+            return source
+
+    def _upload_one(self, rel: str, entry: Dict) -> Optional[str]:
+        file_path = os.path.join(self.hist_dir, rel)
+        if not os.path.isfile(file_path):
+            log(f"Dropping vanished file from LFS upload queue: {rel}", key="lfs.queue")
+            self.uploads.remove(rel)
+            return None
+        st = self.settings()
+        source = self._pin(entry.get("source"))
+        self.current = rel
+        try:
+            size = os.path.getsize(source or file_path)
+            log(f"Uploading to LFS: {rel} (attempt {entry['attempts'] + 1})", key="lfs.convert.start")
+            with tracing.span("lfs_upload", cat="lfs", path=rel, bytes=size):
+                pointer = upload_to_lfs(file_path, self.api, st.lfs_release_tag, self.file_progress, source)
+        except Exception as e:
+            err(f"Failed to upload {rel} to LFS: {e}", key="lfs.convert.error")
+            self.uploads.record_failure(rel, str(e))
+            self.failed += 1
+            return None
+        finally:
+            self.current = None
+            if source and source.endswith(".upload"):
+                try:
+                    os.unlink(source)
+                except OSError:
+                    pass
+        pointer_rel = rel + ".pointer"
+        with self._locked():
+            finalize_lfs(file_path, pointer, self.manifest)
+            self._stage([pointer_rel])
+            self.uploads.remove(rel)
+        self.uploaded += 1
+        self.bytes_uploaded += size
+        return pointer_rel
+
+    def _stage(self, paths: List[str]) -> None:
+        # 调用方持有 Git 锁
+        manifest_rel = os.path.relpath(self.manifest.manifest_path, self.hist_dir)
+        existing = [p for p in paths + [manifest_rel] if os.path.exists(os.path.join(self.hist_dir, p))]
+        if existing:
+            git_ops.run(["git", "add", "--"] + existing, cwd=self.hist_dir, check=False)
+
+    def _cleanup_versions(self) -> None:
+        """每个文件保留最多 N 个版本：manifest 在锁内修改并暂存，asset 删除在锁外进行。"""
+        st = self.settings()
+        with self._locked():
+            to_delete = self.manifest.cleanup_all_old_versions(keep=st.lfs_max_versions)
+            if to_delete:
+                self.manifest.save()
+                self._stage([])
+        if not to_delete:
+            return
+        try:
+            release = self.api.get_or_create_release(st.lfs_release_tag)
+        except Exception as e:
+            err(f"Failed to clean up old LFS versions: {e}", key="release.delete.error")
+            return
+        for asset_names in to_delete.values():
+            for asset_name in asset_names:
+                try:
+                    asset = self.api.get_asset_by_name(release, asset_name)
+                    if asset:
+                        self.api.delete_asset(asset)
+                except Exception as e:
+                    err(f"Failed to delete old asset {asset_name}: {e}", key="release.delete.error")
+
+    def stats(self) -> Dict:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "current": self.current,
+            "uploaded": self.uploaded,
+            "failed": self.failed,
+            "bytes_uploaded": self.bytes_uploaded,
+            "lock_seconds": round(self.lock_seconds, 3),
+        }
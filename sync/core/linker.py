@@ -8,22 +8,140 @@ from __future__ import annotations
 - 若原路径缺失：目录进行预创建；“看起来像文件”的目标则创建空文件以被 Git 跟踪。
 
 冲突处理（当前策略）：
-- 目录：合并复制（`rsync -a` 或逐文件复制）到目标目录，不覆盖已存在文件；然后删除原目录并建立符号链接。
+- 目录：逐条目合并到目标目录，不覆盖已存在文件；然后删除原目录（仅剩冲突条目）并建立符号链接。
+  同一文件系统上直接 `os.rename`（目标中不存在的子目录整体改名，O(1)）；
+  跨文件系统时优先 reflink（FICLONE），其次 `os.copy_file_range`，最后回退普通复制。
 - 文件：若目标已存在则删除原文件，仅保留目标；随后在原路径建立符号链接（即“以远端为准”）。
+
+互不嵌套的目标并发迁移；返回 `MigrationStats`（改名移动与实际复制的字节数）。
 """
 
+import errno
 import os
 import shutil
-import subprocess
-from typing import Iterable
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterable, List
 
-from sync.core.blacklist import is_excluded
 from sync.core.config import to_abs_under_base, to_under_hist
+from sync.core.emptydirs import get_tracker
 from sync.utils.logging import log
 
+try:
+    import fcntl
+except ImportError:  # 非 Linux 平台
+    fcntl = None
+
+# ioctl(FICLONE)：btrfs/xfs 等文件系统上的写时复制克隆
+_FICLONE = 0x40049409
+
+
+@dataclass
+class MigrationStats:
+    """迁移统计：改名移动（无数据复制）与实际复制的字节/文件数。"""
+    bytes_moved: int = 0
+    bytes_copied: int = 0
+    files_moved: int = 0
+    files_copied: int = 0
+    skipped: int = 0  # 目标已存在而保留目标的条目
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, moved: int = 0, copied: int = 0, files_moved: int = 0, files_copied: int = 0, skipped: int = 0) -> None:
+        with self._lock:
+            self.bytes_moved += moved
+            self.bytes_copied += copied
+            self.files_moved += files_moved
+            self.files_copied += files_copied
+            self.skipped += skipped
+
+
+def _tree_size(path: str) -> tuple:
+    """返回 (字节数, 文件数)，不跟随符号链接。"""
+    if not os.path.isdir(path) or os.path.islink(path):
+        try:
+            return os.lstat(path).st_size, 1
+        except OSError:
+            return 0, 0
+    total, count = 0, 0
+    for root, dirs, files in os.walk(path):
+        for fn in files:
+            try:
+                total += os.lstat(os.path.join(root, fn)).st_size
+                count += 1
+            except OSError:
+                pass
+    return total, count
+
+
+def _copy_file(src: str, dst: str) -> None:
+    """复制单个文件：reflink → copy_file_range → 普通复制，并保留元数据。"""
+    if os.path.islink(src):
+        os.symlink(os.readlink(src), dst)
+        return
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        done = False
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+                done = True
+            except OSError:
+                pass
+        if not done and hasattr(os, "copy_file_range"):
+            try:
+                size = os.fstat(fsrc.fileno()).st_size
+                offset = 0
+                while offset < size:
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - offset)
+                    if n == 0:
+                        break
+                    offset += n
+                done = offset >= size
+            except OSError:
+                fdst.seek(0)
+                fdst.truncate()
+                fsrc.seek(0)
+        if not done:
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+    shutil.copystat(src, dst)
+
+
+def _merge_entry(src: str, dst: str, same_dev: bool, stats: MigrationStats) -> None:
+    """将 src 合并到 dst（不覆盖 dst 已有文件）。"""
+    if os.path.lexists(dst):
+        if os.path.isdir(src) and not os.path.islink(src) and os.path.isdir(dst) and not os.path.islink(dst):
+            for name in os.listdir(src):
+                _merge_entry(os.path.join(src, name), os.path.join(dst, name), same_dev, stats)
+        else:
+            stats.add(skipped=1)
+        return
+    if same_dev:
+        size, count = _tree_size(src)
+        try:
+            os.rename(src, dst)
+            stats.add(moved=size, files_moved=count)
+            return
+        except OSError as e:
+            # overlayfs 下层目录改名会返回 EXDEV：回退为复制
+            if e.errno != errno.EXDEV:
+                raise
+    if os.path.isdir(src) and not os.path.islink(src):
+        os.makedirs(dst, exist_ok=True)
+        for name in os.listdir(src):
+            _merge_entry(os.path.join(src, name), os.path.join(dst, name), same_dev, stats)
+        shutil.copystat(src, dst)
+    else:
+        _copy_file(src, dst)
+        stats.add(copied=os.lstat(src).st_size, files_copied=1)
+
 
-def _rsync_available() -> bool:
-    return shutil.which("rsync") is not None
+def merge_move_dir(src: str, dst: str, stats: MigrationStats) -> None:
+    """将目录 src 的内容合并移动到 dst（不覆盖已存在文件）。src 中剩余的冲突条目由调用方删除。"""
+    os.makedirs(dst, exist_ok=True)
+    same_dev = os.stat(src).st_dev == os.stat(dst).st_dev
+    log(f"  合并迁移 {src} -> {dst}（{'同设备改名' if same_dev else '跨设备复制'}）")
+    for name in os.listdir(src):
+        _merge_entry(os.path.join(src, name), os.path.join(dst, name), same_dev, stats)
 
 
 def ensure_symlink(src: str, dst: str) -> None:
@@ -61,69 +179,108 @@ def ensure_symlink(src: str, dst: str) -> None:
 
 
 
-def migrate_and_link(base: str, hist_dir: str, rel_targets: Iterable[str]) -> None:
+def group_targets(rel_targets: Iterable[str]) -> List[List[str]]:
+    """按嵌套关系分组：互不嵌套的目标分属不同组（可并发），嵌套目标放在同组内按顺序处理。"""
+    groups: List[List[str]] = []
+    roots: List[str] = []
+    for rel in sorted(rel_targets, key=lambda r: r.strip("/")):
+        key = rel.strip("/")
+        for i, root in enumerate(roots):
+            if key == root or key.startswith(root + "/"):
+                groups[i].append(rel)
+                break
+        else:
+            roots.append(key)
+            groups.append([rel])
+    return groups
+
+
+def migrate_and_link(base: str, hist_dir: str, rel_targets: Iterable[str], max_workers: int = 4) -> MigrationStats:
     """对目标列表执行“迁移并建立软链”。
 
     - base: 作为绝对路径根（通常为 `/`）；
     - hist_dir: 历史仓库根目录；
-    - rel_targets: BASE 相对路径（例如 `home/user/AstrBot/data`）。
+    - rel_targets: BASE 相对路径（例如 `home/user/AstrBot/data`）；
+    - max_workers: 互不嵌套目标的并发数。
+    返回：迁移统计。
     """
-    for rel in rel_targets:
-        log(f"处理目标: {rel}")
-        # Normalize: remove trailing slash for symlink paths
-        rel_clean = rel.rstrip("/")
-        src = to_abs_under_base(base, rel_clean)
-        dst = to_under_hist(hist_dir, rel_clean)
-        log(f"  src={src}, dst={dst}")
-        os.makedirs(os.path.dirname(dst), exist_ok=True)
+    stats = MigrationStats()
+    groups = group_targets(rel_targets)
 
-        if os.path.islink(src):
-            log(f"  {src} 已是符号链接")
-            ensure_symlink(src, dst)
-            continue
+    def run_group(group: List[str]) -> None:
+        for rel in group:
+            _migrate_one(base, hist_dir, rel, stats)
 
-        if os.path.isdir(src):
-            log(f"  {src} 是目录，开始迁移")
-            os.makedirs(dst, exist_ok=True)
-            if _rsync_available():
-                subprocess.run(["rsync", "-a", f"{src}/", f"{dst}/"], check=False)
-            else:
-                # copytree doesn't merge; copy files one by one preserving hierarchy
-                for root, dirs, files in os.walk(src):
-                    relp = os.path.relpath(root, src)
-                    dstd = os.path.join(dst, relp) if relp != "." else dst
-                    os.makedirs(dstd, exist_ok=True)
-                    for fn in files:
-                        s = os.path.join(root, fn)
-                        t = os.path.join(dstd, fn)
-                        if not os.path.exists(t):
-                            shutil.copy2(s, t)
-            # remove original and link
-            log(f"  删除原目录: {src}")
-            shutil.rmtree(src, ignore_errors=True)
-            ensure_symlink(src, dst)
-        elif os.path.isfile(src):
-            log(f"  {src} 是文件，开始迁移")
-            if not os.path.exists(dst):
-                os.makedirs(os.path.dirname(dst), exist_ok=True)
-                shutil.move(src, dst)
-            else:
-                # dst exists, drop src to avoid dup
+    if len(groups) <= 1 or max_workers <= 1:
+        for group in groups:
+            run_group(group)
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(groups))) as pool:
+            # list() 以便传播异常
+            list(pool.map(run_group, groups))
+
+    if stats.files_moved or stats.files_copied:
+        log(
+            f"迁移完成：改名移动 {stats.files_moved} 个文件（{stats.bytes_moved} 字节），"
+            f"复制 {stats.files_copied} 个文件（{stats.bytes_copied} 字节），保留已存在 {stats.skipped} 项"
+        )
+    return stats
+
+
+def _migrate_one(base: str, hist_dir: str, rel: str, stats: MigrationStats) -> None:
+    """迁移单个目标并建立软链。"""
+    log(f"处理目标: {rel}")
+    # Normalize: remove trailing slash for symlink paths
+    rel_clean = rel.rstrip("/")
+    src = to_abs_under_base(base, rel_clean)
+    dst = to_under_hist(hist_dir, rel_clean)
+    log(f"  src={src}, dst={dst}")
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+
+    if os.path.islink(src):
+        log(f"  {src} 已是符号链接")
+        ensure_symlink(src, dst)
+        return
+
+    if os.path.isdir(src):
+        log(f"  {src} 是目录，开始迁移")
+        merge_move_dir(src, dst, stats)
+        # remove original (only conflicting leftovers remain) and link
+        log(f"  删除原目录: {src}")
+        shutil.rmtree(src, ignore_errors=True)
+        ensure_symlink(src, dst)
+    elif os.path.isfile(src):
+        log(f"  {src} 是文件，开始迁移")
+        if not os.path.exists(dst):
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            size = os.path.getsize(src)
+            try:
+                os.rename(src, dst)
+                stats.add(moved=size, files_moved=1)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                _copy_file(src, dst)
                 os.remove(src)
-            ensure_symlink(src, dst)
+                stats.add(copied=size, files_copied=1)
+        else:
+            # dst exists, drop src to avoid dup
+            os.remove(src)
+            stats.add(skipped=1)
+        ensure_symlink(src, dst)
+    else:
+        log(f"  {src} 不存在，创建空目标")
+        # src missing; ensure dst exists (dir or empty file)
+        # Use trailing slash to distinguish: path/ = directory, path = file
+        if rel.endswith("/"):
+            log(f"  是目录（以/结尾），创建空目录: {dst}")
+            os.makedirs(dst, exist_ok=True)
         else:
-            log(f"  {src} 不存在，创建空目标")
-            # src missing; ensure dst exists (dir or empty file)
-            # Use trailing slash to distinguish: path/ = directory, path = file
-            if rel.endswith("/"):
-                log(f"  是目录（以/结尾），创建空目录: {dst}")
-                os.makedirs(dst, exist_ok=True)
-            else:
-                log(f"  是文件（无/结尾），创建空文件: {dst}")
-                os.makedirs(os.path.dirname(dst), exist_ok=True)
-                if not os.path.exists(dst):
-                    open(dst, "a").close()
-            ensure_symlink(src, dst)
+            log(f"  是文件（无/结尾），创建空文件: {dst}")
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if not os.path.exists(dst):
+                open(dst, "a").close()
+        ensure_symlink(src, dst)
 
 
 def precreate_dirlike(hist_dir: str, rel_targets: Iterable[str]) -> None:
@@ -138,27 +295,9 @@ def precreate_dirlike(hist_dir: str, rel_targets: Iterable[str]) -> None:
 
 
 def track_empty_dirs(hist_dir: str, rel_targets: Iterable[str], excludes: Iterable[str]) -> int:
-    """扫描空目录并写入 `.gitkeep`，占位以确保 Git 跟踪。
+    """扫描空目录并写入 `.gitkeep`，占位以确保 Git 跟踪；目录非空后移除过期的 `.gitkeep`。
 
+    增量实现见 `sync.core.emptydirs`：仅重新检查 mtime 变化的目录。
     返回：写入的 `.gitkeep` 个数。
     """
-    written = 0
-    for rel in rel_targets:
-        rel_clean = rel.rstrip("/")
-        root = to_under_hist(hist_dir, rel_clean)
-        if os.path.isdir(root):
-            for d, subdirs, files in os.walk(root):
-                rel_under_hist = os.path.relpath(d, hist_dir).lstrip("./")
-                if is_excluded(rel_under_hist, excludes):
-                    continue
-                # skip .git
-                if "/.git/" in f"/{rel_under_hist}/":
-                    continue
-                # empty dir: no files and no non-excluded subdirs containing files
-                if not os.listdir(d):
-                    keep = os.path.join(d, ".gitkeep")
-                    if not os.path.exists(keep):
-                        open(keep, "a").close()
-                        written += 1
-        # If target looks like a file and exists zero-size, keep as is; if not exists, create empty ensured in migrate
-    return written
+    return get_tracker(hist_dir).track(rel_targets, excludes).written
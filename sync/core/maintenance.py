@@ -0,0 +1,297 @@
+"""备份仓库的定期维护
+
+守护进程每隔几分钟提交一次且从不整理对象库：loose 对象与大量未压缩的 pack 持续累积，
+`git status`、pull --rebase 与 push 随之变慢。
+
+职责：
+- 统计对象库（`git count-objects -v`：loose 对象数、pack 数、总大小）并导出为指标；
+- 按阈值/间隔执行维护任务，均不持有同步锁，且只在空闲时进行（由调用方的 idle() 判断，
+  通常为：没有同步周期或后台任务在运行，且距下一次同步足够久）：
+  - loose：loose 对象超过 SYNC_MAINT_LOOSE（默认 500）时 `git repack -d`，打包为一个增量 pack；
+  - incremental-repack：pack 超过 SYNC_MAINT_PACKS（默认 10）时写入 multi-pack-index，
+    并把较小的 pack 合并（`multi-pack-index repack/expire`）；
+  - commit-graph：有新提交且距上次超过 1 小时时写入（浅克隆不支持，跳过）；
+  - gc：每 SYNC_MAINT_GC_INTERVAL 秒（默认 7 天）一次完整 `git gc`；
+- 自适应压缩：抽样工作区文件估算可压缩率，文本为主时提高 `pack.compression`（推送的 pack 更小），
+  已压缩内容为主时降低；已压缩格式（zip/jpg/mp4 等）在 `.git/info/attributes` 中标记 `-delta`，
+  打包时不再尝试增量压缩。loose 对象保持不压缩（`core.looseCompression 0`），写入仍然很快；
+- 记录每次维护前后的仓库大小与各任务耗时（最近 20 次），供 `/sync/api/maintenance` 展示。
+
+检查间隔 ENV SYNC_MAINT_CHECK（秒，默认 300）；SYNC_MAINTENANCE=false 关闭自动维护（仍可手动触发）。
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from sync.core import git_ops, metrics
+from sync.utils.logging import err, log
+
+ENABLED = os.environ.get("SYNC_MAINTENANCE", "true").lower() == "true"
+CHECK_INTERVAL = float(os.environ.get("SYNC_MAINT_CHECK", "300"))
+LOOSE_LIMIT = int(os.environ.get("SYNC_MAINT_LOOSE", "500"))
+PACK_LIMIT = int(os.environ.get("SYNC_MAINT_PACKS", "10"))
+GC_INTERVAL = float(os.environ.get("SYNC_MAINT_GC_INTERVAL", str(7 * 86400)))
+COMMIT_GRAPH_INTERVAL = 3600.0
+COMPRESSION_INTERVAL = 86400.0  # 重新评估压缩级别的间隔
+
+SAMPLE_FILES = 200
+SAMPLE_BYTES = 64 * 1024
+# 常见的已压缩格式：不做增量压缩
+COMPRESSED_EXTS = (
+    "zip", "gz", "tgz", "bz2", "xz", "zst", "7z", "rar", "jar", "apk",
+    "jpg", "jpeg", "png", "gif", "webp", "mp3", "mp4", "m4a", "ogg", "silk", "amr", "webm", "mkv", "pdf",
+)
+_ATTR_BEGIN = "# >>> sync maintenance >>>"
+_ATTR_END = "# <<< sync maintenance <<<"
+
+
+def repo_stats(hist_dir: str) -> Dict:
+    """对象库统计（`git count-objects -v`），大小单位为字节。"""
+    proc = git_ops.run(["git", "count-objects", "-v"], cwd=hist_dir, check=False)
+    raw: Dict[str, int] = {}
+    for line in proc.stdout.splitlines():
+        key, _, value = line.partition(":")
+        try:
+            raw[key.strip()] = int(value.strip())
+        except ValueError:
+            continue
+    objects = os.path.join(hist_dir, ".git", "objects")
+    stats = {
+        "loose_objects": raw.get("count", 0),
+        "loose_bytes": raw.get("size", 0) * 1024,
+        "packs": raw.get("packs", 0),
+        "pack_bytes": raw.get("size-pack", 0) * 1024,
+        "garbage": raw.get("garbage", 0),
+        "commit_graph": os.path.exists(os.path.join(objects, "info", "commit-graph"))
+        or os.path.isdir(os.path.join(objects, "info", "commit-graphs")),
+        "multi_pack_index": os.path.exists(os.path.join(objects, "pack", "multi-pack-index")),
+        "shallow": os.path.exists(os.path.join(hist_dir, ".git", "shallow")),
+    }
+    stats["size_bytes"] = stats["loose_bytes"] + stats["pack_bytes"]
+    metrics.REPO_LOOSE_OBJECTS.set(stats["loose_objects"])
+    metrics.REPO_PACKS.set(stats["packs"])
+    metrics.REPO_SIZE_BYTES.set(stats["size_bytes"])
+    return stats
+
+
+def sample_compressibility(hist_dir: str) -> Tuple[float, List[str]]:
+    """抽样已跟踪文件估算压缩率（压缩后/原始，越小越适合压缩），并返回样本中出现的已压缩格式扩展名。"""
+    proc = git_ops.run(["git", "ls-files", "-z"], cwd=hist_dir, check=False)
+    files = [f for f in proc.stdout.split("\0") if f]
+    if len(files) > SAMPLE_FILES:
+        files = random.sample(files, SAMPLE_FILES)
+    raw = packed = 0
+    exts = set()
+    for rel in files:
+        ext = os.path.splitext(rel)[1].lstrip(".").lower()
+        if ext in COMPRESSED_EXTS:
+            exts.add(ext)
+        try:
+            with open(os.path.join(hist_dir, rel), "rb") as f:
+                data = f.read(SAMPLE_BYTES)
+        except OSError:
+            continue
+        if not data:
+            continue
+        raw += len(data)
+        packed += len(zlib.compress(data, 1))
+    return (packed / raw if raw else 1.0), sorted(exts)
+
+
+def compression_level(ratio: float) -> int:
+    """按可压缩率选择 pack 的 zlib 级别：文本为主 6，混合 3，几乎不可压缩 1。"""
+    if ratio < 0.6:
+        return 6
+    if ratio < 0.9:
+        return 3
+    return 1
+
+
+def _write_attributes(hist_dir: str, exts: List[str]) -> None:
+    """在 `.git/info/attributes` 中维护已压缩格式的 `-delta` 标记（只改写本模块管理的区块）。"""
+    path = os.path.join(hist_dir, ".git", "info", "attributes")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+    if _ATTR_BEGIN in lines and _ATTR_END in lines:
+        start, end = lines.index(_ATTR_BEGIN), lines.index(_ATTR_END)
+        lines = lines[:start] + lines[end + 1:]
+    block = [_ATTR_BEGIN] + [f"*.{ext} -delta" for ext in sorted(set(COMPRESSED_EXTS) | set(exts))] + [_ATTR_END]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines + block) + "\n")
+
+
+class Maintainer:
+    """单个仓库的维护状态与后台线程。"""
+
+    def __init__(self, hist_dir: str, idle: Callable[[], bool] = lambda: True) -> None:
+        self.hist_dir = hist_dir
+        self.idle = idle
+        self._run_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._created = time.time()
+        self._last: Dict[str, float] = {}  # 任务 -> 上次执行时间
+        self._graph_head = ""
+        self.compression: Optional[Dict] = None
+        self.history: Deque[Dict] = deque(maxlen=20)
+        self.running: Optional[str] = None
+
+    def start(self) -> None:
+        if not ENABLED or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._loop, name="sync-maint", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(CHECK_INTERVAL):
+            try:
+                if self.idle():
+                    self.run()
+            except Exception as e:
+                err(f"Repository maintenance failed: {e}")
+
+    # ---- 任务选择 ----
+    def due(self, stats: Dict, now: float) -> List[str]:
+        tasks = []
+        if now - self._last.get("compression", 0.0) >= COMPRESSION_INTERVAL:
+            tasks.append("compression")
+        if now - self._last.get("gc", self._created) >= GC_INTERVAL:
+            tasks.append("gc")  # 启动后先做增量维护，满一个周期再完整 gc
+        else:
+            if stats["loose_objects"] >= LOOSE_LIMIT:
+                tasks.append("loose")
+            if stats["packs"] >= PACK_LIMIT:
+                tasks.append("incremental-repack")
+        head = git_ops.read_head(self.hist_dir)
+        if (not stats["shallow"] and head and head != self._graph_head
+                and now - self._last.get("commit-graph", 0.0) >= COMMIT_GRAPH_INTERVAL):
+            tasks.append("commit-graph")
+        return tasks
+
+    def run(self, force: bool = False, tasks: Optional[List[str]] = None) -> Optional[Dict]:
+        """执行到期（或指定）的维护任务，返回本次记录；已有维护在运行或无事可做时返回 None。
+
+        force=True 时忽略阈值执行全部增量任务（loose、incremental-repack、commit-graph），不检查空闲。
+        """
+        if not self._run_lock.acquire(blocking=False):
+            return None
+        try:
+            now = time.time()
+            before = repo_stats(self.hist_dir)
+            if tasks is None:
+                tasks = ["compression", "loose", "incremental-repack", "commit-graph"] if force else self.due(before, now)
+            if not tasks:
+                return None
+            record = {"started_at": now, "before": before, "tasks": []}
+            for task in tasks:
+                if not force and not self.idle():
+                    record["tasks"].append({"task": task, "skipped": "busy"})
+                    continue
+                self.running = task
+                started = time.perf_counter()
+                try:
+                    result = getattr(self, "_task_" + task.replace("-", "_"))(before)
+                    ok = True
+                except Exception as e:
+                    result, ok = str(e), False
+                    err(f"Maintenance task {task} failed: {e}")
+                seconds = time.perf_counter() - started
+                metrics.MAINTENANCE_SECONDS.observe(seconds, task=task)
+                self._last[task] = time.time()
+                record["tasks"].append({"task": task, "seconds": round(seconds, 3), "ok": ok, "result": result})
+            self.running = None
+            if not any("seconds" in t for t in record["tasks"]):
+                return None  # 全部因忙碌跳过，下一次检查再试
+            record["after"] = after = repo_stats(self.hist_dir)
+            record["duration"] = round(time.time() - now, 3)
+            record["saved_bytes"] = before["size_bytes"] - after["size_bytes"]
+            self.history.append(record)
+            log(
+                f"Repository maintenance: {', '.join(t['task'] for t in record['tasks'])} in {record['duration']:.1f}s, "
+                f"{before['size_bytes'] // 1024} KiB → {after['size_bytes'] // 1024} KiB, "
+                f"{before['loose_objects']} → {after['loose_objects']} loose objects, {before['packs']} → {after['packs']} packs"
+            )
+            return record
+        finally:
+            self.running = None
+            self._run_lock.release()
+
+    # ---- 任务 ----
+    def _git(self, *args: str) -> str:
+        level = self.compression["level"] if self.compression else None
+        cmd = ["git"] + (["-c", f"pack.compression={level}"] if level is not None else []) + list(args)
+        proc = git_ops.run(cmd, cwd=self.hist_dir, check=True)
+        return proc.stdout.strip()
+
+    def _task_compression(self, stats: Dict) -> Dict:
+        ratio, exts = sample_compressibility(self.hist_dir)
+        level = compression_level(ratio)
+        git_ops.run(["git", "config", "pack.compression", str(level)], cwd=self.hist_dir, check=False)
+        git_ops.run(["git", "config", "core.looseCompression", "0"], cwd=self.hist_dir, check=False)
+        _write_attributes(self.hist_dir, exts)
+        self.compression = {"level": level, "ratio": round(ratio, 3), "compressed_exts": exts}
+        return self.compression
+
+    def _task_loose(self, stats: Dict) -> str:
+        return self._git("repack", "-d", "-q")
+
+    def _task_incremental_repack(self, stats: Dict) -> str:
+        self._git("multi-pack-index", "write")
+        self._git("multi-pack-index", "expire")
+        # 与 `git maintenance` 相同的批量大小：除最大的 pack 外全部合并
+        pack_dir = os.path.join(self.hist_dir, ".git", "objects", "pack")
+        sizes = sorted(
+            os.path.getsize(os.path.join(pack_dir, f)) for f in os.listdir(pack_dir) if f.endswith(".pack")
+        )
+        if len(sizes) < 2:
+            return "single pack"
+        self._git("multi-pack-index", "repack", f"--batch-size={sum(sizes[:-1]) + 1}")
+        self._git("multi-pack-index", "expire")
+        return f"merged up to {len(sizes) - 1} packs"
+
+    def _task_commit_graph(self, stats: Dict) -> str:
+        if stats["shallow"]:
+            return "skipped: shallow repository"
+        self._git("commit-graph", "write", "--reachable", "--split")
+        self._graph_head = git_ops.read_head(self.hist_dir)
+        return "written"
+
+    def _task_gc(self, stats: Dict) -> str:
+        return self._git("gc", "--quiet")
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": ENABLED,
+            "running": self.running,
+            "compression": self.compression,
+            "last_runs": {task: ts for task, ts in self._last.items()},
+            "history": list(self.history)[-5:],
+        }
+
+
+_maintainers: Dict[str, Maintainer] = {}
+_maintainers_lock = threading.Lock()
+
+
+def get_maintainer(hist_dir: str, idle: Optional[Callable[[], bool]] = None) -> Maintainer:
+    """每个 hist_dir 共享一个维护器；idle 仅在首次创建时生效。"""
+    key = os.path.abspath(hist_dir)
+    with _maintainers_lock:
+        m = _maintainers.get(key)
+        if m is None:
+            m = _maintainers[key] = Maintainer(key, idle or (lambda: True))
+        return m
@@ -16,7 +16,8 @@ import threading
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 
-from sync.utils.logging import log, err
+from sync.core import metrics
+from sync.utils.logging import debug, err, log
 
 
 @dataclass
@@ -72,10 +73,14 @@ class Manifest:
         self.manifest_path = os.path.join(hist_dir, ".lfs", "manifest.json")
         self._lock = threading.Lock()
         self._data: Dict[str, Any] = {}
+        # 每次修改递增，用于缓存 inventory() 的结果
+        self._generation = 0
+        self._inventory_cache: Optional[tuple] = None
         self._load()
     
     def _load(self) -> None:
         """从文件加载 manifest"""
+        self._generation += 1
         if not os.path.exists(self.manifest_path):
             self._data = {
                 "version": 2,
@@ -89,6 +94,7 @@ class Manifest:
             with open(self.manifest_path, 'r', encoding='utf-8') as f:
                 self._data = json.load(f)
             log(f"Loaded manifest: {len(self._data.get('files', {}))} files")
+            self._update_metrics()
         except (json.JSONDecodeError, OSError) as e:
             err(f"Failed to load manifest: {e}, using empty manifest")
             self._data = {
@@ -112,11 +118,22 @@ class Manifest:
                 with open(self.manifest_path, 'w', encoding='utf-8') as f:
                     json.dump(self._data, f, indent=2, ensure_ascii=False)
                 
+                self._update_metrics()
                 return True
             except OSError as e:
                 err(f"Failed to save manifest: {e}")
                 return False
     
+    def _update_metrics(self) -> None:
+        """刷新 manifest 相关 Gauge（文件大小、跟踪文件数、引用的 asset 数）。"""
+        files = self._data.get("files", {})
+        metrics.MANIFEST_FILES.set(len(files))
+        metrics.MANIFEST_ASSETS.set(sum(len(r.get("versions", [])) for r in files.values()))
+        try:
+            metrics.MANIFEST_BYTES.set(os.path.getsize(self.manifest_path))
+        except OSError:
+            pass
+    
     def get_file_record(self, file_path: str) -> Optional[FileRecord]:
         """获取文件记录
         
@@ -177,7 +194,8 @@ class Manifest:
                 )
                 files[file_path] = record.to_dict()
             
-            log(f"Added version for {file_path}: {hash_value[:16]}...")
+            self._generation += 1
+            debug(f"Added version for {file_path}: {hash_value[:16]}...")
     
     def get_current_version(self, file_path: str) -> Optional[FileVersion]:
         """获取文件当前版本"""
@@ -231,11 +249,12 @@ class Manifest:
             record.versions = to_keep
             files = self._data.get("files", {})
             files[file_path] = record.to_dict()
+            self._generation += 1
             
             # 返回需要删除的 asset 名称
             removed_assets = [v.asset_name for v in to_remove]
             if removed_assets:
-                log(f"Cleaned up {len(removed_assets)} old versions for {file_path}")
+                log(f"Cleaned up {len(removed_assets)} old versions for {file_path}", key="manifest.cleanup")
             return removed_assets
     
     def cleanup_all_old_versions(self, keep: int = 3) -> Dict[str, List[str]]:
@@ -252,6 +271,58 @@ class Manifest:
                 result[file_path] = removed
         return result
     
+    def inventory(self, keep: int = 3) -> Dict[str, Any]:
+        """单次遍历 manifest 原始数据，返回每个文件的汇总行与总计（不构造 dataclass）。
+
+        Args:
+            keep: 每个文件保留的版本数，超出部分计为可回收
+        
+        Returns:
+            {"rows": [...], "totals": {...}}；rows 中每行含 path/size/versions/stored_bytes/
+            reclaimable_bytes/last_updated/current_hash/asset_name。结果按修改代数缓存，勿修改。
+        """
+        with self._lock:
+            cached = self._inventory_cache
+            if cached and cached[0] == self._generation and cached[1] == keep:
+                return cached[2]
+            rows = []
+            totals = {"files": 0, "versions": 0, "current_bytes": 0, "stored_bytes": 0, "reclaimable_bytes": 0}
+            for path, rec in self._data.get("files", {}).items():
+                versions = rec.get("versions", [])
+                current_hash = rec.get("current_hash", "")
+                current = None
+                stored = 0
+                for v in versions:
+                    stored += v.get("size", 0)
+                    if v.get("hash") == current_hash:
+                        current = v
+                if current is None and versions:
+                    current = versions[-1]
+                # 与 cleanup_old_versions 一致：按时间保留最新 keep 个
+                reclaimable = 0
+                if len(versions) > keep:
+                    by_time = sorted(versions, key=lambda v: v.get("timestamp", ""), reverse=True)
+                    reclaimable = sum(v.get("size", 0) for v in by_time[keep:])
+                size = current.get("size", 0) if current else 0
+                rows.append({
+                    "path": path,
+                    "size": size,
+                    "versions": len(versions),
+                    "stored_bytes": stored,
+                    "reclaimable_bytes": reclaimable,
+                    "last_updated": max((v.get("timestamp", "") for v in versions), default=""),
+                    "current_hash": current_hash,
+                    "asset_name": current.get("asset_name", "") if current else "",
+                })
+                totals["files"] += 1
+                totals["versions"] += len(versions)
+                totals["current_bytes"] += size
+                totals["stored_bytes"] += stored
+                totals["reclaimable_bytes"] += reclaimable
+            result = {"rows": rows, "totals": totals}
+            self._inventory_cache = (self._generation, keep, result)
+            return result
+    
     def list_all_files(self) -> List[str]:
         """列出所有被跟踪的文件"""
         return list(self._data.get("files", {}).keys())
@@ -274,7 +345,8 @@ class Manifest:
             files = self._data.get("files", {})
             if file_path in files:
                 del files[file_path]
-                log(f"Removed file from manifest: {file_path}")
+                self._generation += 1
+                log(f"Removed file from manifest: {file_path}", key="manifest.remove")
             
             return assets
     
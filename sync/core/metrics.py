@@ -0,0 +1,303 @@
+"""Prometheus 文本格式指标
+
+职责：
+- 提供最小的 Counter / Gauge / Histogram 实现（无第三方依赖），可在 LFS 线程池等任意线程中更新；
+- 维护全局注册表，`render()` 输出 Prometheus text exposition format 0.0.4，供 `/sync/metrics` 抓取；
+- 定义守护进程使用的全部指标（同步阶段耗时、git 子进程耗时、LFS 传输字节、哈希吞吐、GitHub API 调用等）。
+
+用法：
+    from sync.core import metrics
+    with metrics.SYNC_PHASE_SECONDS.time(phase="pull"):
+        ...
+    metrics.LFS_TRANSFER_BYTES.inc(len(chunk), direction="upload")
+"""
+
+from __future__ import annotations
+
+import abc
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 默认桶：覆盖毫秒级 git 命令到数分钟的推送/上传
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    @abc.abstractmethod
+    def render(self) -> List[str]:
+        """导出本指标的 HELP/TYPE 与样本行。"""
+
+
+class Counter(_Metric):
+    """单调递增计数器。"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        # 无标签指标从 0 开始导出，避免抓取结果中缺失
+        self._values: Dict[LabelKey, float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counter can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def total(self) -> float:
+        """所有标签组合之和。"""
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self._header()
+        for key, v in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_fmt(v)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值；也可通过 `set_function` 在抓取时计算。"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        # 无标签指标从 0 开始导出，避免抓取结果中缺失
+        self._values: Dict[LabelKey, float] = {} if self.labelnames else {(): 0.0}
+        self._func: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_function(self, func: Optional[Callable[[], float]]) -> None:
+        """抓取时调用 func 取值（仅适用于无标签的 Gauge）。"""
+        self._func = func
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        if self._func is not None:
+            try:
+                lines.append(f"{self.name} {_fmt(self._func())}")
+            except Exception:
+                pass
+            return lines
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_fmt(v)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """累积桶直方图（含 _sum/_count）。"""
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [各桶计数..., sum, count]
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            rec = self._values.get(key)
+            if rec is None:
+                rec = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    rec[i] += 1
+                    break
+            rec[-2] += value
+            rec[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str):
+        """上下文管理器：记录代码块耗时（秒），异常也记录。"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def totals(self) -> Dict[LabelKey, Tuple[float, int]]:
+        """各标签组合的 (sum, count)，供 `python -m sync profile` 等计算区间增量。"""
+        with self._lock:
+            return {k: (v[-2], int(v[-1])) for k, v in self._values.items()}
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            rec = self._values.get(self._key(labels))
+            return int(rec[-1]) if rec else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self._header()
+        for key, rec in items:
+            cumulative = 0.0
+            for bound, n in zip(self.buckets, rec):
+                cumulative += n
+                le = _labels(self.labelnames, key, f'le="{_fmt(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {_fmt(cumulative)}")
+            le = _labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {_fmt(rec[-1])}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(rec[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {_fmt(rec[-1])}")
+        return lines
+
+
+class Registry:
+    """指标注册表。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def git_subcommand(cmd: List[str]) -> str:
+    """从命令行中取 git 子命令（跳过 `-C <dir>`、`-c k=v` 等全局选项）；非 git 命令返回程序名。"""
+    if not cmd:
+        return ""
+    if not cmd[0].endswith("git"):
+        return cmd[0].rsplit("/", 1)[-1]
+    args = iter(cmd[1:])
+    for a in args:
+        if a in ("-C", "-c", "--git-dir", "--work-tree"):
+            next(args, None)
+            continue
+        if not a.startswith("-"):
+            return a
+    return "git"
+
+
+# -------- 守护进程指标 --------
+SYNC_CYCLES = counter("sync_cycles_total", "Completed pull_commit_push cycles", ["result"])
+SYNC_CYCLE_SECONDS = histogram("sync_cycle_duration_seconds", "Wall time of a full pull_commit_push cycle")
+SYNC_PHASE_SECONDS = histogram(
+    "sync_phase_duration_seconds",
+    "Wall time of each pull_commit_push phase (lfs_scan is the large-file scan inside lfs_convert)",
+    ["phase"],
+)
+GIT_COMMAND_SECONDS = histogram("sync_git_command_duration_seconds", "Latency of git subprocesses by subcommand", ["subcommand"])
+GIT_COMMAND_FAILURES = counter("sync_git_command_failures_total", "git subprocesses exiting non-zero", ["subcommand"])
+
+LFS_TRANSFER_BYTES = counter("sync_lfs_transfer_bytes_total", "Bytes transferred to/from GitHub Releases", ["direction"])
+BANDWIDTH_THROTTLE_SECONDS = counter(
+    "sync_bandwidth_throttle_seconds_total", "Seconds LFS transfers slept to honour the bandwidth limit", ["direction"]
+)
+HASH_BYTES = counter("sync_hash_bytes_total", "Bytes hashed for LFS content addressing")
+HASH_SECONDS = counter("sync_hash_seconds_total", "Time spent hashing (throughput = rate(bytes) / rate(seconds))")
+
+API_REQUESTS = counter("sync_github_api_requests_total", "GitHub API calls by method and HTTP status", ["method", "status"])
+API_RATE_LIMIT_WAITS = counter("sync_github_rate_limit_waits_total", "Times a GitHub API call waited for a rate-limit reset")
+API_RATE_LIMIT_WAIT_SECONDS = counter("sync_github_rate_limit_wait_seconds_total", "Seconds spent waiting for rate-limit resets")
+API_CIRCUIT_STATE = gauge("sync_github_circuit_state", "GitHub API circuit breaker state (0=closed, 1=half_open, 2=open)", ["name"])
+API_CIRCUIT_TRANSITIONS = counter("sync_github_circuit_transitions_total", "Circuit breaker state changes", ["name", "state"])
+LFS_UPLOAD_QUEUE = gauge("sync_lfs_upload_queue_files", "Large files waiting in the durable LFS upload queue")
+
+REPO_LOOSE_OBJECTS = gauge("sync_repo_loose_objects", "Loose objects in the backup repository")
+REPO_PACKS = gauge("sync_repo_packs", "Pack files in the backup repository")
+REPO_SIZE_BYTES = gauge("sync_repo_size_bytes", "Object store size of the backup repository (loose + packed)")
+HISTORY_COMPACTIONS = counter("sync_history_compactions_total", "History compaction runs by outcome", ["result"])
+MAINTENANCE_SECONDS = histogram(
+    "sync_maintenance_duration_seconds", "Wall time of repository maintenance tasks", ["task"],
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0),
+)
+
+MANIFEST_BYTES = gauge("sync_lfs_manifest_bytes", "Size of .lfs/manifest.json on disk")
+MANIFEST_FILES = gauge("sync_lfs_manifest_files", "Files tracked in the LFS manifest")
+MANIFEST_ASSETS = gauge("sync_lfs_manifest_assets", "Release assets referenced by the manifest (all versions)")
@@ -0,0 +1,79 @@
+"""权限规整
+
+职责：
+- 替代每轮 `chmod -R 777 /home/user`：只对本轮被 pull/恢复/链接触及的路径（及其父目录）设置权限；
+- 权限已正确的 inode 直接跳过，不改写元数据；
+- 提供一次性全量修复（遍历 HIST_DIR，跳过 `.git`；另外遍历 REPAIR_ROOTS，默认 `/home/user`，
+  即原先每轮 `chmod -R` 的范围，覆盖迁移后留在原位置的目录与非目标文件），用于首次拉取或手动修复。
+
+守护进程以 root 运行，git checkout / LFS 下载产生的文件默认 644，
+而 NapCat 以 UID 1000 运行，需要可写，因此默认模式为 777（ENV SYNC_FILE_MODE 可覆盖）。
+"""
+
+from __future__ import annotations
+
+import os
+import stat
+from typing import Iterable, List, Set
+
+from sync.utils.logging import err
+
+# 全量修复时除 HIST_DIR 外额外遍历的根目录（ENV SYNC_PERMS_ROOTS，以 `:` 分隔；置空则只修复 HIST_DIR）
+REPAIR_ROOTS: List[str] = [p for p in os.environ.get("SYNC_PERMS_ROOTS", "/home/user").split(":") if p]
+
+
+def _apply_mode(path: str, mode: int) -> bool:
+    """若 path 权限与 mode 不同则修改；符号链接与不存在的路径跳过。返回是否修改。"""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    if stat.S_ISLNK(st.st_mode) or stat.S_IMODE(st.st_mode) == mode:
+        return False
+    try:
+        os.chmod(path, mode)
+        return True
+    except OSError as e:
+        err(f"chmod {oct(mode)} {path} 失败: {e}")
+        return False
+
+
+def normalize_modes(root: str, paths: Iterable[str], mode: int = 0o777) -> int:
+    """对给定路径（绝对路径或相对 root）及其位于 root 内的父目录设置权限。
+
+    目录路径不递归；需要整棵树时使用 `repair_modes`。
+    返回：实际修改的 inode 数。
+    """
+    root = os.path.abspath(root)
+    todo: Set[str] = set()
+    for p in paths:
+        if not p:
+            continue
+        ap = os.path.normpath(p if os.path.isabs(p) else os.path.join(root, p))
+        if ap != root and not ap.startswith(root + os.sep):
+            continue
+        while ap != root and ap not in todo:
+            todo.add(ap)
+            ap = os.path.dirname(ap)
+    changed = 0
+    for ap in sorted(todo):
+        if _apply_mode(ap, mode):
+            changed += 1
+    return changed
+
+
+def repair_modes(root: str, mode: int = 0o777, skip: Iterable[str] = (".git",)) -> int:
+    """全量修复：遍历 root（不跟随符号链接），仅修改权限不符的 inode。
+
+    返回：实际修改的 inode 数。
+    """
+    skip = set(skip)
+    changed = 0
+    for d, subdirs, files in os.walk(root):
+        subdirs[:] = [s for s in subdirs if s not in skip]
+        if _apply_mode(d, mode):
+            changed += 1
+        for fn in files:
+            if _apply_mode(os.path.join(d, fn), mode):
+                changed += 1
+    return changed
@@ -14,7 +14,7 @@ import os
 from dataclasses import dataclass
 from typing import Optional
 
-from sync.utils.logging import log, err
+from sync.utils.logging import debug, err
 
 
 @dataclass
@@ -129,7 +129,7 @@ def write_pointer(path: str, pointer: PointerFile) -> bool:
         with open(path, 'w', encoding='utf-8') as f:
             json.dump(pointer.to_dict(), f, indent=2, ensure_ascii=False)
         
-        log(f"✓ Pointer file created: {path}")
+        debug(f"✓ Pointer file created: {path}")
         return True
     except OSError as e:
         err(f"Failed to write pointer file {path}: {e}")
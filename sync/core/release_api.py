@@ -4,14 +4,17 @@
 - 获取或创建 Release
 - 上传文件到 Release (asset)
 - 下载 Release 中的文件
+- 上传/下载的数据块经共享限速器整形（见 `sync.core.bandwidth`）
 - 删除 Release 中的文件
 - 列出所有 assets
+- 所有请求经熔断器保护（见 `sync.core.circuit`）：远端连续故障后快速失败，不再逐个请求等待超时
 """
 
 from __future__ import annotations
 
 import os
 import time
+from contextlib import contextmanager
 from typing import Optional, List, Dict, Any, Callable
 
 try:
@@ -19,7 +22,33 @@ try:
 except ImportError:
     httpx = None
 
-from sync.utils.logging import log, err, mask_token
+from sync.core import metrics, tracing
+from sync.core.bandwidth import DOWNLOAD, UPLOAD, get_governor
+from sync.core.circuit import get_breaker
+from sync.utils.logging import debug, err, log, mask_token
+
+# 触发限流时单次等待的上限（秒），超过则直接抛出，等待下一轮同步
+MAX_RATE_LIMIT_WAIT = 60.0
+# 建立连接的超时（秒）：远端不可达时尽快失败，读写超时仍使用 timeout
+CONNECT_TIMEOUT = float(os.environ.get("SYNC_API_CONNECT_TIMEOUT", "15"))
+
+
+def _rate_limit_wait(resp: "httpx.Response") -> Optional[float]:
+    """若响应为 GitHub 限流（429，或 403 且剩余额度为 0），返回建议等待秒数。"""
+    if resp.status_code not in (403, 429):
+        return None
+    retry_after = resp.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    if resp.headers.get("X-RateLimit-Remaining") == "0":
+        try:
+            return max(0.0, float(resp.headers.get("X-RateLimit-Reset", "0")) - time.time()) + 1
+        except ValueError:
+            return MAX_RATE_LIMIT_WAIT
+    return 60.0 if resp.status_code == 429 else None
 
 
 class GitHubReleaseAPI:
@@ -39,6 +68,7 @@ class GitHubReleaseAPI:
         self.repo = repo
         self.token = token
         self.timeout = timeout
+        self.breaker = get_breaker(f"github:{repo}")
         self.base_url = f"https://api.github.com/repos/{repo}"
         self.headers = {
             "Authorization": f"token {token}",
@@ -46,13 +76,43 @@ class GitHubReleaseAPI:
             "User-Agent": "AstrBot-Sync-LFS/1.0"
         }
     
+    def _client(self, **kwargs) -> httpx.Client:
+        return httpx.Client(timeout=httpx.Timeout(self.timeout, connect=min(CONNECT_TIMEOUT, self.timeout)), **kwargs)
+
+    @contextmanager
+    def _guarded(self):
+        """熔断保护：打开时抛出 CircuitOpenError；网络错误与 5xx 计为故障，其余响应说明远端可达。"""
+        self.breaker.before()
+        try:
+            yield
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500:
+                self.breaker.record_failure(e)
+            else:
+                self.breaker.record_success()
+            raise
+        except httpx.RequestError as e:
+            self.breaker.record_failure(e)
+            raise
+        self.breaker.record_success()
+
     def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
-        """发送 HTTP 请求，带重试机制"""
+        """发送 HTTP 请求，带重试机制（5xx/网络错误指数退避，限流时等待重置；熔断打开后不再重试）"""
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                with httpx.Client(timeout=self.timeout) as client:
+                with self._guarded(), self._client() as client, \
+                        tracing.span(f"github {method}", cat="api", url=url.replace(self.base_url, ""), attempt=attempt) as sp:
                     resp = client.request(method, url, headers=self.headers, **kwargs)
+                    sp["status"] = resp.status_code
+                    metrics.API_REQUESTS.inc(method=method, status=str(resp.status_code))
+                    wait = _rate_limit_wait(resp)
+                    if wait is not None and wait <= MAX_RATE_LIMIT_WAIT and attempt < max_retries - 1:
+                        log(f"GitHub API rate limited, waiting {wait:.0f}s")
+                        metrics.API_RATE_LIMIT_WAITS.inc()
+                        metrics.API_RATE_LIMIT_WAIT_SECONDS.inc(wait)
+                        time.sleep(wait)
+                        continue
                     resp.raise_for_status()
                     return resp
             except httpx.HTTPStatusError as e:
@@ -63,6 +123,7 @@ class GitHubReleaseAPI:
                     continue
                 raise
             except httpx.RequestError as e:
+                metrics.API_REQUESTS.inc(method=method, status="error")
                 if attempt < max_retries - 1:
                     time.sleep(2 ** attempt)
                     continue
@@ -75,6 +136,10 @@ class GitHubReleaseAPI:
         Returns:
             Release 对象（dict），如果不存在返回 None
         """
+        with tracing.span("get_release", cat="api", tag=tag):
+            return self._get_release(tag)
+    
+    def _get_release(self, tag: str) -> Optional[Dict[str, Any]]:
         try:
             url = f"{self.base_url}/releases/tags/{tag}"
             resp = self._request("GET", url)
@@ -117,15 +182,19 @@ class GitHubReleaseAPI:
     def list_assets(self, release: Dict[str, Any]) -> List[Dict[str, Any]]:
         """列出 Release 中的所有 assets"""
         url = release["assets_url"]
-        resp = self._request("GET", url)
-        return resp.json()
+        with tracing.span("list_assets", cat="api") as sp:
+            assets = self._request("GET", url).json()
+            sp["count"] = len(assets)
+        return assets
     
     def get_asset_by_name(self, release: Dict[str, Any], name: str) -> Optional[Dict[str, Any]]:
         """根据名称查找 asset"""
-        assets = self.list_assets(release)
-        for asset in assets:
-            if asset["name"] == name:
-                return asset
+        with tracing.span("get_asset_by_name", cat="api", asset=name) as sp:
+            for asset in self.list_assets(release):
+                if asset["name"] == name:
+                    sp["found"] = True
+                    return asset
+            sp["found"] = False
         return None
     
     def upload_asset(
@@ -157,20 +226,35 @@ class GitHubReleaseAPI:
         
         # 读取文件
         file_size = os.path.getsize(file_path)
-        log(f"Uploading {asset_name} ({file_size} bytes)...")
+        debug(f"Uploading {asset_name} ({file_size} bytes)...")
         
-        with open(file_path, 'rb') as f:
-            file_data = f.read()
+        # 分块流式读取，避免整文件读入内存，并上报字节进度；每块经共享限速器整形
+        governor = get_governor()
+
+        def body():
+            uploaded = 0
+            with open(file_path, 'rb') as f:
+                while chunk := f.read(governor.chunk_size(UPLOAD)):
+                    governor.throttle(UPLOAD, len(chunk))
+                    uploaded += len(chunk)
+                    metrics.LFS_TRANSFER_BYTES.inc(len(chunk), direction="upload")
+                    yield chunk
+                    if progress_callback:
+                        progress_callback(uploaded, file_size)
         
-        # 上传
+        # 上传（显式 Content-Length，避免分块传输编码）
         headers = self.headers.copy()
         headers["Content-Type"] = "application/octet-stream"
+        headers["Content-Length"] = str(file_size)
         
-        with httpx.Client(timeout=self.timeout) as client:
-            resp = client.post(upload_url, headers=headers, content=file_data)
+        with self._guarded(), self._client() as client, \
+                tracing.span("upload_asset", cat="api", asset=asset_name, bytes=file_size) as sp:
+            resp = client.post(upload_url, headers=headers, content=body())
+            sp["status"] = resp.status_code
+            metrics.API_REQUESTS.inc(method="POST", status=str(resp.status_code))
             resp.raise_for_status()
         
-        log(f"✓ Uploaded asset: {asset_name}")
+        log(f"✓ Uploaded asset: {asset_name}", key="release.upload")
         return resp.json()
     
     def download_asset(
@@ -193,7 +277,7 @@ class GitHubReleaseAPI:
         url = asset["url"]
         size = asset.get("size", 0)
         
-        log(f"Downloading {asset.get('name', '<unknown>')} ({size} bytes)...")
+        debug(f"Downloading {asset.get('name', '<unknown>')} ({size} bytes)...")
         
         # 确保父目录存在
         parent = os.path.dirname(save_path)
@@ -205,20 +289,26 @@ class GitHubReleaseAPI:
         # 对下载接口，期望拿到二进制流
         headers["Accept"] = "application/octet-stream"
         
-        with httpx.Client(timeout=self.timeout, follow_redirects=True) as client:
+        governor = get_governor()
+        with self._guarded(), self._client(follow_redirects=True) as client, \
+                tracing.span("download_asset", cat="api", asset=asset.get("name", ""), bytes=size):
             with client.stream("GET", url, headers=headers) as resp:
+                metrics.API_REQUESTS.inc(method="GET", status=str(resp.status_code))
                 resp.raise_for_status()
                 downloaded = 0
                 with open(save_path, "wb") as f:
                     for chunk in resp.iter_bytes(chunk_size=8192):
                         if not chunk:
                             continue
+                        # 限速时放慢读取，TCP 接收窗口随之收缩，发送端相应降速
+                        governor.throttle(DOWNLOAD, len(chunk))
                         f.write(chunk)
                         downloaded += len(chunk)
+                        metrics.LFS_TRANSFER_BYTES.inc(len(chunk), direction="download")
                         if progress_callback:
                             progress_callback(downloaded, size)
         
-        log(f"✓ Downloaded: {asset.get('name', '<unknown>')}")
+        log(f"✓ Downloaded: {asset.get('name', '<unknown>')}", key="release.download")
         return True
     
     def delete_asset(self, asset: Dict[str, Any]) -> bool:
@@ -232,8 +322,9 @@ class GitHubReleaseAPI:
         """
         url = asset["url"]
         try:
-            self._request("DELETE", url)
-            log(f"✓ Deleted asset: {asset['name']}")
+            with tracing.span("delete_asset", cat="api", asset=asset["name"]):
+                self._request("DELETE", url)
+            log(f"✓ Deleted asset: {asset['name']}", key="release.delete")
             return True
         except Exception as e:
             err(f"Failed to delete asset {asset['name']}: {e}")
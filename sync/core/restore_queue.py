@@ -0,0 +1,187 @@
+"""按优先级调度的 LFS 恢复队列
+
+职责：
+- 所有目标共用一个下载线程池（LFS_MAX_WORKERS），待恢复文件进入同一个优先队列，顺序为：
+  必需文件优先 → 目标优先级（policies 中的 priority，高 → 低）→ 文件大小（小 → 大）→ 提交顺序；
+- `submit()` 返回 `RestoreGroup`：启动阶段的 restore:<目标> 只等待该目标的必需文件，
+  其余（大文件、`lazy_restore` 目标中的文件）在后台继续下载，不阻塞 `.sync-complete`；
+- 同一文件已在队列中时不重复下载：新的组也等待它完成；已转入后台的文件被再次以必需方式提交时提升为必需
+  （重新以必需优先级入队，正在下载的则直接等待），保证 restore:<目标> 完成时文件确实已恢复；
+- 后台文件单独统计进度（`stats()`），完成时通过回调通知（修正权限、发布事件）；
+- 后台恢复不覆盖期间已被应用重新创建的文件（见 `restore_from_lfs(keep_existing=True)`）。
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sync.core.lfs_ops import restore_from_lfs
+from sync.core.pointer import read_pointer
+from sync.utils.logging import err, log
+
+# (pointer_path, 是否成功, 是否必需)
+DoneCallback = Callable[[str, bool, bool], None]
+
+
+class RestoreGroup:
+    """一次提交中的必需文件集合，可等待其全部完成。"""
+
+    def __init__(self, name: str, required: int, progress: Optional[Callable[[int, int], None]] = None) -> None:
+        self.name = name
+        self.total = required
+        self.results: Dict[str, bool] = {}
+        self._progress = progress
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        if required == 0:
+            self._done.set()
+
+    def _finish(self, pointer_path: str, ok: bool) -> None:
+        with self._lock:
+            self.results[pointer_path] = ok
+            completed = len(self.results)
+        if self._progress:
+            try:
+                self._progress(completed, self.total)
+            except Exception:
+                pass
+        if completed >= self.total:
+            self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+
+class RestoreScheduler:
+    """共享的 LFS 恢复队列与工作线程（线程在首次提交时启动，空闲时保持等待）。"""
+
+    def __init__(
+        self,
+        api,
+        manifest,
+        max_workers: int = 3,
+        file_progress: Optional[Callable[[str, int, int], None]] = None,
+        on_done: Optional[DoneCallback] = None,
+    ) -> None:
+        self.api = api
+        self.manifest = manifest
+        self.max_workers = max(1, max_workers)
+        self.file_progress = file_progress
+        self.on_done = on_done
+        self._cond = threading.Condition()
+        # (非必需, -优先级, 大小, 序号, pointer_path)；文件被提升为必需后，原来的后台条目出队时跳过
+        self._heap: List[Tuple[int, int, int, int, str]] = []
+        self._seq = itertools.count()
+        self._queued: Dict[str, bool] = {}  # pointer_path -> 是否必需（排队中或下载中）
+        self._running: set = set()  # 下载中的 pointer_path
+        self._waiters: Dict[str, List[RestoreGroup]] = {}  # pointer_path -> 等待其完成的组
+        self._threads: List[threading.Thread] = []
+        self._bg = {"queued": 0, "completed": 0, "failed": 0, "bytes_total": 0, "bytes_done": 0}
+        self._bg_started: Optional[float] = None
+
+    @staticmethod
+    def _size(pointer_path: str) -> int:
+        pointer = read_pointer(pointer_path)
+        return pointer.size if pointer is not None else 0
+
+    def submit(
+        self,
+        name: str,
+        pointers: Iterable[str],
+        priority: int = 0,
+        lazy: Callable[[str, int], bool] = lambda path, size: False,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> RestoreGroup:
+        """加入恢复队列；lazy(path, size) 为真的文件转入后台。返回必需文件组（可 wait）。"""
+        entries = []
+        for p in pointers:
+            size = self._size(p)
+            entries.append((p, size, not lazy(p, size)))
+        with self._cond:
+            entries = list({e[0]: e for e in entries}.values())
+            group = RestoreGroup(name, sum(1 for e in entries if e[2]), progress)
+            deferred = 0
+            for path, size, required in entries:
+                if required:
+                    self._waiters.setdefault(path, []).append(group)
+                queued = self._queued.get(path)
+                if queued is None:
+                    heapq.heappush(self._heap, (0 if required else 1, -priority, size, next(self._seq), path))
+                    self._queued[path] = required
+                    if not required:
+                        deferred += 1
+                        self._bg["queued"] += 1
+                        self._bg["bytes_total"] += size
+                        if self._bg_started is None:
+                            self._bg_started = time.time()
+                elif required and not queued:
+                    # 已在后台排队：提升为必需；已在下载中则只需等待其完成
+                    self._queued[path] = True
+                    if path not in self._running:
+                        heapq.heappush(self._heap, (0, -priority, size, next(self._seq), path))
+                        self._bg["queued"] -= 1
+                        self._bg["bytes_total"] -= size
+            self._ensure_workers()
+            self._cond.notify_all()
+        if deferred:
+            log(f"LFS restore {name}: {group.total} required, {deferred} deferred to background")
+        return group
+
+    def pending(self, pointer_path: str) -> bool:
+        """该指针是否在队列中（排队或下载中）；周期同步据此避免重复下载。"""
+        with self._cond:
+            return pointer_path in self._queued
+
+    def _ensure_workers(self) -> None:
+        self._threads = [t for t in self._threads if t.is_alive()]
+        for i in range(len(self._threads), self.max_workers):
+            t = threading.Thread(target=self._worker, name=f"lfs-restore-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                lazy, _, size, _, path = heapq.heappop(self._heap)
+                required = not lazy
+                if path in self._running or self._queued.get(path) != required:
+                    continue  # 已被提升为必需的后台条目（必需条目已出队或仍在队列中）
+                self._running.add(path)
+            try:
+                ok = restore_from_lfs(
+                    path, self.api, self.manifest,
+                    progress_callback=self.file_progress,
+                    keep_existing=not required,
+                )
+            except Exception as e:
+                err(f"Error restoring {path}: {e}", key="lfs.restore.error")
+                ok = False
+            with self._cond:
+                self._queued.pop(path, None)
+                self._running.discard(path)
+                groups = self._waiters.pop(path, [])
+                if not required:
+                    self._bg["completed" if ok else "failed"] += 1
+                    self._bg["bytes_done"] += size
+            for group in groups:
+                group._finish(path, ok)
+            if self.on_done is not None:
+                try:
+                    self.on_done(path, ok, required or bool(groups))
+                except Exception as e:
+                    err(f"Restore callback failed: {e}")
+
+    def stats(self) -> Dict:
+        """后台恢复进度。"""
+        with self._cond:
+            bg = dict(self._bg)
+            bg["pending"] = sum(1 for required in self._queued.values() if not required)
+            bg["required_pending"] = sum(1 for required in self._queued.values() if required)
+            bg["started_at"] = self._bg_started
+        return bg
@@ -0,0 +1,255 @@
+"""分目标同步调度
+
+职责：
+- 按 `TargetPolicy` 记录每个目标上次同步的时间，计算到期目标（`plan`）与下次唤醒时间（`next_due`）；
+- 到期目标按优先级（高 → 低）、陈旧程度（久 → 近）排序；
+  设置了周期时间预算（ENV SYNC_CYCLE_BUDGET，秒，默认 0 表示不限制）时，按各目标上次的扫描耗时估算，
+  超出预算的低优先级目标顺延到下一轮，但已超过 max_staleness 的目标总是纳入；
+- 自适应间隔（ENV SYNC_ADAPTIVE，默认 true）：每个目标根据最近几轮是否有提交调整生效间隔：
+  连续 SYNC_QUIET_CYCLES 轮（默认 2）无变更时间隔 ×1.5，直到上限（max_interval，默认 ENV SYNC_MAX_INTERVAL，
+  且不超过 max_staleness）；未设置 SYNC_MAX_INTERVAL 时上限即配置的 interval，安静的目标不会比配置的间隔同步得更慢
+  （RPO 不变），需要放宽时显式设置上限；连续 SYNC_CHURN_CYCLES 轮（默认 2）有变更时间隔减半，直到下限
+  （min_interval，默认 ENV SYNC_MIN_INTERVAL=30）；安静后首次出现变更立即回到配置的 interval；
+- 合并：有目标到期时，SYNC_COALESCE 秒内（默认 30，且不超过其生效间隔的 1/4）也将到期的目标并入本轮，
+  一次 pull/commit/push 代替多次；
+- 记录每个目标的扫描耗时、同步次数与每轮的 git/API 调用数，供 `/sync/api/schedule` 展示，
+  并估算自适应间隔相对固定间隔每天节省的 git/API 调用（`savings`）。
+
+未配置 policies 时所有目标共用 SYNC_INTERVAL、同时到期，行为与整体同步一致（自适应调整对所有目标同步生效）。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sync.core.config import Settings, TargetPolicy, target_policy
+
+ADAPTIVE = os.environ.get("SYNC_ADAPTIVE", "true").lower() == "true"
+MIN_INTERVAL = float(os.environ.get("SYNC_MIN_INTERVAL", "30"))
+# 未设置时为 None：自适应只会缩短间隔，不会超过配置的 interval
+MAX_INTERVAL: Optional[float] = float(os.environ["SYNC_MAX_INTERVAL"]) if os.environ.get("SYNC_MAX_INTERVAL") else None
+QUIET_CYCLES = int(os.environ.get("SYNC_QUIET_CYCLES", "2"))
+CHURN_CYCLES = int(os.environ.get("SYNC_CHURN_CYCLES", "2"))
+COALESCE = float(os.environ.get("SYNC_COALESCE", "30"))
+GROW = 1.5
+SHRINK = 0.5
+DAY = 86400.0
+
+
+@dataclass
+class TargetState:
+    last_sync: float = 0.0  # 上次同步完成时间（0 表示尚未同步）
+    cost: float = 0.0  # 上次扫描该目标的耗时（秒）
+    runs: int = 0
+    commits: int = 0  # 有变更的同步次数
+    effective: float = 0.0  # 自适应生效间隔（0 表示尚未调整，使用配置的 interval）
+    quiet: int = 0  # 连续无变更的轮数
+    busy: int = 0  # 连续有变更的轮数
+    reason: str = "configured interval"
+
+
+class TargetScheduler:
+    """目标调度状态（线程安全；由守护进程的同步循环驱动）。"""
+
+    def __init__(self, default_interval: float, budget: Optional[float] = None, adaptive: Optional[bool] = None) -> None:
+        self.default_interval = float(default_interval)
+        self.budget = float(os.environ.get("SYNC_CYCLE_BUDGET", "0")) if budget is None else budget
+        self.adaptive = ADAPTIVE if adaptive is None else adaptive
+        self._lock = threading.Lock()
+        self._states: Dict[str, TargetState] = {}
+        self._started = time.time()
+        self._cycles = 0
+        self._calls: List[float] = [0.0, 0.0]  # 平均每轮 git / API 调用数（指数滑动平均）
+
+    def policies(self, st: Settings) -> List[TargetPolicy]:
+        return [target_policy(st, rel, self.default_interval) for rel in dict.fromkeys(st.targets)]
+
+    def _state(self, rel: str) -> TargetState:
+        state = self._states.get(rel)
+        if state is None:
+            state = self._states[rel] = TargetState()
+        return state
+
+    @staticmethod
+    def bounds(p: TargetPolicy) -> Tuple[float, float]:
+        """自适应间隔的 (下限, 上限)；上限即该目标的 RPO。"""
+        floor = p.min_interval if p.min_interval is not None else min(p.interval, MIN_INTERVAL)
+        if p.max_interval is not None:
+            ceiling = p.max_interval
+        else:
+            ceiling = max(p.interval, MAX_INTERVAL) if MAX_INTERVAL is not None else p.interval
+        if p.max_staleness is not None:
+            ceiling = min(ceiling, p.max_staleness)
+        floor = min(floor, p.interval)
+        return floor, max(floor, ceiling)
+
+    def _interval(self, p: TargetPolicy, state: TargetState) -> float:
+        if not self.adaptive or not state.effective:
+            return p.interval
+        floor, ceiling = self.bounds(p)
+        return min(max(state.effective, floor), ceiling)
+
+    def plan(self, st: Settings, now: float) -> List[str]:
+        """返回本轮应同步的目标（按执行顺序）；没有到期目标时返回空列表。"""
+        with self._lock:
+            due, soon = [], []
+            for p in self.policies(st):
+                state = self._state(p.target)
+                age = now - state.last_sync
+                interval = self._interval(p, state)
+                if state.last_sync == 0 or age >= interval:
+                    due.append((p, state, age))
+                elif interval - age <= min(COALESCE, interval / 4):
+                    soon.append((p, state, age))
+            if not due:
+                return []
+            due.sort(key=lambda item: (-item[0].priority, -item[2]))
+            soon.sort(key=lambda item: (-item[0].priority, -item[2]))
+            picked: List[str] = []
+            estimate = 0.0
+            for p, state, age in due:
+                overdue = p.max_staleness is not None and age >= p.max_staleness
+                if self.budget > 0 and picked and estimate + state.cost > self.budget and not overdue:
+                    continue  # 顺延到下一轮
+                picked.append(p.target)
+                estimate += state.cost
+            # 即将到期的目标搭车本轮（不超出预算）
+            for p, state, age in soon:
+                if self.budget > 0 and estimate + state.cost > self.budget:
+                    continue
+                picked.append(p.target)
+                estimate += state.cost
+            return picked
+
+    def next_due(self, st: Settings, now: float) -> float:
+        """距离下一个目标到期的秒数（已有到期目标时为 0）。"""
+        with self._lock:
+            waits = []
+            for p in self.policies(st):
+                state = self._state(p.target)
+                if state.last_sync == 0:
+                    return 0.0
+                waits.append(state.last_sync + self._interval(p, state) - now)
+        return max(0.0, min(waits)) if waits else self.default_interval
+
+    def record_cost(self, rel: str, seconds: float) -> None:
+        with self._lock:
+            self._state(rel).cost = seconds
+
+    def record_calls(self, git_calls: float, api_calls: float) -> None:
+        """登记一轮同步的 git/API 调用数（用于估算节省量）。"""
+        with self._lock:
+            self._cycles += 1
+            alpha = 1.0 if self._cycles == 1 else 0.2
+            self._calls[0] += alpha * (git_calls - self._calls[0])
+            self._calls[1] += alpha * (api_calls - self._calls[1])
+
+    def mark_synced(self, targets: Iterable[str], when: float, st: Optional[Settings] = None,
+                    changed: Optional[Iterable[str]] = None) -> None:
+        """记录目标已同步；给出 st 与 changed（本轮有变更的目标）时按结果调整自适应间隔。"""
+        changed_set = set(changed) if changed is not None else None
+        policies = {p.target: p for p in self.policies(st)} if st is not None else {}
+        with self._lock:
+            for rel in targets:
+                state = self._state(rel)
+                state.last_sync = when
+                state.runs += 1
+                if changed_set is None:
+                    continue
+                if rel in changed_set:
+                    state.commits += 1
+                if self.adaptive and rel in policies:
+                    self._adapt(policies[rel], state, rel in changed_set)
+
+    def _adapt(self, p: TargetPolicy, state: TargetState, changed: bool) -> None:
+        # 调用方持有 self._lock
+        floor, ceiling = self.bounds(p)
+        current = self._interval(p, state)
+        if changed:
+            state.busy += 1
+            state.quiet = 0
+            if state.busy >= CHURN_CYCLES:
+                new = max(floor, current * SHRINK)
+                reason = f"churn: {state.busy} consecutive cycles with changes"
+            else:
+                new = min(current, p.interval)
+                reason = "changes detected, back to configured interval"
+        else:
+            state.quiet += 1
+            state.busy = 0
+            if state.quiet >= QUIET_CYCLES:
+                new = min(ceiling, current * GROW)
+                reason = f"quiet: {state.quiet} consecutive cycles without changes"
+            else:
+                new = current
+                reason = state.reason
+        if not changed and state.quiet >= QUIET_CYCLES and new >= ceiling:
+            reason += f" (capped at RPO {ceiling:g}s)"
+        elif changed and state.busy >= CHURN_CYCLES and new <= floor:
+            reason += f" (at floor {floor:g}s)"
+        state.effective = new
+        state.reason = reason
+
+    def savings(self, st: Settings, now: Optional[float] = None) -> Dict:
+        """估算：固定间隔与当前生效间隔下每天的同步轮数，及节省的 git/API 调用数。
+
+        周期由最早到期的目标驱动，因此按各目标最短间隔估算轮数；每轮调用数取最近几轮的滑动平均。
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            pols = [(p, self._state(p.target)) for p in self.policies(st)]
+            if not pols:
+                return {}
+            fixed = DAY / max(1.0, min(p.interval for p, _ in pols))
+            adaptive = DAY / max(1.0, min(self._interval(p, s) for p, s in pols))
+            git_calls, api_calls = self._calls
+            uptime = max(1.0, now - self._started)
+            return {
+                "cycles_per_day_fixed": round(fixed, 1),
+                "cycles_per_day_adaptive": round(adaptive, 1),
+                "git_calls_per_cycle": round(git_calls, 1),
+                "api_calls_per_cycle": round(api_calls, 1),
+                "git_calls_saved_per_day": round((fixed - adaptive) * git_calls),
+                "api_calls_saved_per_day": round((fixed - adaptive) * api_calls),
+                "observed_cycles_per_day": round(self._cycles * DAY / uptime, 1) if uptime >= 3600 else None,
+            }
+
+    def cadence(self, st: Settings) -> List[Dict]:
+        """各目标当前生效间隔与原因（状态快照用的精简版本）。"""
+        with self._lock:
+            return [
+                {"target": p.target, "interval": round(self._interval(p, s), 1), "reason": s.reason}
+                for p, s in ((p, self._state(p.target)) for p in self.policies(st))
+            ]
+
+    def snapshot(self, st: Settings, now: float) -> List[Dict]:
+        """各目标的策略与状态（按优先级排序）。"""
+        with self._lock:
+            rows = []
+            for p in self.policies(st):
+                state = self._state(p.target)
+                interval = self._interval(p, state)
+                floor, ceiling = self.bounds(p)
+                rows.append({
+                    "target": p.target,
+                    "interval": p.interval,
+                    "effective_interval": round(interval, 1),
+                    "interval_bounds": [floor, ceiling],
+                    "reason": state.reason,
+                    "priority": p.priority,
+                    "max_staleness": p.max_staleness,
+                    "lfs_threshold": p.lfs_threshold,
+                    "lazy_restore": p.lazy_restore,
+                    "last_sync": state.last_sync or None,
+                    "staleness": round(now - state.last_sync, 1) if state.last_sync else None,
+                    "next_due_in": round(max(0.0, state.last_sync + interval - now), 1) if state.last_sync else 0.0,
+                    "last_cost": round(state.cost, 3),
+                    "runs": state.runs,
+                    "commits": state.commits,
+                })
+        rows.sort(key=lambda r: -r["priority"])
+        return rows
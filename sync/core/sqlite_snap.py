@@ -0,0 +1,249 @@
+"""SQLite 一致性快照
+
+同步目标中包含正在写入的 SQLite 数据库（filebrowser.db、AstrBot data 下的数据库、QQ NT 数据库等），
+直接复制/哈希工作区文件可能得到撕裂的页面，且 WAL 中尚未检查点的内容会丢失。
+
+职责：
+- 按文件头 `SQLite format 3\\0` 识别数据库（先以“大小为 512 的整数倍”过滤，结果按 mtime/大小缓存）；
+- 使用 `sqlite3` 在线备份 API 把数据库（含 WAL 中已提交的事务）复制到暂存区
+  `HIST_DIR/.git/sync-sqlite/<相对路径>`，并把快照切换为 DELETE 日志模式，得到自包含的单文件；
+- 备份分步执行：每步 SYNC_SQLITE_PAGES 页（默认 64），步间休眠 SYNC_SQLITE_SLEEP 秒（默认 0.02），
+  期间释放读锁，应用自身的写入不会被长时间阻塞；源库被写入时 SQLite 会从头重新备份，重新开始
+  SYNC_SQLITE_RESTARTS 次（默认 3）或超过 SYNC_SQLITE_TIMEOUT 秒（默认 120）后改为单步复制整个数据库
+  （只持有一次读锁），单步复制也失败时沿用上一次的快照并记录警告；
+- 数据库及其 -wal 的 mtime/大小均未变化时复用上一次的快照；
+- `-wal`/`-shm`/`-journal` 旁路文件写入 `.git/info/exclude` 并从索引移除，只提交/上传快照内容；
+- 工作区中的数据库与索引中的快照总是不同：`databases()` 给出这些路径，拉取时经
+  `git_ops.pull_rebase(keep=...)` 标记为 skip-worktree，autostash 不会重写应用正在写入的文件。
+
+提交时由 `git_ops.add_all_and_commit_if_needed(overrides=...)` 用快照的 blob 替换暂存区中的数据库，
+超过 LFS 阈值的数据库则以快照为来源上传（见 `convert_to_lfs(source=...)`）。
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import stat
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+from sync.core import git_ops, tracing
+from sync.core.blacklist import ensure_git_info_exclude, is_excluded
+from sync.core.config import to_under_hist
+from sync.utils.logging import err, log, warn
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+SIDECARS = ("-wal", "-shm", "-journal")
+PAGES_PER_STEP = int(os.environ.get("SYNC_SQLITE_PAGES", "64"))
+STEP_SLEEP = float(os.environ.get("SYNC_SQLITE_SLEEP", "0.02"))
+BACKUP_TIMEOUT = float(os.environ.get("SYNC_SQLITE_TIMEOUT", "120"))
+MAX_RESTARTS = int(os.environ.get("SYNC_SQLITE_RESTARTS", "3"))
+ENABLED = os.environ.get("SYNC_SQLITE_SNAPSHOT", "true").lower() == "true"
+
+Stamp = Tuple[int, int, int, int]
+
+
+class _BackupAbandoned(Exception):
+    """分步备份无法按时完成（超时或源库持续写入导致反复重新开始）。"""
+
+
+def is_sqlite_file(path: str) -> bool:
+    """文件头是否为 SQLite 3 数据库。"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(16) == SQLITE_HEADER
+    except OSError:
+        return False
+
+
+class SqliteSnapshotter:
+    """单个仓库的 SQLite 快照状态（识别缓存、快照暂存区、已处理的旁路文件）。"""
+
+    def __init__(self, hist_dir: str) -> None:
+        self.hist_dir = os.path.abspath(hist_dir)
+        self.staging_dir = os.path.join(self.hist_dir, ".git", "sync-sqlite")
+        self._lock = threading.Lock()
+        self._detected: Dict[str, Tuple[int, int, bool]] = {}  # rel -> (mtime_ns, size, 是否数据库)
+        self._snapshots: Dict[str, Tuple[Stamp, str]] = {}  # rel -> (源文件戳, 快照路径)
+        self._sidecars_done: set = set()
+
+    # ---- 识别 ----
+    def _is_db(self, rel: str, st: os.stat_result) -> bool:
+        # SQLite 文件大小总是页大小（≥512 的 2 的幂）的整数倍，先用大小过滤以免读取每个文件头
+        if st.st_size < 512 or st.st_size % 512:
+            return False
+        cached = self._detected.get(rel)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        found = is_sqlite_file(os.path.join(self.hist_dir, rel))
+        self._detected[rel] = (st.st_mtime_ns, st.st_size, found)
+        return found
+
+    def find(self, targets: Iterable[str], excludes: Iterable[str]) -> List[str]:
+        """在目标子树中查找 SQLite 数据库，返回相对 HIST_DIR 的路径。"""
+        excludes = list(excludes)
+        found: List[str] = []
+        for target in dict.fromkeys(targets):
+            root = to_under_hist(self.hist_dir, target.rstrip("/"))
+            if os.path.isfile(root) and not os.path.islink(root):
+                candidates = [root]
+            else:
+                candidates = []
+                for dirpath, dirnames, filenames in os.walk(root):
+                    dirnames[:] = [d for d in dirnames if d not in (".git", ".lfs")]
+                    candidates.extend(os.path.join(dirpath, f) for f in filenames)
+            for path in candidates:
+                if path.endswith(SIDECARS) or path.endswith(".pointer"):
+                    continue
+                rel = os.path.relpath(path, self.hist_dir)
+                if is_excluded(rel, excludes):
+                    continue
+                try:
+                    st = os.lstat(path)
+                except OSError:
+                    continue
+                if stat.S_ISREG(st.st_mode) and self._is_db(rel, st) and rel not in found:
+                    found.append(rel)
+        return found
+
+    # ---- 快照 ----
+    def _stamp(self, path: str) -> Optional[Stamp]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        try:
+            wal = os.stat(path + "-wal")
+            wal_stamp = (wal.st_mtime_ns, wal.st_size)
+        except OSError:
+            wal_stamp = (0, 0)
+        return st.st_mtime_ns, st.st_size, wal_stamp[0], wal_stamp[1]
+
+    def _connect_source(self, path: str) -> sqlite3.Connection:
+        try:
+            conn = sqlite3.connect(f"file:{quote(path)}?mode=ro", uri=True, timeout=10)
+            conn.execute("PRAGMA schema_version").fetchone()
+            return conn
+        except sqlite3.Error:
+            # 只读连接无法打开（如无 -shm 的 WAL 库或存在热日志）时使用普通连接
+            return sqlite3.connect(path, timeout=10)
+
+    @staticmethod
+    def _copy(src: sqlite3.Connection, tmp_path: str, pages: int, progress=None) -> None:
+        dst = sqlite3.connect(tmp_path)
+        try:
+            src.backup(dst, pages=pages, progress=progress, sleep=STEP_SLEEP)
+            # 快照改为回滚日志模式：不依赖 -wal/-shm，单文件即完整数据库
+            dst.execute("PRAGMA journal_mode=DELETE").fetchone()
+        finally:
+            dst.close()
+
+    def snapshot(self, rel: str) -> Optional[str]:
+        """为数据库生成一致性快照，返回快照路径；失败返回 None。"""
+        src_path = os.path.join(self.hist_dir, rel)
+        stamp = self._stamp(src_path)
+        if stamp is None:
+            return None
+        prev = self._snapshots.get(rel)
+        if prev is not None and prev[0] == stamp and os.path.exists(prev[1]):
+            return prev[1]
+        dst_path = os.path.join(self.staging_dir, rel)
+        tmp_path = f"{dst_path}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        deadline = time.monotonic() + BACKUP_TIMEOUT
+        state = {"remaining": None, "restarts": 0}
+
+        def progress(status: int, remaining: int, total: int) -> None:
+            last = state["remaining"]
+            state["remaining"] = remaining
+            if last is not None and remaining > last:
+                # 源库被其他连接写入，备份已从头重新开始
+                state["restarts"] += 1
+                if state["restarts"] >= MAX_RESTARTS:
+                    raise _BackupAbandoned(f"restarted {state['restarts']} times")
+            if time.monotonic() > deadline:
+                raise _BackupAbandoned(f"timed out after {BACKUP_TIMEOUT:.0f}s")
+
+        with tracing.span("sqlite_backup", cat="sqlite", path=rel, bytes=stamp[1]) as sp:
+            started = time.perf_counter()
+            src = None
+            try:
+                src = self._connect_source(src_path)
+                try:
+                    self._copy(src, tmp_path, max(1, PAGES_PER_STEP), progress)
+                except _BackupAbandoned as e:
+                    warn(f"SQLite snapshot of {rel}: stepwise backup {e}, copying in a single step", key="sqlite.fallback")
+                    sp["fallback"] = str(e)
+                    self._copy(src, tmp_path, -1)
+                os.replace(tmp_path, dst_path)
+            except sqlite3.Error as e:
+                err(f"SQLite snapshot of {rel} failed: {e}", key="sqlite.error")
+                sp["error"] = str(e)
+                return None
+            finally:
+                if src is not None:
+                    src.close()
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+            sp["seconds"] = round(time.perf_counter() - started, 3)
+        self._snapshots[rel] = (stamp, dst_path)
+        log(f"SQLite snapshot: {rel} ({stamp[1]} bytes) in {sp['seconds']:.2f}s", key="sqlite.snapshot")
+        return dst_path
+
+    def _untrack_sidecars(self, rels: List[str]) -> None:
+        """排除并取消跟踪数据库的旁路文件（每个数据库只处理一次）。"""
+        new = [r for r in rels if r not in self._sidecars_done]
+        if not new:
+            return
+        sidecars = [r + s for r in new for s in SIDECARS]
+        ensure_git_info_exclude(self.hist_dir, sidecars)
+        git_ops.run(
+            ["git", "rm", "--cached", "--quiet", "--ignore-unmatch", "--"] + sidecars,
+            cwd=self.hist_dir,
+            check=False,
+        )
+        self._sidecars_done.update(new)
+
+    def capture(self, targets: Iterable[str], excludes: Iterable[str]) -> Dict[str, Optional[str]]:
+        """查找并快照目标中的全部数据库，返回 {相对路径: 快照路径}。
+
+        本轮快照失败时沿用上一次成功的快照；从未成功过的数据库值为 None（提交时保持 HEAD 中的版本）。
+        """
+        with self._lock:
+            dbs = self.find(targets, excludes)
+            if not dbs:
+                return {}
+            self._untrack_sidecars(dbs)
+            out: Dict[str, Optional[str]] = {}
+            for rel in dbs:
+                path = self.snapshot(rel)
+                if path is None:
+                    prev = self._snapshots.get(rel)
+                    path = prev[1] if prev is not None and os.path.exists(prev[1]) else None
+                    if path is not None:
+                        age = time.time() - os.path.getmtime(path)
+                        warn(f"Using stale SQLite snapshot of {rel} ({age:.0f}s old)", key="sqlite.stale")
+                out[rel] = path
+            return out
+
+    def databases(self) -> List[str]:
+        """已生成过快照的数据库（相对 HIST_DIR）：工作区内容与索引中的快照不同，拉取时需保持不动。"""
+        with self._lock:
+            return list(self._snapshots)
+
+
+_snapshotters: Dict[str, SqliteSnapshotter] = {}
+_snapshotters_lock = threading.Lock()
+
+
+def get_snapshotter(hist_dir: str) -> SqliteSnapshotter:
+    """每个 hist_dir 共享一个快照器。"""
+    key = os.path.abspath(hist_dir)
+    with _snapshotters_lock:
+        snap = _snapshotters.get(key)
+        if snap is None:
+            snap = _snapshotters[key] = SqliteSnapshotter(key)
+        return snap
@@ -0,0 +1,168 @@
+"""启动阶段依赖图（Stage DAG）
+
+职责：
+- 将启动流程建模为带依赖的阶段（fetch → link:<目标> → restore:<目标> → ready:<目标>）；
+- 依赖满足的阶段并发执行，互不依赖的目标不会互相等待；
+- 每个阶段结束时在 `HIST_DIR/.sync-ready/` 下发布就绪标记，服务只需等待自己声明的目标。
+
+标记文件命名见 `marker_name`：`ready:home/user/AstrBot/data/` → `ready:home__user__AstrBot__data`，
+shell 侧可用 `${rel//\\//__}` 得到同样的名字。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sync.utils.logging import err, log
+
+
+def target_key(rel: str) -> str:
+    """目标相对路径 → 阶段名中使用的规范形式（去除首尾 `/`）。"""
+    return rel.strip("/")
+
+
+def marker_name(stage: str) -> str:
+    """阶段名 → 标记文件名（`/` 替换为 `__`）。"""
+    return stage.strip("/").replace("/", "__")
+
+
+@dataclass
+class Stage:
+    """单个启动阶段。"""
+    name: str
+    func: Callable[[], None]
+    deps: List[str] = field(default_factory=list)
+    after: List[str] = field(default_factory=list)
+    status: str = "pending"  # pending / running / done / failed / skipped
+    started: float = 0.0
+    finished: float = 0.0
+
+
+FINISHED = ("done", "failed", "skipped")  # 阶段的终态
+
+
+class StageGraph:
+    """阶段依赖图执行器。
+
+    - deps 为硬依赖：任一依赖失败（或被跳过）时本阶段不执行，标记为 skipped；
+    - after 只约束顺序：等这些阶段结束（无论成败）后再执行，用于失败不应阻塞后续的阶段（如 LFS 恢复）；
+    - 无论成功、失败还是跳过，阶段结束都会写入标记，内容为 `{"ok": bool, "ts": int}`，避免服务永久阻塞。
+    """
+
+    def __init__(
+        self,
+        marker_dir: str,
+        max_workers: int = 4,
+        on_change: Optional[Callable[["StageGraph", Stage], None]] = None,
+    ) -> None:
+        self.marker_dir = marker_dir
+        self.max_workers = max_workers
+        self.on_change = on_change
+        self._stages: Dict[str, Stage] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, func: Callable[[], None], deps: Iterable[str] = (), after: Iterable[str] = ()) -> Stage:
+        """注册阶段；依赖必须先于本阶段注册。"""
+        deps, after = list(deps), list(after)
+        for d in deps + after:
+            if d not in self._stages:
+                raise ValueError(f"Unknown dependency {d!r} for stage {name!r}")
+        if name in self._stages:
+            raise ValueError(f"Duplicate stage {name!r}")
+        stage = Stage(name=name, func=func, deps=deps, after=after)
+        self._stages[name] = stage
+        return stage
+
+    @property
+    def stages(self) -> List[Stage]:
+        return list(self._stages.values())
+
+    def snapshot(self) -> Dict[str, str]:
+        """阶段名 → 状态。"""
+        with self._lock:
+            return {s.name: s.status for s in self._stages.values()}
+
+    # -------- 标记文件 --------
+    def reset_markers(self) -> None:
+        """清空上一次启动遗留的标记。"""
+        shutil.rmtree(self.marker_dir, ignore_errors=True)
+        os.makedirs(self.marker_dir, exist_ok=True)
+
+    def _publish(self, stage: Stage) -> None:
+        path = os.path.join(self.marker_dir, marker_name(stage.name))
+        tmp = path + ".tmp"
+        try:
+            os.makedirs(self.marker_dir, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"ok": stage.status == "done", "ts": int(stage.finished)}, f)
+            os.replace(tmp, path)
+        except Exception as e:
+            err(f"Failed to publish marker for {stage.name}: {e}")
+
+    # -------- 执行 --------
+    def _run_stage(self, stage: Stage) -> None:
+        with self._lock:
+            stage.status = "running"
+            stage.started = time.time()
+        self._notify(stage)
+        try:
+            stage.func()
+            status = "done"
+        except Exception as e:
+            err(f"Stage {stage.name} failed: {e}")
+            status = "failed"
+        with self._lock:
+            stage.status = status
+            stage.finished = time.time()
+        self._publish(stage)
+        log(f"Stage {stage.name} {status} ({stage.finished - stage.started:.1f}s)")
+        self._notify(stage)
+
+    def _skip(self, stage: Stage) -> None:
+        failed = [d for d in stage.deps if self._stages[d].status != "done"]
+        with self._lock:
+            stage.status = "skipped"
+            stage.started = stage.finished = time.time()
+        self._publish(stage)
+        err(f"Stage {stage.name} skipped: dependency {', '.join(failed)} did not complete")
+        self._notify(stage)
+
+    def _notify(self, stage: Stage) -> None:
+        if self.on_change:
+            try:
+                self.on_change(self, stage)
+            except Exception as e:
+                err(f"Stage callback failed: {e}")
+
+    def run(self) -> Dict[str, str]:
+        """执行整个依赖图，返回各阶段最终状态。"""
+        pending = dict(self._stages)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                progressed = True
+                while progressed:
+                    progressed = False
+                    for name, stage in list(pending.items()):
+                        if not all(self._stages[d].status in FINISHED for d in stage.deps + stage.after):
+                            continue
+                        del pending[name]
+                        if all(self._stages[d].status == "done" for d in stage.deps):
+                            running[pool.submit(self._run_stage, stage)] = name
+                        else:
+                            self._skip(stage)
+                            progressed = True  # 跳过可能使其它阶段的依赖结束
+                if not running:
+                    # 依赖无法满足（理论上不会发生，add 已校验依赖存在）
+                    break
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    running.pop(fut)
+        return self.snapshot()
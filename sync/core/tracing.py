@@ -0,0 +1,152 @@
+"""同步周期追踪（轻量 span）
+
+职责：
+- 在一次同步周期（`trace_cycle`）内记录嵌套的 span：名称、起止时间、线程 ID 与属性（path/bytes/asset 等）；
+- 周期外调用 `span()` 为空操作，开销仅一次全局变量读取；
+- LFS 线程池等其他线程中的 span 归入当前周期（任务队列串行执行，同一时刻至多一个活动周期）；
+- 最近 N 个周期保存在环形缓冲区（ENV SYNC_TRACE_CYCLES，默认 10），
+  可导出为 Chrome trace-event 格式（chrome://tracing / Perfetto 直接打开）或原始 JSON 时间线。
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, List, Optional
+
+# 单个周期最多记录的 span 数，超出后计数丢弃，避免大批量文件时内存膨胀
+MAX_SPANS_PER_CYCLE = 50000
+
+
+class CycleTrace:
+    """一个周期内收集到的全部 span。"""
+
+    def __init__(self, cycle_id: int, name: str, attrs: Dict[str, Any]) -> None:
+        self.id = cycle_id
+        self.name = name
+        self.attrs = attrs
+        self.started = time.time()
+        self.duration = 0.0
+        self.spans: List[Dict[str, Any]] = []
+        self.threads: Dict[int, str] = {}
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, span: Dict[str, Any]) -> None:
+        thread = threading.current_thread()
+        with self._lock:
+            if len(self.spans) >= MAX_SPANS_PER_CYCLE:
+                self.dropped += 1
+                return
+            self.spans.append(span)
+            self.threads.setdefault(span["tid"], thread.name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "id": self.id,
+            "name": self.name,
+            "attrs": self.attrs,
+            "started": self.started,
+            "duration": round(self.duration, 6),
+            "dropped": self.dropped,
+            "spans": sorted(spans, key=lambda s: s["ts"]),
+        }
+
+
+_active: Optional[CycleTrace] = None
+_history: Deque[CycleTrace] = deque(maxlen=max(1, int(os.environ.get("SYNC_TRACE_CYCLES", "10"))))
+_lock = threading.Lock()
+_ids = itertools.count(1)
+
+
+@contextmanager
+def trace_cycle(name: str, **attrs: Any):
+    """开始记录一个周期；结束后放入环形缓冲区。嵌套调用时复用外层周期。"""
+    global _active
+    if _active is not None:
+        with span(name, cat="cycle", **attrs):
+            yield _active
+        return
+    cycle = CycleTrace(next(_ids), name, attrs)
+    _active = cycle
+    started = time.perf_counter()
+    try:
+        with span(name, cat="cycle", **attrs):
+            yield cycle
+    finally:
+        cycle.duration = time.perf_counter() - started
+        _active = None
+        with _lock:
+            _history.append(cycle)
+
+
+@contextmanager
+def span(name: str, cat: str = "sync", **attrs: Any):
+    """记录一个 span；产出的 dict 可在块内补充属性（如下载完成后的 bytes）。"""
+    cycle = _active
+    if cycle is None:
+        yield {}
+        return
+    ts = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if error:
+            attrs["error"] = error[:200]
+        cycle.add({
+            "name": name,
+            "cat": cat,
+            "ts": ts,
+            "dur": time.perf_counter() - started,
+            "tid": threading.get_ident(),
+            "args": attrs,
+        })
+
+
+def cycles(limit: Optional[int] = None) -> List[CycleTrace]:
+    """最近的周期（旧 → 新）。"""
+    with _lock:
+        items = list(_history)
+    return items[-limit:] if limit else items
+
+
+def export_json(limit: Optional[int] = None) -> Dict[str, Any]:
+    """原始 JSON 时间线。"""
+    return {"cycles": [c.to_dict() for c in cycles(limit)]}
+
+
+def export_chrome(limit: Optional[int] = None) -> Dict[str, Any]:
+    """Chrome trace-event 格式：每个周期一个进程（pid），线程按原始线程 ID 区分。"""
+    events: List[Dict[str, Any]] = []
+    for c in cycles(limit):
+        pid = c.id
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(c.started))
+        events.append({
+            "name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+            "args": {"name": f"{c.name} #{c.id} @ {started} ({c.duration:.2f}s)"},
+        })
+        for tid, tname in list(c.threads.items()):
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": tname}})
+        for s in c.to_dict()["spans"]:
+            events.append({
+                "name": s["name"],
+                "cat": s["cat"],
+                "ph": "X",
+                "ts": round(s["ts"] * 1e6, 1),
+                "dur": round(s["dur"] * 1e6, 1),
+                "pid": pid,
+                "tid": s["tid"],
+                "args": s["args"],
+            })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
@@ -0,0 +1,167 @@
+"""持久化的 LFS 上传队列
+
+同步周期只负责发现大文件并记入 `HIST_DIR/.lfs/upload-queue.json`，实际上传由后台线程在 Git 锁之外完成
+（见 `sync.core.lfs_worker`）；GitHub 不可达（熔断器打开）或上传失败时文件留在队列中退避重试，
+小文件的提交与推送照常进行。
+
+职责：
+- 入队的大文件在索引中保持 HEAD 中的版本，上传完成前远端仍保留原文件（提交时由守护进程继续保持 HEAD 版本）；
+  上传完成后才由 `finalize_lfs` 写指针、从索引移除并写入 `.git/info/exclude`；
+- 每个条目记录来源（SQLite 快照路径，可为空）、大小、尝试次数、下次尝试时间与最后一次错误；
+- 失败按指数退避重试：SYNC_UPLOAD_RETRY_BASE 秒起（默认 30），每次加倍，上限 SYNC_UPLOAD_RETRY_MAX（默认 1800）；
+- 队列文件原子写入（临时文件 + rename），进程重启后继续上传；队列文件本身不提交到仓库。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sync.core import git_ops, metrics
+from sync.core.blacklist import ensure_git_info_exclude
+from sync.utils.logging import err, log
+
+QUEUE_FILE = os.path.join(".lfs", "upload-queue.json")
+RETRY_BASE = float(os.environ.get("SYNC_UPLOAD_RETRY_BASE", "30"))
+RETRY_MAX = float(os.environ.get("SYNC_UPLOAD_RETRY_MAX", "1800"))
+
+
+class UploadQueue:
+    """单个仓库的待上传大文件队列（线程安全）。"""
+
+    def __init__(self, hist_dir: str) -> None:
+        self.hist_dir = os.path.abspath(hist_dir)
+        self.path = os.path.join(self.hist_dir, QUEUE_FILE)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._entries = {rel: dict(e) for rel, e in data.get("files", {}).items()}
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            err(f"Failed to load LFS upload queue, starting empty: {e}")
+            return
+        if self._entries:
+            log(f"LFS upload queue: {len(self._entries)} files pending from previous run")
+        metrics.LFS_UPLOAD_QUEUE.set(len(self._entries))
+
+    def _save(self) -> None:
+        # 调用方持有 self._lock
+        metrics.LFS_UPLOAD_QUEUE.set(len(self._entries))
+        if not self._entries and not os.path.exists(self.path):
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "files": self._entries}, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            err(f"Failed to save LFS upload queue: {e}")
+
+    def _hold(self, rel: str) -> None:
+        """上传完成前不提交新内容：索引恢复为 HEAD 中的版本（HEAD 中没有时取消暂存），远端仍保留原文件。"""
+        ensure_git_info_exclude(self.hist_dir, [QUEUE_FILE])
+        git_ops.run(["git", "reset", "-q", "HEAD", "--", rel], cwd=self.hist_dir, check=False)
+
+    def add(self, rel: str, source: Optional[str] = None) -> bool:
+        """入队并立即到期（已在队列中时只更新来源，保持原有退避）；返回是否为新条目。"""
+        with self._lock:
+            entry = self._entries.get(rel)
+            if entry is None:
+                try:
+                    size = os.path.getsize(source or os.path.join(self.hist_dir, rel))
+                except OSError:
+                    size = 0
+                entry = self._entries[rel] = {
+                    "source": source,
+                    "size": size,
+                    "enqueued_at": time.time(),
+                    "attempts": 0,
+                    "next_attempt": 0.0,
+                    "last_error": "",
+                }
+                self._hold(rel)
+                log(f"Queued for LFS upload: {rel}", key="lfs.queue")
+                self._save()
+                return True
+            if source and entry["source"] != source:
+                entry["source"] = source
+                self._save()
+            return False
+
+    @staticmethod
+    def _backoff(entry: dict, error: str) -> None:
+        entry["attempts"] += 1
+        entry["last_error"] = error[:200]
+        delay = min(RETRY_MAX, RETRY_BASE * (2 ** (entry["attempts"] - 1)))
+        entry["next_attempt"] = time.time() + delay
+
+    def record_failure(self, rel: str, error: str = "") -> None:
+        with self._lock:
+            entry = self._entries.get(rel)
+            if entry is not None:
+                self._backoff(entry, error)
+                self._save()
+
+    def remove(self, rel: str) -> None:
+        with self._lock:
+            if self._entries.pop(rel, None) is not None:
+                self._save()
+
+    def __contains__(self, rel: str) -> bool:
+        with self._lock:
+            return rel in self._entries
+
+    def rels(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def due(self, now: Optional[float] = None) -> List[Tuple[str, dict]]:
+        """到达重试时间的条目（按入队先后）。"""
+        now = time.time() if now is None else now
+        with self._lock:
+            items = [(rel, dict(e)) for rel, e in self._entries.items() if e["next_attempt"] <= now]
+        items.sort(key=lambda item: item[1]["enqueued_at"])
+        return items
+
+    def next_due(self, now: Optional[float] = None) -> Optional[float]:
+        """距离最近一个条目到期的秒数；队列为空时返回 None。"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if not self._entries:
+                return None
+            return max(0.0, min(e["next_attempt"] for e in self._entries.values()) - now)
+
+    def stats(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            "files": len(entries),
+            "bytes": sum(e["size"] for e in entries),
+            "oldest": min((e["enqueued_at"] for e in entries), default=None),
+            "next_attempt_in": round(max(0.0, min((e["next_attempt"] for e in entries), default=now) - now), 1),
+        }
+
+
+_queues: Dict[str, UploadQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def get_upload_queue(hist_dir: str) -> UploadQueue:
+    """每个 hist_dir 共享一个上传队列。"""
+    key = os.path.abspath(hist_dir)
+    with _queues_lock:
+        queue = _queues.get(key)
+        if queue is None:
+            queue = _queues[key] = UploadQueue(key)
+        return queue
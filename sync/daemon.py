@@ -3,44 +3,73 @@
 单进程守护，覆盖从“首次初始化/拉取/对齐”到“目录迁移 + 软链”再到“持续同步”的全流程。
 
 工作步骤（按启动顺序）：
-1) 远端准备：保证本地历史仓库存在并配置好 origin；若远端为空则创建初始提交并推送；否则 fetch 落地。
-2) HEAD 对齐：循环直到本地 `HEAD` 与 `origin/<branch>` 完全一致（用 `git rev-parse` 校验）。
-3) 链接阶段：将 BASE 下的目标路径迁移到历史仓库，再在原路径创建符号链接；为空目录写入 `.gitkeep` 并提交一次。
-4) 周期同步：固定周期（默认 180 秒）执行 pull --rebase → commit（如有）→ push。
+1) 远端准备（fetch 阶段）：保证本地历史仓库存在并配置好 origin；若远端为空则创建初始提交并推送；否则 fetch 落地，
+   并循环直到本地 `HEAD` 与 `origin/<branch>` 完全一致（用 `git rev-parse` 校验）。
+2) 分目标阶段（并发）：每个目标依次执行 link:<目标>（迁移 + 符号链接 + 空目录 .gitkeep）→ restore:<目标>（LFS 恢复）
+   → ready:<目标>；每个阶段完成后写入 `HIST_DIR/.sync-ready/<阶段>` 标记，服务只等待自己声明的目标。
+3) 收尾：恢复目标之外的指针文件、提交一次，并写入全局 `.sync-complete`。
+4) 周期同步：按目标调度（`sync.core.scheduler`），对到期目标执行 pull --rebase → 分目标扫描 → commit（如有）→ push；
+   未在 `sync-config.json` 中配置 policies 时所有目标每 SYNC_INTERVAL 秒一起同步。
 
 关键特性：
 - 不使用“就绪文件”这种间接信号；而是用 Git 的真实 HEAD 对比保证拉取完成再继续。
 - 链接在拉取完成之后执行，避免“半拉取状态”破坏本地数据。
 
 可调环境变量：
-- SYNC_INTERVAL：周期同步间隔（秒），默认 180。
+- SYNC_INTERVAL：周期同步间隔（秒），默认 180；也是未单独配置 interval 的目标的同步间隔。
+- SYNC_SQLITE_SNAPSHOT：是否以在线备份快照提交 SQLite 数据库（默认 true，见 `sync.core.sqlite_snap`）。
+- SYNC_CYCLE_BUDGET：单个周期的扫描时间预算（秒），默认 0（不限制），超出时低优先级目标顺延。
+- SYNC_ADAPTIVE / SYNC_MIN_INTERVAL / SYNC_MAX_INTERVAL：按变更频率自适应调整各目标的同步间隔（默认开启，下限 30 秒；
+  上限默认为配置的间隔，只有显式设置 SYNC_MAX_INTERVAL 时安静的目标才会放慢），
+  见 `sync.core.scheduler`；当前生效间隔及原因见状态中的 `cadence`。
+- SYNC_UPLOAD_RETRY_BASE / SYNC_UPLOAD_RETRY_MAX：LFS 上传队列的重试退避（秒），见 `sync.core.upload_queue`；
+  GitHub 熔断参数 SYNC_API_BREAKER_*，见 `sync.core.circuit`。
+- SYNC_LFS_LAZY_SIZE：启动恢复时大于该字节数的 LFS 文件转入后台下载，不阻塞就绪（默认 0，表示全部在启动阶段恢复）；
+  也可在 policies 中为目标设置 `lazy_restore: true`（见 `sync.core.restore_queue`）。
+- SYNC_MAINTENANCE / SYNC_MAINT_*：空闲时自动维护仓库（repack、multi-pack-index、commit-graph、gc），
+  见 `sync.core.maintenance`；SYNC_MAINT_IDLE_GAP 为距下一次同步的最短空闲时间（秒，默认 60）。
+- SYNC_COMPACTION / SYNC_COMPACT_RETENTION / SYNC_COMPACT_INTERVAL：可选的历史压缩，定期把保留窗口（默认 7 天）
+  之前的提交合并为一个根提交并以 --force-with-lease 推送，见 `sync.core.compaction`。
 """
 
 from __future__ import annotations
 
-import json
 import os
-import subprocess
 import threading
 import time
+from contextlib import contextmanager
 from typing import Optional
 
-from sync.core import git_ops
+from sync.core import git_ops, metrics, sqlite_snap, tracing
 from sync.core.blacklist import ensure_git_info_exclude
-from sync.core.config import Settings, load_settings
-from sync.core.linker import migrate_and_link, precreate_dirlike, track_empty_dirs
+from sync.core.compaction import get_compactor
+from sync.core.emptydirs import get_tracker
+from sync.core.events import EventBus, ThrottledFileSink
+from sync.core.jobs import JobQueue
+from sync.core.config import Settings, get_provider, target_policy
+from sync.core.linker import group_targets, migrate_and_link, precreate_dirlike, track_empty_dirs
+from sync.core.maintenance import get_maintainer
+from sync.core.perms import REPAIR_ROOTS, normalize_modes, repair_modes
+from sync.core.scheduler import TargetScheduler
+from sync.core.sqlite_snap import get_snapshotter
+from sync.core.stages import FINISHED, StageGraph, Stage, target_key
 from sync.utils.logging import err, log
 
+MAINT_IDLE_GAP = float(os.environ.get("SYNC_MAINT_IDLE_GAP", "60"))
+
 # LFS imports (延迟导入，避免循环依赖)
 try:
     from sync.core.lfs_ops import (
+        calculate_file_hash,
         restore_all_lfs_files,
-        scan_large_files,
-        convert_to_lfs,
+        scan_target_large_files,
         scan_pointer_files,
-        restore_from_lfs
+        scan_target_pointers,
     )
     from sync.core.pointer import read_pointer
+    from sync.core.restore_queue import RestoreScheduler
+    from sync.core.upload_queue import UploadQueue, get_upload_queue
+    from sync.core.lfs_worker import LfsWorker
     from sync.core.release_api import GitHubReleaseAPI
     from sync.core.manifest import Manifest
     LFS_AVAILABLE = True
@@ -53,31 +82,104 @@ class SyncDaemon:
     """同步守护进程。
 
     - settings: 运行时配置，默认从环境和配置文件加载。
-    - interval: 周期同步间隔（秒），ENV SYNC_INTERVAL 可覆盖。
+    - interval: 周期同步间隔（秒），ENV SYNC_INTERVAL 可覆盖；各目标可在 policies 中单独设置。
+    - scheduler: 分目标调度状态（到期目标、上次同步时间、扫描耗时）。
     - _event/_stop: 线程通信事件；文件变更触发同步、停止标记。
     - _lock: 保护 Git 操作的互斥锁，避免并发 pull/commit/push。
+    - jobs: 串行任务队列，周期同步与 Web 触发的耗时操作都经由它执行。
     - _last_commit_ts: 上次提交/推送的时间戳，用于简单的防抖。
     """
 
     def __init__(self, settings: Optional[Settings] = None) -> None:
-        self.st = settings or load_settings()
+        # 配置快照：由共享的 SettingsProvider 推送更新，在周期边界处切换（见 _apply_pending_settings）
+        self._settings = get_provider()
+        self.st = settings or self._settings.get()
+        self._pending_settings: Optional[Settings] = None
+        self._settings.subscribe(self._on_settings_changed)
         self.interval = int(os.environ.get("SYNC_INTERVAL", "180"))
+        self.scheduler = TargetScheduler(self.interval)
         self._stop = threading.Event()
         self._lock = threading.Lock()  # 保护 git 操作的互斥
+        # 串行任务队列：周期同步与 Web 触发的耗时操作共用，避免并发修改仓库
+        self.jobs = JobQueue()
         self._last_commit_ts: float = 0.0
+        self._progress_lock = threading.Lock()
+        # 进度事件：进程内总线（SSE 推送）+ 可选的节流文件输出（Nginx 状态页/shell 脚本读取）
+        self.events = EventBus()
+        self._progress_sink: Optional[ThrottledFileSink] = None
+        if os.environ.get("SYNC_PROGRESS_FILE", "true").lower() == "true":
+            self._progress_sink = ThrottledFileSink(
+                self.st.sync_progress_file,
+                float(os.environ.get("SYNC_PROGRESS_FILE_INTERVAL", "1.0")),
+            )
+        self._transfers: dict = {}  # (op, path) -> 开始时间，用于计算吞吐
+        # 启动阶段：已由分目标 restore 阶段处理的指针，及各目标的 LFS 进度 (completed, total)
+        self._restored_pointers: set = set()
+        self._lfs_progress: dict = {}
+        self._graph: Optional[StageGraph] = None
+        # 就绪等待：启动完成事件 + 阶段变化监听（供 /sync/api/ready 长轮询）
+        self._startup_done = threading.Event()
+        self._ready_listeners: list = []
+        # 各步骤（pull / restore / background / link / repair）最近一次权限规整修改的 inode 数
+        self.perms_changed: dict = {}
+        # 状态快照（供 /sync/api/status 直接返回），在每个阶段结束时更新
+        self._status_lock = threading.Lock()
+        self._status: dict = {
+            "stage": "starting",
+            "ready": False,
+            "git_initialized": False,
+            "dirty": False,
+            "dirty_count": 0,
+            "head": "",
+            "remote_head": "",
+        }
+        self._cycle_phases: dict = {}
         
         # LFS 支持
         self._lfs_api: Optional[GitHubReleaseAPI] = None
         self._lfs_manifest: Optional[Manifest] = None
+        self._restorer: Optional[RestoreScheduler] = None
+        self._uploads: Optional[UploadQueue] = None
+        self._lfs_worker: Optional[LfsWorker] = None
+        self._lazy_size = int(os.environ.get("SYNC_LFS_LAZY_SIZE", "0"))
+        self._lfs_hashes: dict = {}  # rel -> ((mtime_ns, size), 哈希)，避免每轮重新计算已转换文件的哈希
         if self.st.lfs_enabled and LFS_AVAILABLE:
             try:
                 self._lfs_api = GitHubReleaseAPI(self.st.github_repo, self.st.github_pat)
                 self._lfs_manifest = Manifest(self.st.hist_dir, self.st.lfs_release_tag)
+                # 启动恢复共用的优先队列：必需文件先下载，冷文件在后台完成
+                self._restorer = RestoreScheduler(
+                    self._lfs_api,
+                    self._lfs_manifest,
+                    self.st.lfs_max_workers,
+                    file_progress=lambda p, d, t: self._file_progress("download", p, d, t),
+                    on_done=self._on_restore_done,
+                )
+                # 大文件进入持久上传队列，由后台线程在 Git 锁外上传；熔断恢复后自动补传
+                self._uploads = get_upload_queue(self.st.hist_dir)
+                self._lfs_worker = LfsWorker(
+                    self._lfs_api,
+                    self._lfs_manifest,
+                    self._uploads,
+                    self._lock,
+                    settings=lambda: self.st,
+                    file_progress=lambda p, u, t: self._file_progress("upload", p, u, t),
+                    on_staged=self._on_lfs_staged,
+                )
+                self._lfs_api.breaker.subscribe(self._on_circuit_change)
                 log("LFS enabled")
             except Exception as e:
                 err(f"Failed to initialize LFS: {e}")
                 self._lfs_api = None
                 self._lfs_manifest = None
+                self._restorer = None
+                self._uploads = None
+                self._lfs_worker = None
+
+        # 仓库维护：空闲时在同步锁之外整理对象库（见 sync.core.maintenance）
+        self.maintainer = get_maintainer(self.st.hist_dir, self._maintenance_idle)
+        # 历史压缩（可选，见 sync.core.compaction）
+        self.compactor = get_compactor(self.st.hist_dir)
 
     # -------- 核心阶段：准备远端并对齐 HEAD --------
     def _remote_url(self) -> str:
@@ -107,17 +209,12 @@ class SyncDaemon:
                     git_ops.push(self.st.hist_dir, self.st.branch)
                 else:
                     git_ops.fetch_and_checkout(self.st.hist_dir, self.st.branch)
-                
-                # 修正文件权限：将 /home/user/ 下所有文件设为 777
-                log("修正文件权限...")
-                try:
-                    subprocess.run(["chmod", "-R", "777", "/home/user"], check=False)
-                except Exception as e:
-                    err(f"修正权限失败: {e}")
 
                 # 校验 HEAD 对齐远端
                 if self._head_matches_origin():
                     log("初始拉取完成且 HEAD 已对齐远端")
+                    # 首次检出的文件集合未知：一次性全量修复权限
+                    self.repair_permissions()
                     return
                 else:
                     log("HEAD 未对齐远端，重试对齐...")
@@ -138,6 +235,136 @@ class SyncDaemon:
         except Exception:
             return False
 
+    # -------- 状态快照 --------
+    def _publish_status(self, **fields) -> None:
+        """合并字段并整体替换快照（读者无需加锁即可拿到一致的 dict）。"""
+        with self._status_lock:
+            snap = dict(self._status)
+            snap.update(fields)
+            snap["updated_at"] = time.time()
+            self._status = snap
+        if "stage" in fields:
+            self.events.publish("status", {"stage": snap["stage"]}, key="status")
+
+    def refresh_status(self) -> dict:
+        """重新计算 Git 状态（HEAD/远端 HEAD/未提交文件数）并发布快照；会调用 git 子进程。"""
+        hist = self.st.hist_dir
+        have_git = os.path.isdir(os.path.join(hist, ".git"))
+        dirty_count = 0
+        head = rhead = ""
+        if have_git:
+            try:
+                proc = git_ops.run(["git", "status", "--porcelain"], cwd=hist, check=False)
+                dirty_count = len(proc.stdout.splitlines())
+            except Exception:
+                dirty_count = 0
+            head = git_ops.rev_parse(hist, "HEAD")
+            rhead = git_ops.rev_parse(hist, f"origin/{self.st.branch}")
+        self._publish_status(
+            ready=os.path.exists(self.st.ready_file),
+            git_initialized=have_git,
+            dirty=dirty_count > 0,
+            dirty_count=dirty_count,
+            head=head,
+            remote_head=rhead,
+            status_refreshed_at=time.time(),
+        )
+        return self.status_snapshot()
+
+    def status_snapshot(self) -> dict:
+        """返回最近一次发布的状态（O(1)，不做文件或子进程 I/O）。
+
+        targets/excludes 取最新配置；settings_version 为守护进程当前生效的版本。
+        """
+        st = self._settings.get()
+        snap = self._status
+        return {
+            "base": st.base,
+            "hist_dir": st.hist_dir,
+            "branch": st.branch,
+            "repo": st.github_repo,
+            "targets": st.targets,
+            "excludes": st.excludes,
+            "settings_version": self.st.version,
+            **snap,
+        }
+
+    # -------- 配置变更 --------
+    def _on_settings_changed(self, old: Settings, new: Settings) -> None:
+        """配置文件变更回调：空闲时立即生效，同步进行中则推迟到下一周期开始，避免单个周期内混用两个版本。
+
+        启动阶段（各 link/restore 阶段不持有 Git 锁）一律推迟到启动完成，避免不同阶段看到不同的目标与黑名单。
+        """
+        self._pending_settings = new
+        deferred = self.settings_deferred()
+        self.events.publish(
+            "settings",
+            {"version": new.version, "targets": list(new.targets), "excludes": list(new.excludes), "deferred": deferred},
+            key="settings",
+        )
+        if deferred:
+            log(f"Settings v{new.version} deferred until startup completes", key="settings.deferred")
+            return
+        if self._lock.acquire(blocking=False):
+            try:
+                self._apply_pending_settings()
+            finally:
+                self._lock.release()
+
+    def settings_deferred(self) -> bool:
+        """配置变更是否暂缓生效（启动尚未完成）。"""
+        return not self._startup_done.is_set()
+
+    def _apply_pending_settings(self) -> None:
+        """切换到待生效的配置并重建派生状态（调用方持有 self._lock）。"""
+        new, self._pending_settings = self._pending_settings, None
+        if new is None or new.version <= self.st.version:
+            return
+        old, self.st = self.st, new
+        if new.excludes != old.excludes and os.path.isdir(os.path.join(new.hist_dir, ".git")):
+            ensure_git_info_exclude(new.hist_dir, new.excludes)
+        added = [t for t in new.targets if t not in old.targets]
+        if added:
+            log(f"New sync targets (run relink to migrate): {', '.join(added)}")
+        log(f"Applied settings v{new.version}")
+
+    # -------- 权限规整 --------
+    def fix_permissions(self, paths, step: str = "pull", recursive: bool = False) -> int:
+        """仅对触及的路径设置权限（跳过已正确的 inode），返回修改数并按步骤记录。
+
+        recursive=True 时目录路径整棵遍历（链接阶段迁移进来的目标子树）。
+        """
+        try:
+            paths = list(paths)
+            changed = normalize_modes(self.st.hist_dir, paths, self.st.file_mode)
+            if recursive:
+                for p in paths:
+                    full = os.path.join(self.st.hist_dir, p.strip("/"))
+                    if os.path.isdir(full) and not os.path.islink(full):
+                        changed += repair_modes(full, self.st.file_mode)
+        except Exception as e:
+            err(f"修正权限失败: {e}")
+            return 0
+        self.perms_changed[step] = changed
+        if changed:
+            log(f"权限已修正：{changed} 个文件/目录")
+        return changed
+
+    def repair_permissions(self) -> int:
+        """一次性全量修复 HIST_DIR 与 REPAIR_ROOTS（默认 /home/user）的权限（跳过 .git），返回修改数。"""
+        log("全量修复文件权限...")
+        try:
+            changed = repair_modes(self.st.hist_dir, self.st.file_mode)
+            for root in REPAIR_ROOTS:
+                if os.path.isdir(root) and os.path.abspath(root) != os.path.abspath(self.st.hist_dir):
+                    changed += repair_modes(root, self.st.file_mode)
+        except Exception as e:
+            err(f"修正权限失败: {e}")
+            return 0
+        self.perms_changed["repair"] = changed
+        log(f"权限全量修复完成：{changed} 个文件/目录")
+        return changed
+
     # -------- 迁移与链接、空目录跟踪 --------
     def link_and_track(self) -> None:
         """执行目录/文件迁移 + 符号链接、空目录跟踪和一次性提交推送。"""
@@ -145,13 +372,36 @@ class SyncDaemon:
         precreate_dirlike(self.st.hist_dir, self.st.targets)
         log("迁移并创建符号链接")
         migrate_and_link(self.st.base, self.st.hist_dir, self.st.targets)
+        self.fix_permissions(self.st.targets, step="link", recursive=True)
         log("跟踪空目录并写入 .gitkeep")
         track_empty_dirs(self.st.hist_dir, self.st.targets, self.st.excludes)
-        # 提交一次
+        self.commit_linked()
+
+    def link_target(self, rel: str) -> None:
+        """单个目标的迁移 + 符号链接 + 空目录跟踪（启动阶段 link:<目标>）。"""
+        precreate_dirlike(self.st.hist_dir, [rel])
+        migrate_and_link(self.st.base, self.st.hist_dir, [rel])
+        self.fix_permissions([rel], step="link", recursive=True)
+        track_empty_dirs(self.st.hist_dir, [rel], self.st.excludes)
+
+    def commit_with_snapshots(self, message: str) -> bool:
+        """暂存全部变更并提交（SQLite 数据库以一致性快照入库），返回是否提交；调用方需持有 `_lock`。
+
+        管理 API 的初始化/重新链接/跟踪空目录等流程也经此提交，与周期同步使用相同的快照与覆盖规则。
+        """
+        return git_ops.add_all_and_commit_if_needed(
+            self.st.hist_dir, message, overrides=self._commit_overrides(self._capture_sqlite()),
+        )
+
+    def pull(self) -> None:
+        """拉取（rebase），保持正在写入的 SQLite 数据库不被 autostash 重写；调用方需持有 `_lock`。"""
+        keep = get_snapshotter(self.st.hist_dir).databases() if sqlite_snap.ENABLED else []
+        git_ops.pull_rebase(self.st.hist_dir, self.st.branch, keep=keep)
+
+    def commit_linked(self) -> None:
+        """链接完成后提交推送一次。"""
         with self._lock:
-            changed = git_ops.add_all_and_commit_if_needed(
-                self.st.hist_dir, "chore(sync): initial link & empty dirs"
-            )
+            changed = self.commit_with_snapshots("chore(sync): initial link & empty dirs")
             if changed:
                 try:
                     git_ops.push(self.st.hist_dir, self.st.branch)
@@ -159,18 +409,37 @@ class SyncDaemon:
                     err(f"初次推送失败（忽略）：{e}")
     
     # -------- 进度管理 --------
-    def write_progress(self, progress: dict) -> None:
-        """写入同步进度到文件（供 Nginx 状态页读取）"""
-        try:
-            # 确保目录存在
-            progress_dir = os.path.dirname(self.st.sync_progress_file)
-            if progress_dir:
-                os.makedirs(progress_dir, exist_ok=True)
-            
-            with open(self.st.sync_progress_file, 'w', encoding='utf-8') as f:
-                json.dump(progress, f, indent=2)
-        except Exception as e:
-            err(f"Failed to write progress: {e}")
+    def write_progress(self, progress: dict, force: bool = False) -> None:
+        """发布同步进度：推送到事件总线，并节流写入进度文件（供 Nginx 状态页读取）。
+
+        force=True 时立即写文件（用于完成等终态）。
+        """
+        self.events.publish("progress", progress, key="progress")
+        if self._progress_sink is not None:
+            self._progress_sink.write(progress, force=force)
+
+    def _file_progress(self, op: str, path: str, done: int, total: int) -> None:
+        """单文件字节进度（上传/下载），附带吞吐；同一文件的高频事件在总线上合并。"""
+        key = (op, path)
+        now = time.monotonic()
+        with self._progress_lock:
+            started = self._transfers.setdefault(key, now)
+            finished = total > 0 and done >= total
+            if finished:
+                self._transfers.pop(key, None)
+        elapsed = max(now - started, 1e-6)
+        self.events.publish(
+            "file",
+            {
+                "op": op,
+                "path": os.path.relpath(path, self.st.hist_dir),
+                "bytes": done,
+                "total": total,
+                "rate": int(done / elapsed),
+                "done": finished,
+            },
+            key=f"file:{op}:{path}",
+        )
     
     def mark_sync_complete(self) -> None:
         """标记同步完成，允许其他服务启动"""
@@ -178,9 +447,48 @@ class SyncDaemon:
             with open(self.st.sync_complete_file, 'w') as f:
                 f.write(str(int(time.time())))
             log("✓ Sync completed, other services can start")
-            self.write_progress({"stage": "complete", "progress": 100})
+            self.write_progress({"stage": "complete", "progress": 100}, force=True)
         except Exception as e:
             err(f"Failed to mark sync complete: {e}")
+        self._startup_done.set()
+        # 启动期间推迟的配置变更在此生效
+        with self._lock:
+            self._apply_pending_settings()
+        self._publish_status(stage="complete")
+        self._notify_ready_listeners()
+
+    # -------- 就绪查询 --------
+    def is_ready(self, targets=()) -> bool:
+        """给定目标是否已就绪；未指定目标（或目标不在启动图中）时等待整体启动完成。"""
+        if self._startup_done.is_set():
+            return True
+        graph = self._graph
+        if graph is None or not targets:
+            return False
+        states = graph.snapshot()
+        for rel in targets:
+            if states.get(f"ready:{target_key(rel)}") not in FINISHED:
+                return False
+        return True
+
+    def add_ready_listener(self, callback) -> None:
+        """注册阶段变化回调（无参数，可能在任意线程调用）。"""
+        with self._progress_lock:
+            self._ready_listeners.append(callback)
+
+    def remove_ready_listener(self, callback) -> None:
+        with self._progress_lock:
+            if callback in self._ready_listeners:
+                self._ready_listeners.remove(callback)
+
+    def _notify_ready_listeners(self) -> None:
+        with self._progress_lock:
+            listeners = list(self._ready_listeners)
+        for cb in listeners:
+            try:
+                cb()
+            except Exception as e:
+                err(f"Ready listener failed: {e}")
     
     # -------- LFS 恢复 --------
     def restore_lfs_files(self) -> None:
@@ -207,11 +515,14 @@ class SyncDaemon:
                 self._lfs_api,
                 self._lfs_manifest,
                 max_workers=self.st.lfs_max_workers,
-                progress_callback=progress_callback
+                progress_callback=progress_callback,
+                file_progress_callback=lambda p, d, t: self._file_progress("download", p, d, t)
             )
             
             success_count = sum(1 for v in results.values() if v)
             total_count = len(results)
+            job = self.jobs.current()
+            self.jobs.add_bytes(job.id if job else None, self._restored_bytes(results))
             
             if total_count > 0:
                 log(f"LFS restore completed: {success_count}/{total_count} files")
@@ -223,142 +534,361 @@ class SyncDaemon:
             err(f"LFS restore failed: {e}")
             # 继续执行，不阻止启动
 
-    # -------- LFS 上传 --------
-    def process_large_files(self) -> None:
-        """扫描并处理大文件（转换为 LFS）"""
-        if not self.st.lfs_enabled or not self._lfs_api or not self._lfs_manifest:
+    def restore_target_lfs(self, rel: str) -> None:
+        """恢复单个目标下的 LFS 文件（启动阶段 restore:<目标>）。
+
+        按目标优先级进入共享恢复队列，只等待必需文件；`lazy_restore` 目标及超过 SYNC_LFS_LAZY_SIZE 的文件在后台下载。
+        """
+        if not self.st.lfs_enabled or not self._restorer:
+            return
+        pointers = scan_target_pointers(self.st.hist_dir, rel)
+        with self._progress_lock:
+            self._restored_pointers.update(pointers)
+        policy = target_policy(self.st, rel, self.interval)
+        if policy.lazy_restore:
+            lazy = lambda path, size: True
+        elif self._lazy_size > 0:
+            lazy = lambda path, size: size > self._lazy_size
+        else:
+            lazy = lambda path, size: False
+        self._restore_pointers(rel, pointers, policy.priority, lazy)
+
+    def restore_remaining_lfs(self) -> None:
+        """恢复不属于任何目标的指针文件（启动阶段 restore:*，排在所有目标之后）。"""
+        if not self.st.lfs_enabled or not self._restorer:
+            return
+        with self._progress_lock:
+            done = set(self._restored_pointers)
+        pointers = [p for p in scan_pointer_files(self.st.hist_dir) if p not in done]
+        lazy = (lambda path, size: size > self._lazy_size) if self._lazy_size > 0 else (lambda path, size: False)
+        self._restore_pointers("*", pointers, -(1 << 30), lazy)
+
+    def _restore_pointers(self, key: str, pointers: list, priority: int = 0, lazy=None) -> None:
+        if not pointers:
             return
+
+        def progress_callback(completed: int, total: int):
+            with self._progress_lock:
+                self._lfs_progress[key] = (completed, total)
+            self._write_stage_progress(f"restore:{target_key(key)}")
+
+        group = self._restorer.submit(
+            target_key(key), pointers, priority=priority,
+            lazy=lazy or (lambda path, size: False), progress=progress_callback,
+        )
+        group.wait()
+        # 只有在任务中调用（如 /sync/api/lfs/restore）时才计入该任务；启动阶段不属于任何任务
+        job = self.jobs.current()
+        self.jobs.add_bytes(job.id if job else None, self._restored_bytes(group.results))
+        self.fix_permissions([p[:-8] for p, ok in group.results.items() if ok and p.endswith(".pointer")], step="restore")
+
+    def _on_restore_done(self, pointer_path: str, ok: bool, required: bool) -> None:
+        """恢复队列的完成回调：后台文件在此修正权限并发布进度（必需文件由 _restore_pointers 统一处理）。"""
+        if required:
+            return
+        if ok and pointer_path.endswith(".pointer"):
+            self.fix_permissions([pointer_path[:-8]], step="background")
+        stats = self._restorer.stats() if self._restorer else {}
+        self.events.publish("lfs_background", stats, key="lfs_background")
+        if not stats.get("pending"):
+            log(f"Background LFS restore finished: {stats.get('completed', 0)} restored, {stats.get('failed', 0)} failed")
+            self._publish_status(lfs_background=stats)
+
+    @staticmethod
+    def _restored_bytes(results: dict) -> int:
+        """恢复成功的实际文件总字节数。"""
+        total = 0
+        for p, ok in results.items():
+            if ok and p.endswith(".pointer"):
+                try:
+                    total += os.path.getsize(p[:-8])
+                except OSError:
+                    pass
+        return total
+
+    # -------- LFS 上传 --------
+    def process_large_files(self, scope: Optional[list] = None, snapshots: Optional[dict] = None) -> None:
+        """扫描大文件并记入上传队列（手动触发入口，短暂获取 Git 锁；上传由后台线程完成）。"""
+        with self._lock:
+            self._queue_large_files(scope, snapshots)
+
+    def _queue_large_files(self, scope: Optional[list] = None, snapshots: Optional[dict] = None) -> int:
+        """扫描大文件并记入上传队列（调用方持有 Git 锁），返回新入队的文件数。
+
+        scope 为本轮同步的目标（None 表示全部），各目标使用自己的 LFS 阈值。
+        snapshots 为本轮的 SQLite 快照（见 `_capture_sqlite`），数据库以快照为内容上传。
+        入队的文件在提交中保持 HEAD 中的版本（见 `_commit_overrides`）；上传完成后指针与 manifest 由后台线程暂存。
+        内容与 manifest 当前版本一致的已转换文件不再入队（见 `_lfs_converted`）。
+        """
+        if not self.st.lfs_enabled or not self._lfs_worker:
+            return 0
         
+        queued = 0
         try:
-            # 扫描所有目标目录中的大文件
-            large_files = scan_large_files(
-                self.st.hist_dir,
-                self.st.lfs_threshold,
-                self.st.excludes
-            )
-            
-            if not large_files:
-                return
-            
-            log(f"Found {len(large_files)} large files (>{self.st.lfs_threshold} bytes)")
-            
-            # 逐个转换为 LFS
-            for file_path in large_files:
-                try:
-                    log(f"Converting to LFS: {os.path.relpath(file_path, self.st.hist_dir)}")
-                    convert_to_lfs(
-                        file_path,
-                        self._lfs_api,
-                        self._lfs_manifest,
-                        self.st.lfs_release_tag
+            # 逐个扫描目标目录中的大文件，并记录各目标的扫描耗时供调度估算
+            large_files = []
+            with metrics.SYNC_PHASE_SECONDS.time(phase="lfs_scan"), tracing.span("lfs_scan", cat="phase") as sp:
+                for rel in scope if scope is not None else dict.fromkeys(self.st.targets):
+                    started = time.perf_counter()
+                    threshold = target_policy(self.st, rel, self.interval).lfs_threshold
+                    large_files.extend(
+                        f for f in scan_target_large_files(self.st.hist_dir, rel, threshold, list(self.st.excludes))
+                        if f not in large_files
                     )
-                except Exception as e:
-                    err(f"Failed to convert {file_path} to LFS: {e}")
-            
-            # 清理旧版本（每个文件保留最多 N 个版本）
-            log("Cleaning up old LFS versions...")
-            to_delete = self._lfs_manifest.cleanup_all_old_versions(keep=self.st.lfs_max_versions)
-            
-            # 从 Release 删除旧版本的 assets
-            if to_delete:
-                release = self._lfs_api.get_or_create_release(self.st.lfs_release_tag)
-                for file_path, asset_names in to_delete.items():
-                    for asset_name in asset_names:
-                        try:
-                            asset = self._lfs_api.get_asset_by_name(release, asset_name)
-                            if asset:
-                                self._lfs_api.delete_asset(asset)
-                        except Exception as e:
-                            err(f"Failed to delete old asset {asset_name}: {e}")
+                    self.scheduler.record_cost(rel, time.perf_counter() - started)
+                sp["files"] = len(large_files)
             
-            # 保存 manifest
-            self._lfs_manifest.save()
+            for file_path in large_files:
+                rel = os.path.relpath(file_path, self.st.hist_dir)
+                # SQLite 数据库只上传一致性快照；没有可用快照时本轮跳过，不上传可能撕裂的工作区文件
+                source = snapshots.get(rel) if snapshots else None
+                if snapshots and rel in snapshots and source is None:
+                    continue
+                if rel not in self._uploads and self._lfs_converted(rel, source or file_path):
+                    continue
+                if self._uploads.add(rel, source):
+                    queued += 1
             
+            if queued:
+                log(f"Queued {queued} large files for background LFS upload")
         except Exception as e:
             err(f"Failed to process large files: {e}")
-    
+        if self._uploads.rels():
+            self._lfs_worker.wake()
+        return queued
+
+    def _lfs_converted(self, rel: str, content_path: str) -> bool:
+        """文件已转换为 LFS 且内容与 manifest 当前版本一致（大小与哈希都相同）时返回 True。
+
+        指针写入后文件未再修改时直接视为一致；否则计算一次哈希，结果按 (mtime, 大小) 缓存，
+        未变化的文件每轮只需一次 stat。
+        """
+        pointer_path = os.path.join(self.st.hist_dir, rel + ".pointer")
+        version = self._lfs_manifest.get_current_version(rel) if self._lfs_manifest else None
+        try:
+            st = os.stat(content_path)
+            pointer_mtime = os.stat(pointer_path).st_mtime_ns
+        except OSError:
+            return False
+        if version is None or st.st_size != version.size:
+            return False
+        if st.st_mtime_ns <= pointer_mtime:
+            return True
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self._lfs_hashes.get(rel)
+        if cached is None or cached[0] != stamp:
+            cached = self._lfs_hashes[rel] = (stamp, calculate_file_hash(content_path))
+        return cached[1] == version.hash
+
+    def _on_lfs_staged(self, pointers: list) -> None:
+        """后台上传完成并暂存指针后：发布状态，下一次周期同步提交推送。"""
+        log(f"LFS upload finished for {len(pointers)} files, pointers staged for the next sync")
+        self.events.publish("lfs_upload", {"staged": pointers, **self._lfs_worker.stats()}, key="lfs_upload")
+
+    def _on_circuit_change(self, state: str) -> None:
+        """熔断状态变化：发布事件；恢复后唤醒上传线程补传队列中的文件。"""
+        self.events.publish("circuit", self._lfs_api.breaker.stats(), key="circuit")
+        if state == "closed" and self._lfs_worker is not None:
+            self._lfs_worker.wake()
+
+    # -------- SQLite 快照 --------
+    def _capture_sqlite(self, scope: Optional[list] = None) -> dict:
+        """为目标中的 SQLite 数据库生成一致性快照（ENV SYNC_SQLITE_SNAPSHOT=false 关闭），返回 {相对路径: 快照路径}。"""
+        if not sqlite_snap.ENABLED:
+            return {}
+        try:
+            return get_snapshotter(self.st.hist_dir).capture(
+                scope if scope is not None else self.st.targets, self.st.excludes
+            )
+        except Exception as e:
+            err(f"SQLite snapshot failed: {e}")
+            return {}
+
+    def _commit_overrides(self, snapshots: dict) -> dict:
+        """提交时替换索引内容的路径。
+
+        等待上传的大文件保持 HEAD 中的版本（值为 None），直到上传线程 `finalize_lfs` 换成指针；
+        已转换为 LFS（存在指针文件）的数据库由指针代表，不再暂存；其余数据库使用快照内容。
+        """
+        queued = set(self._uploads.rels()) if self._uploads else set()
+        overrides = dict.fromkeys(queued)
+        overrides.update(
+            (rel, path) for rel, path in snapshots.items()
+            if rel not in queued and not os.path.exists(os.path.join(self.st.hist_dir, rel + ".pointer"))
+        )
+        return overrides
+
     # -------- 同步循环 --------
-    def pull_commit_push(self) -> None:
-        """一次完整的同步周期：先拉取(rebase)，立即恢复LFS，再检测大文件，再提交，再推送。
+    def _restore_missing_after_pull(self, scope: Optional[list] = None, pulled: Optional[list] = None) -> int:
+        """pull 后把被删除的 LFS 文件交给后台恢复队列（不在 Git 锁内下载），返回入队的文件数。
+
+        scope 为本轮同步的目标（None 表示全部）：只扫描这些目标下的指针，另加 pull 变更的指针文件 pulled。
+        恢复完成后由 `_on_restore_done` 修正权限；恢复不会覆盖期间被应用重新创建的文件。
+        """
+        if not (self.st.lfs_enabled and self._restorer):
+            return 0
+        if not self._lfs_api.breaker.ready():
+            log("GitHub circuit open, skipping LFS restore after pull", key="lfs.circuit")
+            return 0
+        try:
+            if scope is None:
+                pointers = scan_pointer_files(self.st.hist_dir)
+            else:
+                pointers = [p for rel in scope for p in scan_target_pointers(self.st.hist_dir, rel)]
+                for rel in pulled or []:
+                    path = os.path.join(self.st.hist_dir, rel)
+                    if rel.endswith(".pointer") and os.path.isfile(path) and path not in pointers:
+                        pointers.append(path)
+            missing = []
+            for pointer_path in pointers:
+                if not read_pointer(pointer_path):
+                    log(f"Skipping invalid pointer: {pointer_path}", key="lfs.pointer.invalid")
+                    continue
+                # 实际文件不存在（可能被 pull 删除），且不在恢复队列中
+                actual_path = pointer_path[:-8] if pointer_path.endswith('.pointer') else pointer_path
+                if not os.path.exists(actual_path) and not self._restorer.pending(pointer_path):
+                    missing.append(pointer_path)
+            if missing:
+                log(f"Restoring {len(missing)} LFS files deleted by pull in background")
+                self._restorer.submit("pull", missing, lazy=lambda path, size: True)
+            return len(missing)
+        except Exception as e:
+            err(f"Failed to restore LFS files after pull: {e}")
+            return 0
 
-        - 使用 `git pull --rebase` 尽量维持线性历史；
+    @contextmanager
+    def _phase(self, name: str):
+        """记录同步周期内单个阶段的耗时（秒），同时写入 `sync_phase_duration_seconds` 与追踪 span。"""
+        started = time.perf_counter()
+        try:
+            with tracing.span(name, cat="phase"):
+                yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._cycle_phases[name] = round(elapsed, 3)
+            metrics.SYNC_PHASE_SECONDS.observe(elapsed, phase=name)
+
+    def pull_commit_push(self, targets: Optional[list] = None) -> None:
+        """一次同步周期：先拉取(rebase)，立即恢复LFS，再检测大文件，再提交，再推送。
+
+        - 使用 `git pull --rebase --autostash` 尽量维持线性历史（SQLite 数据库保持不动，见 `pull`）；
         - pull 后立即恢复 LFS 文件（防止被删除）；
         - 扫描并转换大文件为 LFS（如果启用）；
         - 检测有变更才提交；
         - push 失败并不会中断守护，仅记录日志等待下次重试。
+        targets 为本轮同步的目标（调度器给出的到期目标）：扫描与 `git add` 只作用于这些子树
+        （以及 `.lfs/` 与 `sync-config.json`）；None 或包含全部目标时执行整体同步。
+        结束时刷新状态快照（含各阶段耗时）；整个周期记录为一条追踪（见 `/sync/api/debug/trace`）。
         """
-        with self._lock:
+        with self._lock, tracing.trace_cycle("sync", branch=self.st.branch):
+            self._apply_pending_settings()
+            scope = None
+            if targets is not None:
+                scope = [t for t in dict.fromkeys(targets) if t in self.st.targets]
+                if set(scope) >= set(self.st.targets):
+                    scope = None
+            cycle_started = time.time()
+            calls_before = self._call_counts()
+            self._cycle_phases = {}
+            self._publish_status(stage="syncing")
             # 1. 尝试变基拉取以避免分叉
-            git_ops.run(["git", "pull", "--rebase", "origin", self.st.branch], cwd=self.st.hist_dir, check=False)
+            with self._phase("pull"):
+                before = git_ops.rev_parse(self.st.hist_dir)
+                self.pull()
+                # 本轮触及的路径：pull 变更的文件 + 恢复的 LFS 文件，稍后统一修正权限
+                touched = git_ops.changed_files(self.st.hist_dir, before)
+                # pull 增删文件的目录（及父目录）交给空目录跟踪重新检查
+                get_tracker(self.st.hist_dir).mark_dirty(
+                    {d for p in touched for d in (os.path.dirname(p), os.path.dirname(os.path.dirname(p)))}
+                )
             
-            # 修正文件权限：确保所有文件都可被非 root 进程访问
-            try:
-                subprocess.run(["chmod", "-R", "777", "/home/user"], check=False)
-            except Exception as e:
-                err(f"修正权限失败: {e}")
+            # 2. 被 pull 删除的 LFS 文件交给后台恢复（下载不占用 Git 锁）
+            with self._phase("lfs_restore"):
+                self._restore_missing_after_pull(scope, list(touched))
             
-            # 2. 立即恢复 LFS 文件（防止 pull 删除大文件）
-            if self.st.lfs_enabled and self._lfs_api and self._lfs_manifest:
-                try:
-                    # 扫描指针文件
-                    from sync.core.lfs_ops import scan_pointer_files
-                    from sync.core.pointer import read_pointer
-                    
-                    pointers = scan_pointer_files(self.st.hist_dir)
-                    if pointers:
-                        log(f"Found {len(pointers)} pointer files after pull, checking...")
-                        for pointer_path in pointers:
-                            try:
-                                pointer = read_pointer(pointer_path)
-                                if not pointer:
-                                    log(f"Skipping invalid pointer: {pointer_path}")
-                                    continue
-                                
-                                # 检查实际文件是否存在
-                                actual_path = pointer_path[:-8] if pointer_path.endswith('.pointer') else pointer_path
-                                if not os.path.exists(actual_path):
-                                    # 文件不存在，可能被 pull 删除了，立即恢复
-                                    log(f"Restoring file deleted by pull: {os.path.basename(actual_path)}")
-                                    restore_from_lfs(pointer_path, self._lfs_api, self._lfs_manifest, verify_hash=False)
-                            except Exception as e:
-                                err(f"Failed to restore {pointer_path}: {e}")
-                                continue
-                except Exception as e:
-                    err(f"Failed to restore LFS files after pull: {e}")
+            # 修正文件权限：确保本轮触及的文件可被非 root 进程访问
+            with self._phase("chmod"):
+                self.fix_permissions(touched, step="pull")
             
-            # 3. 处理大文件（转换为 LFS）
-            self.process_large_files()
+            # 3. SQLite 数据库一致性快照（提交与 LFS 上传都只使用快照内容）
+            with self._phase("sqlite"):
+                snapshots = self._capture_sqlite(scope)
+
+            # 3. 大文件记入上传队列，由后台线程在锁外上传（上次上传完成暂存的指针随本轮提交）
+            with self._phase("lfs_queue"):
+                self._queue_large_files(scope, snapshots)
             
             # 3. 持续跟踪空目录，确保新建的空文件夹也能被同步
-            track_empty_dirs(self.st.hist_dir, self.st.targets, self.st.excludes)
+            with self._phase("empty_dirs"):
+                track_empty_dirs(self.st.hist_dir, scope if scope is not None else self.st.targets, self.st.excludes)
             
             # 4. 提交变更（包括新的指针文件和 manifest）
-            changed = git_ops.add_all_and_commit_if_needed(
-                self.st.hist_dir, "chore(sync): periodic commit"
-            )
+            with self._phase("commit"):
+                head_before = git_ops.rev_parse(self.st.hist_dir)
+                changed = git_ops.add_all_and_commit_if_needed(
+                    self.st.hist_dir,
+                    "chore(sync): periodic commit",
+                    paths=None if scope is None else scope + [".lfs", "sync-config.json"],
+                    overrides=self._commit_overrides(snapshots),
+                )
             
             # 5. 若有变更或远端领先，尝试推送
-            try:
-                git_ops.run(["git", "push", "origin", self.st.branch], cwd=self.st.hist_dir, check=False)
-                if changed:
-                    log("已提交并推送变更")
-            except Exception as e:
-                err(f"推送失败：{e}")
+            with self._phase("push"):
+                try:
+                    git_ops.run(["git", "push", "origin", self.st.branch], cwd=self.st.hist_dir, check=False)
+                    if changed:
+                        log("已提交并推送变更")
+                except Exception as e:
+                    err(f"推送失败：{e}")
+            
+            with self._phase("status"):
+                self.refresh_status()
+            synced = scope if scope is not None else list(self.st.targets)
+            # 自适应间隔：按本轮提交涉及的目标调整各目标的同步频率
+            committed = self._targets_of(git_ops.changed_files(self.st.hist_dir, head_before), synced) if changed else set()
+            if changed and not head_before:
+                committed = set(synced)  # 首个提交，无法比较
+            self.scheduler.mark_synced(synced, time.time(), self.st, committed)
+            git_calls, api_calls = self._call_counts()
+            self.scheduler.record_calls(git_calls - calls_before[0], api_calls - calls_before[1])
+            metrics.SYNC_CYCLE_SECONDS.observe(time.time() - cycle_started)
+            metrics.SYNC_CYCLES.inc(result="committed" if changed else "clean")
+            self._publish_status(
+                stage="idle",
+                last_cycle={
+                    "started_at": cycle_started,
+                    "duration": round(time.time() - cycle_started, 3),
+                    "committed": changed,
+                    "targets": "all" if scope is None else synced,
+                    "perms_changed": self.perms_changed.get("pull", 0),
+                    "phases": dict(self._cycle_phases),
+                },
+                cadence=self.scheduler.cadence(self.st),
+                perms_changed=dict(self.perms_changed),
+            )
         self._last_commit_ts = time.time()
 
-    # -------- 主循环 --------
-    def run(self) -> int:
-        """主运行函数：按步骤拉起守护逻辑并进入循环。"""
-        log("启动 sync 守护进程…")
-        
-        # 写入初始进度
-        self.write_progress({"stage": "starting", "progress": 0})
-        
-        # 1) 远端准备并对齐（Git 同步）
-        log("Stage 1/4: Git repository sync...")
-        self.write_progress({"stage": "git", "progress": 10})
+    @staticmethod
+    def _call_counts() -> tuple:
+        """进程累计的 (git 子进程数, GitHub API 请求数)，用于统计单轮调用量。"""
+        git_calls = sum(count for _, count in metrics.GIT_COMMAND_SECONDS.totals().values())
+        return git_calls, metrics.API_REQUESTS.total()
+
+    @staticmethod
+    def _targets_of(files: list, targets: list) -> set:
+        """文件（相对 HIST_DIR）所属的目标。"""
+        out = set()
+        for t in targets:
+            root = t.rstrip("/")
+            if any(f == root or f == root + ".pointer" or f.startswith(root + "/") for f in files):
+                out.add(t)
+        return out
+
+    # -------- 启动阶段依赖图 --------
+    def fetch_stage(self) -> None:
+        """启动阶段 fetch：远端准备并确认 HEAD 对齐。"""
         self.ensure_remote_ready()
-        
+
         # 确保 HEAD 完全对齐后再继续
         log("Verifying Git HEAD alignment...")
         max_retries = 10
@@ -370,34 +900,127 @@ class SyncDaemon:
             time.sleep(2)
         else:
             err("Failed to align Git HEAD, but continuing...")
+
+    def build_startup_graph(self) -> StageGraph:
+        """构建启动阶段依赖图。
+
+        fetch → link:<目标> → restore:<目标> → ready:<目标>（各目标之间并发），
+        所有 restore 完成后 → restore:*（目标外的指针）→ commit。
+        link 只在 fetch 成功后执行（避免在半拉取状态下迁移本地数据），fetch 失败时其后的阶段全部跳过；
+        互相嵌套的目标按外层 → 内层串行链接（与 `migrate_and_link` 的分组一致），互不嵌套的目标并发。
+        LFS 恢复失败不阻塞就绪与提交（restore 对后续阶段只是顺序约束）。
+        """
+        targets = list(dict.fromkeys(self.st.targets))
+        graph = StageGraph(
+            self.st.sync_ready_dir,
+            max_workers=max(2, min(8, len(targets) + 1)),
+            on_change=self._on_stage_change,
+        )
+        graph.add("fetch", self.fetch_stage)
+        links, restores = [], []
+        for group in group_targets(targets):
+            previous = "fetch"
+            for rel in group:
+                key = target_key(rel)
+                links.append(f"link:{key}")
+                restores.append(f"restore:{key}")
+                graph.add(links[-1], lambda rel=rel: self.link_target(rel), deps=[previous])
+                graph.add(restores[-1], lambda rel=rel: self.restore_target_lfs(rel), deps=[links[-1]])
+                graph.add(f"ready:{key}", lambda: None, deps=[links[-1]], after=[restores[-1]])
+                previous = links[-1]
+        graph.add("restore:*", self.restore_remaining_lfs, deps=["fetch"], after=restores)
+        # 提交放在最后：避免 `git add -A` 与 LFS 下载的临时文件交错
+        graph.add("commit", self.commit_linked, deps=["fetch"], after=links + ["restore:*"])
+        return graph
+
+    def _on_stage_change(self, graph: StageGraph, stage: Stage) -> None:
+        self.events.publish("stage", {
+            "name": stage.name,
+            "status": stage.status,
+            "duration": round(stage.finished - stage.started, 3) if stage.finished else None,
+        })
+        self._write_stage_progress(stage.name)
+        self._publish_status(stage=f"startup:{stage.name}", stages=graph.snapshot())
+        if stage.status in FINISHED:
+            self._notify_ready_listeners()
+
+    def _write_stage_progress(self, stage_name: str) -> None:
+        graph = self._graph
+        if graph is None:
+            return
+        states = graph.snapshot()
+        finished = sum(1 for v in states.values() if v in FINISHED)
+        with self._progress_lock:
+            current = sum(c for c, _ in self._lfs_progress.values())
+            total = sum(t for _, t in self._lfs_progress.values())
+        self.write_progress({
+            "stage": stage_name,
+            "progress": 5 + int(90 * finished / max(1, len(states))),
+            "current": current,
+            "total": total,
+            "stages": states,
+        })
+
+    def compact_history(self) -> dict:
+        """把保留窗口之前的历史压缩为一个根提交并安全强制推送（经任务队列调用，不与同步周期并发）。"""
+        result = self.compactor.run(self.st.branch, self._lock)
+        self.events.publish("compaction", result, key="compaction")
+        if result["status"] == "compacted":
+            self.refresh_status()
+        return result
+
+    def _maintenance_idle(self) -> bool:
+        """仓库维护的空闲窗口：没有同步或后台任务在运行，且距下一次同步至少 MAINT_IDLE_GAP 秒。"""
+        if self._lock.locked() or self.jobs.running is not None:
+            return False
+        return self.scheduler.next_due(self.st, time.time()) >= MAINT_IDLE_GAP
+
+    # -------- 主循环 --------
+    def run(self) -> int:
+        """主运行函数：按步骤拉起守护逻辑并进入循环。"""
+        log("启动 sync 守护进程…")
         
-        self.write_progress({"stage": "git", "progress": 25})
-        
-        # 2) 链接与空目录跟踪
-        log("Stage 2/4: Creating symlinks and tracking empty dirs...")
-        self.write_progress({"stage": "linking", "progress": 30})
-        self.link_and_track()
-        self.write_progress({"stage": "linking", "progress": 50})
+        # 写入初始进度
+        self.write_progress({"stage": "starting", "progress": 0})
         
-        # 3) 恢复 LFS 文件
-        log("Stage 3/4: Restoring LFS files...")
-        self.restore_lfs_files()
+        # 1) 启动阶段：fetch → 分目标 link/restore（并发）→ commit
+        graph = self.build_startup_graph()
+        graph.reset_markers()
+        self._graph = graph
+        log(f"Running {len(graph.stages)} startup stages...")
+        started = time.time()
+        states = graph.run()
+        self._publish_status(startup_duration=round(time.time() - started, 3))
+        self.refresh_status()
+        if states.get("fetch") != "done":
+            # 远端未就绪（如 GITHUB_REPO/PAT 缺失）：不链接、不进入周期同步，与原有启动失败行为一致
+            err("Startup aborted: fetch stage did not complete")
+            self.write_progress({"stage": "failed", "progress": 0, "stages": states}, force=True)
+            self._publish_status(stage="failed")
+            return 1
         
-        # 4) 标记同步完成
-        log("Stage 4/4: Finalizing...")
+        # 2) 标记同步完成
+        log("Finalizing...")
         self.mark_sync_complete()
+        self.maintainer.start()
         
-        # 5) 进入周期同步循环
+        # 3) 进入周期同步循环：首轮所有目标均未同步过，执行一次整体同步，之后各目标按自己的间隔到期
         log("Entering periodic sync loop...")
         while not self._stop.is_set():
-            self.pull_commit_push()
-            for _ in range(self.interval):
-                if self._stop.is_set():
+            due = self.scheduler.plan(self.st, time.time())
+            if due:
+                self.jobs.run("sync", lambda due=due: self.pull_commit_push(due), key=",".join(sorted(due)))
+            if self.compactor.due(time.time()):
+                self.jobs.run("compact", self.compact_history)
+            wait = self.scheduler.next_due(self.st, time.time())
+            # 至少等待 1 秒，且每秒检查一次停止标记（配置变更后下一秒即按新策略计算）
+            deadline = time.time() + max(1.0, wait)
+            while not self._stop.is_set() and time.time() < deadline:
+                time.sleep(min(1.0, max(0.0, deadline - time.time())))
+                if self.scheduler.next_due(self.st, time.time()) <= 0:
                     break
-                time.sleep(1)
         return 0
 
-
 def run_daemon() -> int:
     """入口函数：创建并运行守护进程（供外部调用）。"""
     return SyncDaemon().run()
@@ -0,0 +1,164 @@
+"""内置性能剖析：`python -m sync profile`。
+
+在当前配置的 HIST_DIR 上单独执行一次同步周期（或仅启动阶段），期间：
+- cProfile 记录 Python 调用（启动阶段在线程池中并发执行，每个阶段单独剖析后合并；
+  LFS 下载线程池内部的调用不在其中，其耗时体现在 GitHub API 一栏）；
+- 可选 tracemalloc 记录内存分配峰值与按代码位置统计的分配；
+- 借助 `sync_git_command_duration_seconds` 与追踪 span 统计子进程 / GitHub API 耗时，
+  得到墙钟时间在子进程、网络与 Python 之间的拆分；另报告日志写出行数、合并条数与写出耗时。
+
+剖析会真实执行 pull/commit/push 与 LFS 操作，请在守护进程停止时运行，或指向仓库副本。
+就绪标记写入临时目录，进度文件不会被改写，不影响正在等待就绪的服务。
+"""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import os
+import pstats
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+from sync.core import metrics, tracing
+from sync.utils import logging as sync_logging
+
+# 计入“网络”时间的 span（叶子请求，避免 get_asset_by_name → list_assets → github GET 的嵌套重复计算）
+_HTTP_SPANS = ("upload_asset", "download_asset")
+
+
+def _git_totals() -> Dict[str, Tuple[float, int]]:
+    return {k[0]: v for k, v in metrics.GIT_COMMAND_SECONDS.totals().items()}
+
+
+def _http_seconds(cycle: Optional[tracing.CycleTrace]) -> Tuple[float, int]:
+    if cycle is None:
+        return 0.0, 0
+    spans = [s for s in cycle.spans if s["name"].startswith("github ") or s["name"] in _HTTP_SPANS]
+    return sum(s["dur"] for s in spans), len(spans)
+
+
+def _profile_call(func, profilers: List[cProfile.Profile]):
+    """包装 func：在调用线程内单独开启一个 cProfile。"""
+    def run():
+        prof = cProfile.Profile()
+        profilers.append(prof)
+        prof.enable()
+        try:
+            return func()
+        finally:
+            prof.disable()
+    return run
+
+
+def _run_cycle(daemon, profilers: List[cProfile.Profile]) -> Optional[tracing.CycleTrace]:
+    _profile_call(daemon.pull_commit_push, profilers)()
+    return tracing.cycles(1)[-1] if tracing.cycles() else None
+
+
+def _run_startup(daemon, profilers: List[cProfile.Profile]) -> Optional[tracing.CycleTrace]:
+    graph = daemon.build_startup_graph()
+    # 标记写入临时目录，避免影响正在运行的服务
+    graph.marker_dir = tempfile.mkdtemp(prefix="sync-profile-ready-")
+    for stage in graph.stages:
+        stage.func = _profile_call(stage.func, profilers)
+    daemon._graph = graph
+    with tracing.trace_cycle("startup") as cycle:
+        graph.run()
+    failed = [s.name for s in graph.stages if s.status == "failed"]
+    if failed:
+        print(f"Failed stages: {', '.join(failed)}")
+    return cycle
+
+
+def run_profile(
+    what: str = "cycle",
+    top: int = 30,
+    sort: str = "cumulative",
+    trace_malloc: bool = False,
+    frames: int = 1,
+    output: Optional[str] = None,
+) -> int:
+    """执行剖析并打印报告；返回进程退出码。"""
+    # 剖析进程不改写进度文件（须在创建守护实例前设置）
+    os.environ["SYNC_PROGRESS_FILE"] = "false"
+    from sync.daemon import SyncDaemon
+
+    daemon = SyncDaemon()
+    profilers: List[cProfile.Profile] = []
+    if trace_malloc:
+        tracemalloc.start(frames)
+    git_before = _git_totals()
+    log_before = sync_logging.stats()
+    started = time.perf_counter()
+    try:
+        if what == "startup":
+            cycle = _run_startup(daemon, profilers)
+        else:
+            cycle = _run_cycle(daemon, profilers)
+    finally:
+        wall = time.perf_counter() - started
+        sync_logging.flush()
+        snapshot = None
+        peak = 0
+        if trace_malloc:
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+    if not profilers:
+        print("Nothing was profiled")
+        return 1
+    stats = pstats.Stats(profilers[0], stream=io.StringIO())
+    for prof in profilers[1:]:
+        stats.add(prof)
+    if output:
+        stats.dump_stats(output)
+
+    # 1. 墙钟时间拆分
+    git_after = _git_totals()
+    sub_rows = []
+    for name, (total, count) in git_after.items():
+        prev_total, prev_count = git_before.get(name, (0.0, 0))
+        if count > prev_count:
+            sub_rows.append((total - prev_total, count - prev_count, name))
+    sub_rows.sort(reverse=True)
+    sub_total = sum(r[0] for r in sub_rows)
+    http_total, http_count = _http_seconds(cycle)
+    python_total = wall - sub_total - http_total
+
+    print(f"\n=== Wall time: {wall:.3f}s ({what}) ===")
+    print(f"  subprocess  {sub_total:9.3f}s  {100 * sub_total / max(wall, 1e-9):5.1f}%")
+    for total, count, name in sub_rows:
+        print(f"    git {name:<16} {total:9.3f}s  x{count}")
+    print(f"  github api  {http_total:9.3f}s  {100 * http_total / max(wall, 1e-9):5.1f}%  ({http_count} requests)")
+    print(f"  python      {max(python_total, 0.0):9.3f}s  {100 * max(python_total, 0.0) / max(wall, 1e-9):5.1f}%")
+    log_after = sync_logging.stats()
+    print(
+        f"  logging     {log_after['write_seconds'] - log_before['write_seconds']:9.3f}s  "
+        f"({log_after['written'] - log_before['written']} lines written, "
+        f"{log_after['suppressed'] - log_before['suppressed']} coalesced, "
+        f"{log_after['dropped'] - log_before['dropped']} dropped; writer thread, not on the sync path)"
+    )
+    if python_total < 0:
+        # 启动阶段并发执行，子进程/请求耗时按线程累加，可能超过墙钟时间
+        print("  (stages ran concurrently: subprocess/api times are summed across threads)")
+
+    # 2. cProfile 热点
+    print(f"\n=== Top {top} functions by {sort} time ===")
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats(sort).print_stats(top)
+    print(out.getvalue().split("\n", 1)[-1].strip("\n"))
+
+    # 3. 内存分配
+    if snapshot is not None:
+        print(f"\n=== Memory: peak traced {peak / 1024 / 1024:.1f} MiB ===")
+        print(f"Top {top} allocation sites still live at the end of the run:")
+        for st in snapshot.statistics("traceback" if frames > 1 else "lineno")[:top]:
+            print(f"  {st.size / 1024:10.1f} KiB  {st.count:7d} blocks  {st.traceback}")
+    if output:
+        print(f"\npstats written to {output} (e.g. `python -m pstats {output}` or snakeviz)")
+    return 0
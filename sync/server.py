@@ -4,21 +4,49 @@ from __future__ import annotations
 
 职责：
 - 提供状态查询 `/sync/api/status`（包含本地与远端 HEAD）；
-- 一次性操作：`/sync/api/init`、`/sync/api/sync-now`、`/sync/api/pull`、`/sync/api/push`、`/sync/api/relink`、`/sync/api/track-empty`；
-- 目标/黑名单管理：`/sync/api/targets`, `/sync/api/excludes`（持久化到 HIST_DIR/sync-config.json）。
+- 就绪长轮询 `/sync/api/ready?target=...`（阻塞直到目标就绪，供 `python -m sync wait` 使用）；
+- 进度事件流 `/sync/api/events`（SSE：阶段变化、单文件字节进度与吞吐）；
+- Prometheus 指标 `/sync/metrics`（阶段/git 子进程耗时直方图、LFS 传输字节、GitHub API 调用等）；
+- 最近 N 个同步周期的追踪 `/sync/api/debug/trace`（Chrome trace-event 格式，可用 Perfetto 打开）；
+- 后台任务：`/sync/api/init`、`/sync/api/sync-now`、`/sync/api/relink`、`/sync/api/lfs/upload`、`/sync/api/lfs/restore`
+  立即返回任务 ID，在与守护进程共用的串行队列中执行，进度见 `/sync/api/jobs/{id}`；
+- 文件浏览 `/sync/api/files/index`（按 HEAD 缓存的文件索引，游标分页、前缀/glob 过滤、大小与 LFS 注解）；
+- LFS 容量盘点 `/sync/api/lfs/inventory`（单次遍历 manifest，分页排序，存储/可回收字节总计）；
+- 一次性操作：`/sync/api/pull`、`/sync/api/push`、`/sync/api/track-empty`、`/sync/api/perms/repair`；
+- 传输限速 `/sync/api/bandwidth`（GET 查看吞吐与限速等待，POST 运行时修改上传/下载限速与闲时窗口）；
+- 分目标调度状态 `/sync/api/schedule`（各目标的间隔/优先级/陈旧时间与下次到期时间，自适应间隔与节省估算）；
+- 目标/黑名单管理：`/sync/api/targets`, `/sync/api/excludes`（持久化到 HIST_DIR/sync-config.json，
+  经 SettingsProvider 立即生效并推送给守护进程）。
+- 仓库维护 `/sync/api/maintenance`（GET：对象库统计与维护历史；POST：立即执行一次增量维护）；
+  历史压缩 `/sync/api/compaction`（GET：保留窗口与上次结果；POST：立即压缩一次）。
 
 注意：
 - 所有路由均以 `/sync` 为前缀，静态页面也挂载到 `/sync`；
-- 本模块不强制依赖守护进程，若传入 daemon 句柄，`sync-now` 可直接调用守护的同步方法。 
+- 只读路由为 `async def`，git 调用经 `git_async`（带超时与按类别的并发上限），不占用线程池；
+  写操作仍为同步处理函数或后台任务；
+- 本模块不强制依赖守护进程，若传入 daemon 句柄，`sync-now` 可直接调用守护的同步方法；
+  所有会修改仓库的路由与任务都持有守护进程的 Git 锁（无守护进程时使用本模块自己的锁）。
+- 路由与任务的提交同样以 SQLite 一致性快照代替正在写入的数据库（有守护进程时经其 `commit_with_snapshots`）。
 """
 
+import asyncio
+import json
 import os
-from typing import Dict
+import threading
+import time
+from typing import Dict, List, Optional
 
-from sync.core import git_ops
+from sync.core import git_async, git_ops, metrics, sqlite_snap, tracing
+from sync.core.bandwidth import get_governor
 from sync.core.blacklist import ensure_git_info_exclude
-from sync.core.config import load_settings, save_file_overrides
+from sync.core.compaction import get_compactor
+from sync.core.config import get_provider
+from sync.core.file_index import get_file_index
+from sync.core.jobs import JobQueue
 from sync.core.linker import migrate_and_link, precreate_dirlike, track_empty_dirs
+from sync.core.maintenance import get_maintainer, repo_stats
+from sync.core.perms import repair_modes
+from sync.core.sqlite_snap import get_snapshotter
 from sync.utils.logging import log, err
 
 
@@ -34,14 +62,18 @@ def create_app(daemon=None):
     - daemon: 可选的 SyncDaemon 实例；若提供，`/sync/api/sync-now` 将直接调用其同步方法。
     """
     # Lazy import to avoid hard dependency when not serving
-    from fastapi import FastAPI
+    from fastapi import FastAPI, Query
     from fastapi.staticfiles import StaticFiles
-    from fastapi.responses import JSONResponse
+    from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
     app = FastAPI(title="Sync Manager", version="0.2.0")
+    # 与守护进程共用串行任务队列；独立运行时自建
+    jobs = daemon.jobs if daemon is not None else JobQueue()
+    # 缓存的配置快照：仅在 sync-config.json 变化时重新加载，处理函数读取时无文件 I/O
+    settings = get_provider()
 
     @app.get("/sync/api/status")
-    def api_status() -> Dict:
+    async def api_status(fresh: int = 0) -> Dict:
         """返回运行时状态（JSON）。
 
         字段：
@@ -49,24 +81,27 @@ def create_app(daemon=None):
         - targets/excludes：当前目标与黑名单；
         - git_initialized：是否存在 .git；dirty：是否有未提交变更；
         - head/remote_head：本地 HEAD 与远端 HEAD（便于前端判断是否已对齐）。
+
+        有守护进程时直接返回其状态快照（另含 stage、dirty_count、last_cycle 等），不调用 git；
+        `?fresh=1` 强制重新计算。
         """
-        st = load_settings()
+        if daemon is not None:
+            if fresh:
+                return await asyncio.to_thread(daemon.refresh_status)
+            return daemon.status_snapshot()
+        st = settings.get()
         ready = os.path.exists(st.ready_file)
         have_git = os.path.isdir(os.path.join(st.hist_dir, ".git"))
         try:
-            proc = git_ops.run(["git", "status", "--porcelain"], cwd=st.hist_dir, check=False)
+            proc = await git_async.run(["git", "status", "--porcelain"], cwd=st.hist_dir, timeout=20)
             dirty = bool(proc.stdout.strip())
         except Exception:
             dirty = False
         # 提供 HEAD 与远端 HEAD 用于前端展示同步进度
-        try:
-            head = git_ops.run(["git", "rev-parse", "HEAD"], cwd=st.hist_dir, check=False).stdout.strip()
-        except Exception:
-            head = ""
-        try:
-            rhead = git_ops.run(["git", "rev-parse", f"origin/{st.branch}"], cwd=st.hist_dir, check=False).stdout.strip()
-        except Exception:
-            rhead = ""
+        head, rhead = await asyncio.gather(
+            git_async.rev_parse(st.hist_dir, "HEAD"),
+            git_async.rev_parse(st.hist_dir, f"origin/{st.branch}"),
+        )
         return {
             "base": st.base,
             "hist_dir": st.hist_dir,
@@ -81,11 +116,80 @@ def create_app(daemon=None):
             "remote_head": rhead,
         }
 
-    @app.post("/sync/api/init")
-    def api_init():
-        """一次性：确保仓库 -> 拉取或初始化 -> 迁移链接 -> 空目录跟踪 -> 提交推送。"""
-        st = load_settings()
+    @app.get("/sync/api/ready")
+    async def api_ready(target: List[str] = Query(default=[]), timeout: float = 0):
+        """就绪长轮询：阻塞直到给定目标（未指定则为整体启动）就绪，或 timeout 秒后返回。
+
+        由守护进程的阶段变化直接唤醒，不轮询文件；单次最长等待 300 秒。
+        """
+        if daemon is None:
+            return JSONResponse({"ready": False, "error": "Daemon not available"}, status_code=503)
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        def wake():
+            loop.call_soon_threadsafe(event.set)
+
+        daemon.add_ready_listener(wake)
         try:
+            deadline = loop.time() + max(0.0, min(timeout, 300.0))
+            while True:
+                event.clear()
+                if daemon.is_ready(target):
+                    break
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            daemon.remove_ready_listener(wake)
+        graph = daemon._graph
+        return {
+            "ready": daemon.is_ready(target),
+            "targets": target,
+            "stages": graph.snapshot() if graph is not None else {},
+        }
+
+    # Git 操作互斥：有守护进程时与周期同步、LFS 上传线程共用同一把锁，避免 index.lock 冲突
+    git_lock = daemon._lock if daemon is not None else threading.Lock()
+
+    def _submit(kind: str, func, key: Optional[str] = None):
+        """提交后台任务并立即返回任务 ID（同类、同 key 的排队任务会被合并）。"""
+        job = jobs.submit(kind, func, key)
+        return {"ok": True, "job_id": job.id, "status": job.status, "merged": job.merged > 0}
+
+    def _commit(st, message: str) -> bool:
+        """暂存并提交（调用方持有 git_lock）；SQLite 数据库以一致性快照入库，与守护进程的周期提交一致。"""
+        if daemon is not None:
+            return daemon.commit_with_snapshots(message)
+        overrides = {}
+        if sqlite_snap.ENABLED:
+            try:
+                snapshots = get_snapshotter(st.hist_dir).capture(st.targets, st.excludes)
+            except Exception as e:
+                err(f"SQLite snapshot failed: {e}")
+                snapshots = {}
+            # 已转换为 LFS 的数据库由指针代表
+            overrides = {
+                rel: path for rel, path in snapshots.items()
+                if not os.path.exists(os.path.join(st.hist_dir, rel + ".pointer"))
+            }
+        return git_ops.add_all_and_commit_if_needed(st.hist_dir, message, overrides=overrides)
+
+    def _pull(st) -> None:
+        """拉取（调用方持有 git_lock），正在写入的 SQLite 数据库不被 autostash 重写。"""
+        if daemon is not None:
+            daemon.pull()
+            return
+        keep = get_snapshotter(st.hist_dir).databases() if sqlite_snap.ENABLED else []
+        git_ops.pull_rebase(st.hist_dir, st.branch, keep=keep)
+
+    def _init_flow():
+        st = settings.get()
+        with git_lock:
             git_ops.ensure_repo(st.hist_dir, st.branch)
             ensure_git_info_exclude(st.hist_dir, st.excludes)
             git_ops.set_remote(st.hist_dir, _remote_url(st.github_pat, st.github_repo))
@@ -97,39 +201,171 @@ def create_app(daemon=None):
             precreate_dirlike(st.hist_dir, st.targets)
             migrate_and_link(st.base, st.hist_dir, st.targets)
             track_empty_dirs(st.hist_dir, st.targets, st.excludes)
-            changed = git_ops.add_all_and_commit_if_needed(st.hist_dir, "chore(sync): link and track empty dirs")
+            changed = _commit(st, "chore(sync): link and track empty dirs")
             if changed:
                 git_ops.push(st.hist_dir, st.branch)
-            return {"ok": True}
-        except Exception as e:
-            err(str(e))
-            return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
+
+    def _sync_flow():
+        if daemon is not None:
+            daemon.pull_commit_push()
+            return
+        # 后备：直接按流程执行
+        st = settings.get()
+        with git_lock:
+            _pull(st)
+            changed = _commit(st, "chore(sync): sync-now")
+            if changed:
+                git_ops.push(st.hist_dir, st.branch)
+
+    def _relink_flow():
+        st = settings.get()
+        job = jobs.current()
+        with git_lock:
+            precreate_dirlike(st.hist_dir, st.targets)
+            stats = migrate_and_link(st.base, st.hist_dir, st.targets)
+            jobs.add_bytes(job.id if job else None, stats.bytes_moved + stats.bytes_copied)
+            track_empty_dirs(st.hist_dir, st.targets, st.excludes)
+            changed = _commit(st, "chore(sync): relink & empty")
+            if changed:
+                git_ops.push(st.hist_dir, st.branch)
+
+    @app.get("/sync/metrics")
+    async def api_metrics():
+        """Prometheus 文本格式指标。"""
+        return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+    @app.get("/sync/api/debug/trace")
+    def api_debug_trace(cycles: int = 0, format: str = "chrome"):
+        """下载最近的同步周期追踪。
+
+        - cycles：只导出最近 N 个周期（0 表示缓冲区内全部）；
+        - format：`chrome`（trace-event，chrome://tracing / ui.perfetto.dev 打开）或 `json`（原始时间线）。
+        """
+        limit = cycles if cycles > 0 else None
+        if format == "json":
+            return tracing.export_json(limit)
+        return JSONResponse(
+            tracing.export_chrome(limit),
+            headers={"Content-Disposition": 'attachment; filename="sync-trace.json"'},
+        )
+
+    @app.get("/sync/api/events")
+    async def api_events(interval: float = 0.25):
+        """Server-Sent Events 进度流。
+
+        事件类型：progress（整体进度）、stage（启动阶段变化）、status（守护状态）、file（单文件字节进度与吞吐）。
+        每批推送后至少间隔 interval 秒，期间同一文件的进度事件被合并为最新一条。
+        """
+        if daemon is None:
+            return JSONResponse({"ok": False, "error": "Daemon not available"}, status_code=503)
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        sub = daemon.events.subscribe(lambda: loop.call_soon_threadsafe(wake.set))
+        interval = max(0.05, min(interval, 5.0))
+
+        async def stream():
+            try:
+                yield "retry: 2000\n\n"
+                # 客户端断开时 StreamingResponse 会取消本生成器，finally 中退订
+                while True:
+                    wake.clear()
+                    events = sub.drain()
+                    if not events:
+                        try:
+                            await asyncio.wait_for(wake.wait(), 15)
+                        except asyncio.TimeoutError:
+                            yield ": keepalive\n\n"
+                        continue
+                    for ev in events:
+                        data = json.dumps(ev["data"], ensure_ascii=False)
+                        yield f"id: {ev['id']}\nevent: {ev['type']}\ndata: {data}\n\n"
+                    await asyncio.sleep(interval)
+            finally:
+                daemon.events.unsubscribe(sub)
+
+        return StreamingResponse(
+            stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.post("/sync/api/init")
+    def api_init():
+        """一次性：确保仓库 -> 拉取或初始化 -> 迁移链接 -> 空目录跟踪 -> 提交推送（后台任务）。"""
+        return _submit("init", _init_flow)
 
     # 立即同步（pull→commit→push）
     @app.post("/sync/api/sync-now")
     def api_sync_now():
-        """立即执行一次同步：pull --rebase → commit（如有）→ push。"""
-        try:
-            if daemon is not None:
-                daemon.pull_commit_push()
-                return {"ok": True}
-            # 后备：直接按流程执行
-            st = load_settings()
-            git_ops.run(["git", "pull", "--rebase", "origin", st.branch], cwd=st.hist_dir, check=False)
-            changed = git_ops.add_all_and_commit_if_needed(st.hist_dir, "chore(sync): sync-now")
-            if changed:
-                git_ops.push(st.hist_dir, st.branch)
-            return {"ok": True}
-        except Exception as e:
-            return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
+        """立即执行一次同步：pull --rebase → commit（如有）→ push（与守护周期同步合并排队）。"""
+        return _submit("sync", _sync_flow, key="all")
+
+    # 分目标调度状态
+    @app.get("/sync/api/schedule")
+    async def api_schedule():
+        """各目标的调度策略（interval/priority/max_staleness/lfs_threshold）、自适应生效间隔及原因、
+        上次同步时间与下次到期时间，以及自适应间隔每天节省的 git/API 调用估算。"""
+        if daemon is None:
+            return JSONResponse({"ok": False, "error": "Daemon not running"}, status_code=503)
+        now = time.time()
+        return {
+            "ok": True,
+            "budget": daemon.scheduler.budget,
+            "adaptive": daemon.scheduler.adaptive,
+            "targets": daemon.scheduler.snapshot(daemon.st, now),
+            "savings": daemon.scheduler.savings(daemon.st, now),
+        }
+
+    # 仓库维护
+    @app.get("/sync/api/maintenance")
+    async def api_maintenance():
+        """对象库统计（loose 对象、pack 数、大小）、压缩设置与最近几次维护的前后对比及耗时。"""
+        maintainer = get_maintainer(settings.get().hist_dir)
+        stats = await asyncio.to_thread(repo_stats, maintainer.hist_dir)
+        return {"ok": True, "repo": stats, **maintainer.stats()}
+
+    @app.post("/sync/api/maintenance")
+    def api_maintenance_run():
+        """立即执行一次增量维护（忽略阈值与空闲检查；作为后台任务排队，不与同步并发）。"""
+        maintainer = get_maintainer(settings.get().hist_dir)
+        return _submit("maintenance", lambda: maintainer.run(force=True))
+
+    # 历史压缩
+    @app.get("/sync/api/compaction")
+    async def api_compaction():
+        """历史压缩的配置（保留窗口、间隔）与上次执行结果。"""
+        return {"ok": True, **get_compactor(settings.get().hist_dir).stats()}
+
+    @app.post("/sync/api/compaction")
+    def api_compaction_run():
+        """立即压缩一次历史（后台任务；未开启 SYNC_COMPACTION 时也可手动执行）。"""
+        if daemon is None:
+            return JSONResponse({"ok": False, "error": "Daemon not running"}, status_code=503)
+        return _submit("compact", daemon.compact_history)
+
+    # 后台任务查询
+    @app.get("/sync/api/jobs")
+    async def api_jobs(limit: int = 20):
+        """最近的后台任务（新到旧）。"""
+        running = jobs.running
+        return {"ok": True, "jobs": [j.to_dict() for j in jobs.list(limit)], "running": running.id if running else None}
+
+    @app.get("/sync/api/jobs/{job_id}")
+    async def api_job(job_id: str):
+        """单个任务的状态、耗时与传输字节数。"""
+        job = jobs.get(job_id)
+        if job is None:
+            return JSONResponse({"ok": False, "error": "Job not found"}, status_code=404)
+        return {"ok": True, **job.to_dict()}
 
     # 仅拉取
     @app.post("/sync/api/pull")
     def api_pull():
-        """仅执行一次 `git pull --rebase`。"""
+        """仅执行一次 `git pull --rebase --autostash`。"""
         try:
-            st = load_settings()
-            git_ops.run(["git", "pull", "--rebase", "origin", st.branch], cwd=st.hist_dir, check=False)
+            st = settings.get()
+            with git_lock:
+                _pull(st)
             return {"ok": True}
         except Exception as e:
             return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
@@ -139,8 +375,9 @@ def create_app(daemon=None):
     def api_push():
         """仅执行一次 `git push`。"""
         try:
-            st = load_settings()
-            git_ops.run(["git", "push", "origin", st.branch], cwd=st.hist_dir, check=False)
+            st = settings.get()
+            with git_lock:
+                git_ops.run(["git", "push", "origin", st.branch], cwd=st.hist_dir, check=False)
             return {"ok": True}
         except Exception as e:
             return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
@@ -148,78 +385,88 @@ def create_app(daemon=None):
     # 重新链接并跟踪空目录
     @app.post("/sync/api/relink")
     def api_relink():
-        """重新进行迁移与软链，并跟踪空目录；随后提交推送（如有变更）。"""
-        try:
-            st = load_settings()
-            precreate_dirlike(st.hist_dir, st.targets)
-            migrate_and_link(st.base, st.hist_dir, st.targets)
-            track_empty_dirs(st.hist_dir, st.targets, st.excludes)
-            changed = git_ops.add_all_and_commit_if_needed(st.hist_dir, "chore(sync): relink & empty")
-            if changed:
-                git_ops.push(st.hist_dir, st.branch)
-            return {"ok": True}
-        except Exception as e:
-            return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
+        """重新进行迁移与软链，并跟踪空目录；随后提交推送（如有变更）（后台任务）。"""
+        return _submit("relink", _relink_flow)
 
     # 仅扫描空目录
     @app.post("/sync/api/track-empty")
     def api_track_empty():
         """扫描空目录写入 .gitkeep，并提交推送（如有变更）。"""
         try:
-            st = load_settings()
-            cnt = track_empty_dirs(st.hist_dir, st.targets, st.excludes)
-            changed = git_ops.add_all_and_commit_if_needed(st.hist_dir, f"chore(sync): track empty ({cnt})")
-            if changed:
-                git_ops.push(st.hist_dir, st.branch)
+            st = settings.get()
+            with git_lock:
+                cnt = track_empty_dirs(st.hist_dir, st.targets, st.excludes)
+                changed = _commit(st, f"chore(sync): track empty ({cnt})")
+                if changed:
+                    git_ops.push(st.hist_dir, st.branch)
             return {"ok": True, "written": cnt}
         except Exception as e:
             return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
 
+    # 一次性全量修复权限
+    @app.post("/sync/api/perms/repair")
+    def api_perms_repair():
+        """遍历 HIST_DIR（跳过 .git）修复权限，仅修改不符的 inode。"""
+        try:
+            if daemon is not None:
+                changed = daemon.repair_permissions()
+            else:
+                st = settings.get()
+                changed = repair_modes(st.hist_dir, st.file_mode)
+            return {"ok": True, "changed": changed}
+        except Exception as e:
+            return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
+
     # 目标与黑名单管理
+    def _settings_deferred() -> bool:
+        """守护进程仍在启动：配置已保存，但要等启动完成后才生效。"""
+        return daemon is not None and daemon.settings_deferred()
+
     @app.get("/sync/api/targets")
-    def api_get_targets():
+    async def api_get_targets():
         """返回当前同步目标（数组）。"""
-        st = load_settings()
+        st = settings.get()
         return {"targets": st.targets}
 
     @app.post("/sync/api/targets")
     def api_set_targets(payload: dict):
         """覆盖保存同步目标（数组）到配置文件。"""
         try:
-            st = load_settings()
-            data = {"targets": payload.get("targets", st.targets), "excludes": st.excludes}
-            save_file_overrides(st.hist_dir, data)
-            return {"ok": True}
+            st = settings.get()
+            st = settings.update(targets=payload.get("targets", st.targets))
+            return {"ok": True, "version": st.version, "deferred": _settings_deferred()}
         except Exception as e:
             return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
 
     @app.get("/sync/api/excludes")
-    def api_get_excludes():
+    async def api_get_excludes():
         """返回当前黑名单（数组）。"""
-        st = load_settings()
+        st = settings.get()
         return {"excludes": st.excludes}
 
     @app.post("/sync/api/excludes")
     def api_set_excludes(payload: dict):
         """覆盖保存黑名单（数组）到配置文件，并更新 git info/exclude。"""
         try:
-            st = load_settings()
-            data = {"targets": st.targets, "excludes": payload.get("excludes", st.excludes)}
-            save_file_overrides(st.hist_dir, data)
-            ensure_git_info_exclude(st.hist_dir, data["excludes"])
-            return {"ok": True}
+            st = settings.get()
+            st = settings.update(excludes=payload.get("excludes", st.excludes))
+            # 有守护进程时由其配置变更回调更新；独立运行时在此更新
+            if daemon is None:
+                ensure_git_info_exclude(st.hist_dir, st.excludes)
+            return {"ok": True, "version": st.version, "deferred": _settings_deferred()}
         except Exception as e:
             return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
 
     # 新增 API：Git 日志
     @app.get("/sync/api/logs")
-    def api_logs(n: int = 20):
-        """获取最近 n 条提交日志。"""
-        st = load_settings()
+    async def api_logs(n: int = 20):
+        """获取最近 n 条提交日志（异步 git；n 较大时占用 heavy 并发名额）。"""
+        st = settings.get()
         try:
             # %h: short hash, %s: subject, %cr: committer date, relative, %an: author name
             cmd = ["git", "log", f"-n{n}", "--pretty=format:%h|%s|%cr|%an"]
-            res = git_ops.run(cmd, cwd=st.hist_dir, check=False)
+            klass = git_async.LIGHT if n <= 100 else git_async.HEAVY
+            res = await git_async.run(cmd, cwd=st.hist_dir, timeout=30, klass=klass)
             if res.returncode != 0:
                 return {"ok": False, "error": res.stderr}
             
@@ -241,7 +488,7 @@ def create_app(daemon=None):
     @app.post("/sync/api/reset")
     def api_reset():
         """强制重置本地更改：git reset --hard HEAD && git clean -fd"""
-        st = load_settings()
+        st = settings.get()
         try:
             git_ops.run(["git", "reset", "--hard", "HEAD"], cwd=st.hist_dir)
             git_ops.run(["git", "clean", "-fd"], cwd=st.hist_dir)
@@ -251,32 +498,80 @@ def create_app(daemon=None):
 
     # 新增 API：列出文件
     @app.get("/sync/api/files")
-    def api_files(limit: int = 100):
-        """列出当前仓库文件（git ls-files）。"""
-        st = load_settings()
+    async def api_files(limit: int = 100, cursor: str = "", prefix: str = "", glob: str = ""):
+        """列出当前仓库文件（路径数组，基于缓存的文件索引；翻页见 next_cursor）。"""
+        st = settings.get()
+        if not os.path.isdir(os.path.join(st.hist_dir, ".git")):
+            return {"ok": False, "error": f"Not a git repository: {st.hist_dir}"}
         try:
-            res = git_ops.run(["git", "ls-files"], cwd=st.hist_dir, check=False)
-            if res.returncode != 0:
-                return {"ok": False, "error": res.stderr}
-            
-            all_files = res.stdout.strip().splitlines()
-            count = len(all_files)
-            files = all_files[:limit]
-            return {"ok": True, "files": files, "total": count, "limit": limit}
+            page = await get_file_index(st.hist_dir).page_async(cursor, limit, prefix, glob, annotate=False)
+            files = [f["path"] for f in page["files"]]
+            return {"ok": True, "files": files, "total": page["total"], "limit": limit, "next_cursor": page["next_cursor"]}
+        except ValueError:
+            return JSONResponse({"ok": False, "error": "Invalid cursor"}, status_code=400)
         except Exception as e:
             return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
 
+    @app.get("/sync/api/files/index")
+    async def api_files_index(limit: int = 100, cursor: str = "", prefix: str = "", glob: str = ""):
+        """文件索引分页：`git ls-files -z --stage` 按 HEAD 缓存，翻页不调用 git。
+
+        - cursor：上一页的 next_cursor；prefix：路径前缀；glob：fnmatch 模式（如 `*.db`）；
+        - 每个条目含 path/mode/blob/size，LFS 指针另含 lfs.size/lfs.hash/lfs.local（本地实际文件是否存在）。
+        """
+        st = settings.get()
+        try:
+            return {"ok": True, **(await get_file_index(st.hist_dir).page_async(cursor, limit, prefix, glob))}
+        except ValueError:
+            return JSONResponse({"ok": False, "error": "Invalid cursor"}, status_code=400)
+        except Exception as e:
+            return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
+
+    # 传输带宽整形
+    @app.get("/sync/api/bandwidth")
+    async def api_get_bandwidth():
+        """当前限速、闲时窗口、最近 10 秒吞吐与累计限速等待时间。"""
+        return {"ok": True, **get_governor().stats()}
+
+    @app.post("/sync/api/bandwidth")
+    def api_set_bandwidth(payload: dict):
+        """运行时修改限速（立即作用于进行中的传输，进程重启后恢复为环境变量配置）。
+
+        payload 可包含：upload、download（字节/秒或 `512K`/`2M`，0 表示不限速），
+        offpeak: {window: "01:00-07:00" 或 null, upload, download}。
+        """
+        offpeak = payload.get("offpeak") or {}
+        if not isinstance(offpeak, dict):
+            return JSONResponse({"ok": False, "error": "offpeak must be an object or null"}, status_code=400)
+        try:
+            get_governor().set_limits(
+                upload=payload.get("upload"),
+                download=payload.get("download"),
+                offpeak_window=offpeak["window"] if "window" in offpeak else ...,
+                offpeak_upload=offpeak.get("upload"),
+                offpeak_download=offpeak.get("download"),
+            )
+        except ValueError as e:
+            return JSONResponse({"ok": False, "error": str(e)}, status_code=400)
+        return {"ok": True, **get_governor().stats()}
+
     # LFS 大文件管理 API
     @app.get("/sync/api/lfs/status")
-    def api_lfs_status():
+    async def api_lfs_status():
         """返回 LFS 状态和配置信息"""
-        st = load_settings()
+        st = settings.get()
         return {
             "enabled": st.lfs_enabled,
             "threshold": st.lfs_threshold,
             "release_tag": st.lfs_release_tag,
             "max_versions": st.lfs_max_versions,
-            "max_workers": st.lfs_max_workers
+            "max_workers": st.lfs_max_workers,
+            # 后台恢复（lazy_restore / SYNC_LFS_LAZY_SIZE）进度
+            "background_restore": daemon._restorer.stats() if daemon is not None and daemon._restorer else None,
+            # GitHub 熔断状态与待补传的大文件
+            "circuit": daemon._lfs_api.breaker.stats() if daemon is not None and daemon._lfs_api else None,
+            "upload_queue": daemon._uploads.stats() if daemon is not None and daemon._uploads else None,
+            "upload_worker": daemon._lfs_worker.stats() if daemon is not None and daemon._lfs_worker else None,
         }
     
     @app.post("/sync/api/lfs/scan")
@@ -290,7 +585,7 @@ def create_app(daemon=None):
                 return JSONResponse({"ok": False, "error": "LFS not enabled"}, status_code=400)
             
             from sync.core.lfs_ops import scan_large_files
-            st = load_settings()
+            st = settings.get()
             
             large_files = scan_large_files(
                 st.hist_dir,
@@ -320,10 +615,8 @@ def create_app(daemon=None):
             if not daemon._lfs_api or not daemon._lfs_manifest:
                 return JSONResponse({"ok": False, "error": "LFS not enabled"}, status_code=400)
             
-            # 调用 daemon 的 process_large_files 方法
-            daemon.process_large_files()
-            
-            return {"ok": True, "message": "Large files uploaded successfully"}
+            # 后台调用 daemon 的 process_large_files 方法
+            return _submit("lfs_upload", daemon.process_large_files)
         except Exception as e:
             return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
     
@@ -337,16 +630,14 @@ def create_app(daemon=None):
             if not daemon._lfs_api or not daemon._lfs_manifest:
                 return JSONResponse({"ok": False, "error": "LFS not enabled"}, status_code=400)
             
-            # 调用 daemon 的 restore_lfs_files 方法
-            daemon.restore_lfs_files()
-            
-            return {"ok": True, "message": "LFS files restored successfully"}
+            # 后台调用 daemon 的 restore_lfs_files 方法
+            return _submit("lfs_restore", daemon.restore_lfs_files)
         except Exception as e:
             return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
     
     @app.get("/sync/api/lfs/list")
     def api_lfs_list():
-        """列出所有被 LFS 管理的文件"""
+        """列出所有被 LFS 管理的文件（基于 manifest 的单次遍历汇总）"""
         try:
             if daemon is None:
                 return JSONResponse({"ok": False, "error": "Daemon not available"}, status_code=503)
@@ -354,21 +645,17 @@ def create_app(daemon=None):
             if not daemon._lfs_manifest:
                 return JSONResponse({"ok": False, "error": "LFS not enabled"}, status_code=400)
             
-            files = daemon._lfs_manifest.list_all_files()
-            
-            # 获取每个文件的详细信息
-            file_info = []
-            for file_path in files:
-                record = daemon._lfs_manifest.get_file_record(file_path)
-                if record:
-                    current_ver = daemon._lfs_manifest.get_current_version(file_path)
-                    file_info.append({
-                        "path": file_path,
-                        "current_hash": record.current_hash[:16] + "...",
-                        "size": current_ver.size if current_ver else 0,
-                        "version_count": len(record.versions),
-                        "asset_name": current_ver.asset_name if current_ver else ""
-                    })
+            rows = daemon._lfs_manifest.inventory(settings.get().lfs_max_versions)["rows"]
+            file_info = [
+                {
+                    "path": r["path"],
+                    "current_hash": r["current_hash"][:16] + "...",
+                    "size": r["size"],
+                    "version_count": r["versions"],
+                    "asset_name": r["asset_name"],
+                }
+                for r in rows
+            ]
             
             return {
                 "ok": True,
@@ -378,6 +665,74 @@ def create_app(daemon=None):
         except Exception as e:
             return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
 
+    _INVENTORY_SORT = {
+        "size": lambda r: r["size"],
+        "versions": lambda r: r["versions"],
+        "updated": lambda r: r["last_updated"],
+        "stored": lambda r: r["stored_bytes"],
+        "reclaimable": lambda r: r["reclaimable_bytes"],
+        "path": lambda r: r["path"],
+    }
+
+    @app.get("/sync/api/lfs/inventory")
+    def api_lfs_inventory(
+        sort: str = "size",
+        order: str = "desc",
+        offset: int = 0,
+        limit: int = 100,
+        keep: int = 0,
+        verify: int = 0,
+    ):
+        """LFS 容量盘点：分页、可排序的文件汇总及总计。
+
+        - sort：size / versions / updated / stored / reclaimable / path；order：asc / desc；
+        - keep：计算可回收字节时每个文件保留的版本数（默认 LFS_MAX_VERSIONS）；
+        - totals：文件数、版本数、当前版本字节、所有版本存储字节、按 keep 清理可回收字节；
+        - 当前页每行附 local：missing / match / mismatch（默认按大小比较，`verify=1` 时计算哈希）。
+        """
+        if daemon is None:
+            return JSONResponse({"ok": False, "error": "Daemon not available"}, status_code=503)
+        manifest = daemon._lfs_manifest
+        if not manifest:
+            return JSONResponse({"ok": False, "error": "LFS not enabled"}, status_code=400)
+        key = _INVENTORY_SORT.get(sort)
+        if key is None:
+            return JSONResponse({"ok": False, "error": f"Invalid sort: {sort}"}, status_code=400)
+        try:
+            st = settings.get()
+            inv = manifest.inventory(keep if keep > 0 else st.lfs_max_versions)
+            rows = sorted(inv["rows"], key=key, reverse=(order != "asc"))
+            offset = max(0, offset)
+            limit = max(1, min(limit, 1000))
+            page = []
+            for r in rows[offset:offset + limit]:
+                row = dict(r)
+                row["local"] = _lfs_local_state(st.hist_dir, r, verify)
+                page.append(row)
+            return {
+                "ok": True,
+                "totals": inv["totals"],
+                "files": page,
+                "offset": offset,
+                "limit": limit,
+                "next_offset": offset + limit if offset + limit < len(rows) else None,
+            }
+        except Exception as e:
+            return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
+
+    def _lfs_local_state(hist_dir: str, row: dict, verify: int) -> str:
+        path = os.path.join(hist_dir, row["path"])
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return "missing"
+        if size != row["size"]:
+            return "mismatch"
+        if verify:
+            from sync.core.lfs_ops import calculate_file_hash
+            return "match" if calculate_file_hash(path) == row["current_hash"] else "mismatch"
+        return "match"
+
     # 静态文件挂载必须在最后，避免拦截 API 路由
     web_dir = os.path.join(os.path.dirname(__file__), "web")
     if os.path.isdir(web_dir):
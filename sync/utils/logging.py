@@ -1,24 +1,269 @@
-"""简单日志工具：统一输出格式，并对敏感信息进行掩码。"""
+"""日志工具：统一输出格式，并对敏感信息进行掩码。
 
+职责：
+- 分级输出（debug/info/warning/error），级别由 ENV SYNC_LOG_LEVEL 控制（默认 info），低于级别的调用直接返回；
+- 调用方只把记录放入队列，由后台线程批量写出并每批 flush 一次（ENV SYNC_LOG_ASYNC=false 时同步写出）；
+  队列满（ENV SYNC_LOG_QUEUE，默认 10000）时丢弃 info 及以下级别并计数，error 始终写出；
+- 输出格式：`text`（默认，与原格式一致）或 `json`（JSON Lines，附带 level/key 与额外字段），ENV SYNC_LOG_FORMAT；
+- 热点路径按 key 限流：同一 key 在窗口内（ENV SYNC_LOG_WINDOW，默认 5 秒）最多写出 SYNC_LOG_BURST 条（默认 5），
+  其余合并为一条摘要（条数 + 最后一条消息），适用于 LFS 扫描/恢复中逐文件的日志；
+- 所有消息在写出前经 `mask_token` 掩码；
+- `stats()` 返回写出/合并/丢弃条数与写出耗时，`python -m sync profile` 据此报告日志开销。
+
+用法：
+    log(f"✓ Restored from LFS: {name}", key="lfs.restore")
+    debug(f"Calculating hash for {path}...")
+"""
+
+import atexit
+import json
 import os
+import queue
+import re
 import sys
-from datetime import datetime
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+_LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning", ERROR: "error"}
+_LEVELS = {v: k for k, v in _LEVEL_NAMES.items()}
+_TEXT_PREFIX = {DEBUG: "DEBUG: ", INFO: "", WARNING: "WARNING: ", ERROR: "ERROR: "}
+
+_level = _LEVELS.get(os.environ.get("SYNC_LOG_LEVEL", "info").strip().lower(), INFO)
+_format = "json" if os.environ.get("SYNC_LOG_FORMAT", "text").strip().lower() == "json" else "text"
+_async = os.environ.get("SYNC_LOG_ASYNC", "true").strip().lower() not in ("0", "false", "no", "off")
+BURST = int(os.environ.get("SYNC_LOG_BURST", "5"))
+WINDOW = float(os.environ.get("SYNC_LOG_WINDOW", "5"))
+QUEUE_SIZE = int(os.environ.get("SYNC_LOG_QUEUE", "10000"))
+
+_GHP_RE = re.compile(r"ghp_(?!\*\*\*)")
+
+# (ts, level, msg, key, fields)
+Record = Tuple[float, int, str, Optional[str], Optional[Dict]]
+
+
+class _Writer:
+    """日志写出端：按 key 限流（调用方线程，持锁时间极短）、格式化与批量写出（异步模式下在后台线程）。"""
+
+    def __init__(self) -> None:
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, QUEUE_SIZE))
+        self._lock = threading.Lock()  # 保护写出状态（同步模式与 flush）
+        self._rl_lock = threading.Lock()  # 保护限流窗口
+        self._thread: Optional[threading.Thread] = None
+        # key -> [窗口开始时间, 窗口内条数, 已合并条数, 最后一条消息, 最高级别]
+        self._windows: Dict[str, list] = {}
+        self._ts_cache = (0, "")
+        self.written = 0
+        self.suppressed = 0
+        self.dropped = 0
+        self._dropped_reported = 0
+        self.write_seconds = 0.0
+
+    # ---- 调用方 ----
+    def submit(self, rec: Record) -> None:
+        ts, level, msg, key, _ = rec
+        records = [rec]
+        if key is not None and BURST > 0:
+            with self._rl_lock:
+                win = self._windows.get(key)
+                if win is None or ts - win[0] >= WINDOW:
+                    summary = self._summary(key, win) if win is not None else None
+                    win = self._windows[key] = [ts, 0, 0, "", INFO]
+                    if summary is not None:
+                        records.insert(0, summary)
+                win[1] += 1
+                if win[1] > BURST:
+                    win[2] += 1
+                    win[3] = msg
+                    win[4] = max(win[4], level)
+                    self.suppressed += 1
+                    return
+        for r in records:
+            self._put(r)
+
+    def _put(self, rec: Record) -> None:
+        if not _async or not self._ensure_thread():
+            with self._lock:
+                self._process([rec])
+            return
+        try:
+            self._queue.put_nowait(rec)
+        except queue.Full:
+            if rec[1] >= ERROR:
+                try:
+                    self._queue.put(rec, timeout=1.0)
+                    return
+                except queue.Full:
+                    pass
+            self.dropped += 1
+
+    def flush(self, timeout: float = 2.0) -> None:
+        """输出所有未结束窗口的合并摘要，并等待队列中已有的记录写出。"""
+        for rec in self._expired(close_all=True):
+            self._put(rec)
+        if self._thread is not None and self._thread.is_alive():
+            done = threading.Event()
+            try:
+                self._queue.put(done, timeout=timeout)
+                done.wait(timeout)
+            except queue.Full:
+                pass
+        else:
+            with self._lock:
+                self._process([])
+
+    def _ensure_thread(self) -> bool:
+        if self._thread is not None and self._thread.is_alive():
+            return True
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                try:
+                    self._thread = threading.Thread(target=self._run, name="sync-log", daemon=True)
+                    self._thread.start()
+                except RuntimeError:
+                    # 解释器退出阶段无法再创建线程
+                    return False
+        return True
+
+    # ---- 限流窗口 ----
+    def _summary(self, key: str, win: list) -> Optional[Record]:
+        if not win[2]:
+            return None
+        msg = f"{key}: {win[2]} similar messages suppressed in {WINDOW:g}s (last: {win[3]})"
+        return (time.time(), win[4], msg, key, {"suppressed": win[2]} if _format == "json" else None)
+
+    def _expired(self, close_all: bool = False) -> List[Record]:
+        """结束已过期（或全部）的窗口，返回其合并摘要。"""
+        now = time.time()
+        out: List[Record] = []
+        with self._rl_lock:
+            for key in list(self._windows):
+                win = self._windows[key]
+                if close_all or now - win[0] >= WINDOW:
+                    summary = self._summary(key, win)
+                    if summary is not None:
+                        out.append(summary)
+                    del self._windows[key]
+        return out
+
+    # ---- 后台线程 ----
+    def _run(self) -> None:
+        while True:
+            try:
+                # 总是有界等待：窗口可能在本次等待开始后才创建，空闲时也要按时输出其摘要
+                first = self._queue.get(timeout=max(0.5, WINDOW))
+            except queue.Empty:
+                first = None
+            batch: List = [] if first is None else [first]
+            while len(batch) < 512:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            events = [b for b in batch if isinstance(b, threading.Event)]
+            records = [b for b in batch if not isinstance(b, threading.Event)]
+            # 窗口到期后即使没有新日志也要输出摘要
+            records.extend(self._expired())
+            with self._lock:
+                self._process(records)
+            for e in events:
+                e.set()
 
+    def _process(self, records: List[Record]) -> None:
+        out: List[str] = []
+        errs: List[str] = []
+        for ts, level, msg, key, fields in records:
+            (errs if level >= ERROR else out).append(self._format(ts, level, msg, key, fields))
+        if self.dropped > self._dropped_reported:
+            n = self.dropped - self._dropped_reported
+            self._dropped_reported = self.dropped
+            out.append(self._format(time.time(), WARNING, f"{n} log messages dropped (queue full)", None, None))
+        self._write(out, errs)
 
-def _now():
-    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    def _format(self, ts: float, level: int, msg: str, key: Optional[str], fields: Optional[Dict]) -> str:
+        msg = mask_token(msg)
+        sec = int(ts)
+        if self._ts_cache[0] != sec:
+            self._ts_cache = (sec, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(sec)))
+        stamp = self._ts_cache[1]
+        if _format == "json":
+            rec = {"ts": stamp, "level": _LEVEL_NAMES.get(level, "info"), "msg": msg}
+            if key is not None:
+                rec["key"] = key
+            if fields:
+                for k, v in fields.items():
+                    rec.setdefault(k, mask_token(v) if isinstance(v, str) else v)
+            return json.dumps(rec, ensure_ascii=False, default=str)
+        line = f"[{stamp}] [sync] {_TEXT_PREFIX.get(level, '')}{msg}"
+        if fields:
+            line += " " + " ".join(f"{k}={mask_token(v) if isinstance(v, str) else v}" for k, v in fields.items())
+        return line
 
+    def _write(self, out: List[str], errs: List[str]) -> None:
+        if not out and not errs:
+            return
+        started = time.perf_counter()
+        for stream, lines in ((sys.stdout, out), (sys.stderr, errs)):
+            if not lines:
+                continue
+            try:
+                stream.write("\n".join(lines) + "\n")
+                stream.flush()
+            except (OSError, ValueError):
+                pass  # 输出已关闭（进程退出中）
+        self.written += len(out) + len(errs)
+        self.write_seconds += time.perf_counter() - started
 
-def log(msg: str):
-    """标准输出日志（单行）。"""
-    sys.stdout.write(f"[{_now()}] [sync] {msg}\n")
-    sys.stdout.flush()
 
+_writer = _Writer()
+atexit.register(_writer.flush)
 
-def err(msg: str):
+
+def _emit(level: int, msg: str, key: Optional[str], fields: Dict) -> None:
+    if level < _level:
+        return
+    _writer.submit((time.time(), level, msg, key, fields or None))
+
+
+def debug(msg: str, key: Optional[str] = None, **fields):
+    """调试日志（默认不输出）。"""
+    _emit(DEBUG, msg, key, fields)
+
+
+def log(msg: str, key: Optional[str] = None, **fields):
+    """标准输出日志（单行）；key 非空时按 key 限流合并。"""
+    _emit(INFO, msg, key, fields)
+
+
+def warn(msg: str, key: Optional[str] = None, **fields):
+    """警告日志（标准输出）。"""
+    _emit(WARNING, msg, key, fields)
+
+
+def err(msg: str, key: Optional[str] = None, **fields):
     """标准错误日志（单行）。"""
-    sys.stderr.write(f"[{_now()}] [sync] ERROR: {msg}\n")
-    sys.stderr.flush()
+    _emit(ERROR, msg, key, fields)
+
+
+def enabled(level: int) -> bool:
+    """该级别是否会输出；用于跳过昂贵的消息构造。"""
+    return level >= _level
+
+
+def flush(timeout: float = 2.0) -> None:
+    """等待已排队的日志写出（进程退出时自动调用）。"""
+    _writer.flush(timeout)
+
+
+def stats() -> Dict[str, float]:
+    """日志统计：写出/合并/丢弃条数与写出耗时（秒）。"""
+    return {
+        "written": _writer.written,
+        "suppressed": _writer.suppressed,
+        "dropped": _writer.dropped,
+        "write_seconds": round(_writer.write_seconds, 6),
+    }
 
 
 def mask_token(s: str) -> str:
@@ -39,5 +284,5 @@ def mask_token(s: str) -> str:
                 return f"{head}:***@{rest}"
     except Exception:
         pass
-    # Fallback: redact long ghp_ tokens if present
-    return s.replace("ghp_", "ghp_***")
+    # Fallback: redact long ghp_ tokens if present（已掩码的不再重复处理，写出端会再次调用）
+    return _GHP_RE.sub("ghp_***", s)